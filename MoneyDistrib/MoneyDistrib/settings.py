@@ -23,6 +23,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -56,14 +57,66 @@ WSGI_APPLICATION = "MoneyDistrib.wsgi.application"
 
 
 # Database
-# https://docs.djangoproject.com/en/4.1/ref/settings/#databases
-
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+#
+# DATABASE_ENGINE=postgresql selects the production PostgreSQL profile,
+# configured by the POSTGRES_* variables. SQLite is used otherwise.
+
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "sqlite")
+
+# Set DATABASE_POOLER=pgbouncer when connecting through PgBouncer in
+# transaction pooling mode: it cannot keep server-side cursors or session
+# parameters between transactions.
+
+DATABASE_POOLER = os.environ.get("DATABASE_POOLER", "")
+
+# Server-side timeouts in milliseconds (0 disables them). A transaction left
+# idle while holding account locks is aborted instead of blocking transfers.
+# Both are session parameters, so they are not set through PgBouncer.
+
+POSTGRES_STATEMENT_TIMEOUT = int(os.environ.get("POSTGRES_STATEMENT_TIMEOUT", 0))
+POSTGRES_IDLE_IN_TRANSACTION_TIMEOUT = int(
+    os.environ.get("POSTGRES_IDLE_IN_TRANSACTION_TIMEOUT", 60_000)
+)
+
+if DATABASE_ENGINE == "postgresql":
+    POSTGRES_OPTIONS = {}
+    if not DATABASE_POOLER:
+        POSTGRES_OPTIONS["options"] = (
+            f"-c statement_timeout={POSTGRES_STATEMENT_TIMEOUT} "
+            "-c idle_in_transaction_session_timeout="
+            f"{POSTGRES_IDLE_IN_TRANSACTION_TIMEOUT}"
+        )
+
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "moneydistrib"),
+            "USER": os.environ.get("POSTGRES_USER", "moneydistrib"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            # Keep connections open between requests and check them before
+            # reuse instead of reconnecting on every request.
+            "CONN_MAX_AGE": int(os.environ.get("CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            "DISABLE_SERVER_SIDE_CURSORS": bool(DATABASE_POOLER),
+            "OPTIONS": POSTGRES_OPTIONS,
+        }
+    }
+else:
+    # The timeout is SQLite's busy timeout: how long a writer waits for the
+    # database lock before failing with "database is locked". The journal
+    # mode is switched to WAL on connect (see core.db).
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                "timeout": float(os.environ.get("SQLITE_BUSY_TIMEOUT", 20)),
+            },
+        }
     }
-}
 
 
 # Password validation
@@ -104,6 +157,69 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Caches. The "users" cache holds pages of the index user list and the
+# INN -> account id mapping; it is local to the process unless
+# USERS_CACHE_DIR points it at a directory shared by all server processes.
+# Both are only used when the cache is shared: with a local-memory or dummy
+# cache, invalidation after a transfer would not reach the other processes.
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+USERS_CACHE_DIR = os.environ.get("USERS_CACHE_DIR", "")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "users": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache"
+        if USERS_CACHE_DIR
+        else "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": USERS_CACHE_DIR or "users",
+        "OPTIONS": {"MAX_ENTRIES": 100_000},
+    },
+}
+
+# How long a cached page of the index user list is kept, in seconds
+
+USERS_PAGE_CACHE_TTL = int(os.environ.get("USERS_PAGE_CACHE_TTL", 300))
+
+# Number of users shown per page on the index page
+
+USERS_PAGE_SIZE = int(os.environ.get("USERS_PAGE_SIZE", 50))
+
+# INN -> account id cache used to resolve transfer recipients: the number of
+# entries kept in memory by each process (0 disables the cache) and the
+# alias of the cache backing it (see CACHES). INN changes are propagated
+# between processes through the backing cache, so the INN cache is only
+# enabled when that cache is shared by all processes (not a local-memory or
+# dummy cache) - with the defaults it is on only if USERS_CACHE_DIR is set.
+
+INN_CACHE_SIZE = int(os.environ.get("INN_CACHE_SIZE", 100_000))
+INN_CACHE_ALIAS = os.environ.get("INN_CACHE_ALIAS", "users")
+
+# Maximum number of matches returned by the sender lookup endpoint
+
+USER_SEARCH_LIMIT = 10
+
+# Limits of one batch transfer request (/api/transfers/batch/): the number
+# of distributions and the total number of recipients in all of them
+
+TRANSFER_BATCH_MAX_ITEMS = int(os.environ.get("TRANSFER_BATCH_MAX_ITEMS", 1000))
+TRANSFER_BATCH_MAX_CREDITS = int(os.environ.get("TRANSFER_BATCH_MAX_CREDITS", 100_000))
+
+# Number of rows read per query by the balance and statement exports
+
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 2000))
+
+# How long transfer idempotency keys are kept, in seconds
+
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+# Bearer token required by the Prometheus metrics endpoint (/metrics/);
+# the endpoint is open when empty
+
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
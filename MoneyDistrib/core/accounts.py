@@ -0,0 +1,176 @@
+import csv
+from dataclasses import dataclass
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .caching import invalidate_users_table_on_commit
+from .inns import is_valid_inn
+from .models import CustomUser
+from .services import record_openings
+from .stats import adjust_balance_summary
+from .uploads import iter_upload_rows, parse_amount
+from .utils import chunks
+
+# Число пользователей в одном INSERT ... ON CONFLICT. Для SQLite Django
+# дополнительно уменьшает пачку до лимита параметров запроса.
+IMPORT_BATCH_SIZE = 500
+
+# Поля существующих пользователей, обновляемые при повторном импорте.
+# Баланс меняется только корректировками через журнал, а пароль - самим
+# пользователем, поэтому при обновлении они не перезаписываются.
+IMPORT_UPDATE_FIELDS = ["username", "email"]
+
+
+@dataclass
+class AccountRow:
+    """
+    Строка файла импорта пользователей. Баланс в копейках.
+    """
+
+    number: int
+    inn: str
+    username: str
+    email: str = ""
+    balance: int = 0
+    password: str = ""
+
+
+def read_account_rows(records):
+    """
+    Проверяет строки файла импорта с колонками ИНН, имя пользователя,
+    email, баланс в рублях и пароль (последние три необязательны) и
+    возвращает список AccountRow. Первая строка пропускается, если она
+    похожа на заголовок. Ошибки по всем строкам возвращаются сразу.
+    """
+    rows = []
+    errors = []
+    seen_inns = set()
+    seen_usernames = set()
+    username_validator = CustomUser.username_validator
+    for number, record in enumerate(records, start=1):
+        cells = [cell.strip() for cell in record]
+        if not any(cells):
+            continue
+        inn, username, email, balance, password = (cells + [""] * 5)[:5]
+        if number == 1 and not inn.isdigit():
+            continue
+
+        amount = parse_amount(balance, allow_zero=True) if balance else 0
+        try:
+            if not is_valid_inn(inn):
+                raise ValidationError(f"некорректный ИНН {inn}")
+            if inn in seen_inns:
+                raise ValidationError(f"ИНН {inn} уже встречался в файле")
+            if not username:
+                raise ValidationError(f"не указано имя пользователя")
+            username_validator(username)
+            if username in seen_usernames:
+                raise ValidationError(f"имя {username} уже встречалось в файле")
+            if email:
+                validate_email(email)
+            if amount is None:
+                raise ValidationError(f"некорректный баланс {balance}")
+        except ValidationError as e:
+            errors.append(f"Строка {number}: {' '.join(e.messages)}")
+            continue
+        finally:
+            seen_inns.add(inn)
+            seen_usernames.add(username)
+        rows.append(AccountRow(number, inn, username, email, amount, password))
+
+    if errors:
+        raise ValidationError(errors)
+    return rows
+
+
+def find_existing_accounts(rows):
+    """
+    Находит пачками запросов уже существующих пользователей по ИНН и по
+    имени. Возвращает множество ИНН существующих пользователей; строки,
+    имя которых уже занято пользователем с другим ИНН, считаются ошибкой.
+    """
+    existing_inns = set()
+    for chunk in chunks([row.inn for row in rows]):
+        existing_inns.update(
+            CustomUser.objects.filter(inn__in=chunk).values_list("inn", flat=True)
+        )
+
+    inn_by_username = {row.username: row.inn for row in rows}
+    errors = []
+    for chunk in chunks(list(inn_by_username)):
+        taken = CustomUser.objects.filter(username__in=chunk).values_list(
+            "username", "inn"
+        )
+        errors.extend(
+            f"Имя {username} уже занято пользователем с ИНН {inn}"
+            for username, inn in taken
+            if inn != inn_by_username[username]
+        )
+    if errors:
+        raise ValidationError(errors)
+    return existing_inns
+
+
+def import_accounts(rows, unusable_passwords=False):
+    """
+    Создает пользователей из строк rows или обновляет имя и email уже
+    существующих с теми же ИНН.
+
+    Пользователи записываются пачками по IMPORT_BATCH_SIZE запросами
+    INSERT ... ON CONFLICT (inn) DO UPDATE в одной транзакции. Пароли из
+    файла хешируются; при unusable_passwords (и для строк без пароля)
+    пользователи создаются с непригодным паролем, что избавляет от
+    дорогого хеширования на каждого пользователя. Начальные балансы
+    созданных пользователей записываются в журнал (см. record_openings).
+    Возвращает число созданных и обновленных пользователей.
+    """
+    with transaction.atomic():
+        existing_inns = find_existing_accounts(rows)
+        users = [
+            CustomUser(
+                username=row.username,
+                inn=row.inn,
+                email=row.email,
+                balance=row.balance,
+                password=make_password(
+                    None if unusable_passwords or not row.password else row.password
+                ),
+            )
+            for row in rows
+        ]
+        for chunk in chunks(users, IMPORT_BATCH_SIZE):
+            CustomUser.objects.bulk_create(
+                chunk,
+                update_conflicts=True,
+                unique_fields=["inn"],
+                update_fields=IMPORT_UPDATE_FIELDS,
+            )
+
+        created = [row for row in rows if row.inn not in existing_inns]
+        funded = [row.inn for row in created if row.balance]
+        for chunk in chunks(funded):
+            record_openings(
+                CustomUser.objects.filter(inn__in=chunk).values_list("pk", "balance")
+            )
+        adjust_balance_summary(sum(row.balance for row in created), len(created))
+        invalidate_users_table_on_commit()
+
+    return len(created), len(rows) - len(created)
+
+
+def import_accounts_file(uploaded_file, unusable_passwords=False):
+    """
+    Импортирует пользователей из CSV- или XLSX-файла (см. read_account_rows
+    и import_accounts). Возвращает число созданных и обновленных
+    пользователей.
+    """
+    try:
+        rows = read_account_rows(iter_upload_rows(uploaded_file))
+    except (UnicodeDecodeError, csv.Error):
+        raise ValidationError(f"Не удалось прочитать файл")
+    if not rows:
+        raise ValidationError(f"Файл не содержит пользователей")
+    return import_accounts(rows, unusable_passwords)
@@ -1,7 +1,65 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.db.models import Q
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 
-from .models import CustomUser
+from .accounts import import_accounts_file
+from .forms import AccountImportForm, BalanceAdjustmentForm
+from .models import BalanceAdjustment, CustomUser, DailyStats
+from .money import Money
+from .pagination import EstimatedCountPaginator
+from .services import adjust_balances
+from .stats import daily_totals, get_balance_summary
+from .utils import prefix_filter
+
+# Число дней и отправителей на панели статистики.
+DASHBOARD_DAYS = 30
+DASHBOARD_TOP_SENDERS = 10
+
+
+class BalanceRangeFilter(admin.SimpleListFilter):
+    """
+    Класс BalanceRangeFilter представляет собой фильтр пользователей по
+    диапазону баланса. Диапазоны задаются в копейках и фильтруются
+    сравнениями по индексу core_user_balance_idx.
+    """
+
+    title = "Баланс"
+    parameter_name = "balance"
+    ranges = (
+        ("zero", "Нулевой", 0, 1),
+        ("lt1000", "До 1 000", 1, 100_000),
+        ("lt100000", "От 1 000 до 100 000", 100_000, 10_000_000),
+        ("gte100000", "От 100 000", 10_000_000, None),
+    )
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, label, _, _ in self.ranges]
+
+    def queryset(self, request, queryset):
+        for key, _, lower, upper in self.ranges:
+            if self.value() == key:
+                queryset = queryset.filter(balance__gte=lower)
+                if upper is not None:
+                    queryset = queryset.filter(balance__lt=upper)
+                return queryset
+        return queryset
+
+
+class CustomUserChangeList(ChangeList):
+    """
+    Класс CustomUserChangeList представляет собой список пользователей в
+    админке, загружающий только отображаемые колонки.
+    """
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.only(*self.model_admin.changelist_fields)
 
 
 @admin.register(CustomUser)
@@ -16,19 +74,30 @@ class CustomUserAdmin(UserAdmin):
         "username",
         "email",
         "inn",
-        "balance",
+        "balance_display",
+        "sent_volume_display",
+        "received_volume_display",
         "is_staff",
         "is_active",
     )
     list_filter = (
         "is_staff",
         "is_active",
+        BalanceRangeFilter,
     )
     fieldsets = (
         (None, {"fields": ("username", "password")}),
         (
             "Personal info",
-            {"fields": ("first_name", "last_name", "email", "inn", "balance")},
+            {
+                "fields": (
+                    "first_name",
+                    "last_name",
+                    "email",
+                    "inn",
+                    "balance_display",
+                )
+            },
         ),
         (
             "Permissions",
@@ -62,9 +131,229 @@ class CustomUserAdmin(UserAdmin):
             },
         ),
     )
+    # Баланс существующего пользователя только отображается: он меняется
+    # переводами и действием adjust_balance, которые записывают проводки в
+    # журнал, иначе баланс разошелся бы с журналом (см. verify_ledger).
+    readonly_fields = ("balance_display",)
     search_fields = (
+        "=inn",
+        "^username",
+    )
+    ordering = ("username",)
+    actions = ("adjust_balance",)
+    list_select_related = ("stats",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    changelist_fields = (
         "username",
         "email",
         "inn",
+        "balance",
+        "balance_shards",
+        "is_staff",
+        "is_active",
+        "stats__sent_volume",
+        "stats__received_volume",
     )
-    ordering = ("username",)
+
+    def get_changelist(self, request, **kwargs):
+        return CustomUserChangeList
+
+    def get_urls(self):
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="core_customuser_import",
+            ),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        """
+        Метод import_view отображает форму импорта пользователей из файла и
+        импортирует их (см. core.accounts.import_accounts).
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        form = AccountImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            try:
+                created, updated = import_accounts_file(
+                    form.cleaned_data["file"],
+                    unusable_passwords=form.cleaned_data["unusable_passwords"],
+                )
+            except ValidationError as e:
+                for error in e.messages:
+                    self.message_user(request, error, messages.ERROR)
+            else:
+                self.message_user(
+                    request,
+                    f"Импорт завершен: создано {created}, обновлено {updated}",
+                    messages.SUCCESS,
+                )
+                return redirect("admin:core_customuser_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Импорт пользователей",
+            "opts": self.model._meta,
+            "form": form,
+        }
+        return TemplateResponse(
+            request, "admin/core/customuser/import_accounts.html", context
+        )
+
+    @admin.action(
+        description="Изменить баланс выбранных пользователей",
+        permissions=["change"],
+    )
+    def adjust_balance(self, request, queryset):
+        """
+        Действие adjust_balance запрашивает сумму и основание корректировки
+        и изменяет баланс всех выбранных пользователей одной записью в
+        журнале (см. core.services.adjust_balances).
+        """
+        form = BalanceAdjustmentForm(request.POST if "apply" in request.POST else None)
+        if form.is_valid():
+            try:
+                adjustment = adjust_balances(
+                    list(queryset.values_list("pk", flat=True)),
+                    form.cleaned_data["amount"],
+                    form.cleaned_data["reason"],
+                    author=request.user,
+                )
+            except ValidationError as e:
+                self.message_user(request, " ".join(e.messages), messages.ERROR)
+            else:
+                self.message_user(
+                    request,
+                    f"Баланс изменен у пользователей: {adjustment.accounts}",
+                    messages.SUCCESS,
+                )
+            return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Изменение баланса",
+            "opts": self.model._meta,
+            "form": form,
+            "count": queryset.count(),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "select_across": request.POST.get("select_across", "0"),
+        }
+        return TemplateResponse(
+            request, "admin/core/customuser/adjust_balance.html", context
+        )
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Метод get_search_results ищет пользователей по точному ИНН и по
+        префиксу имени пользователя. Оба условия используют индексы, в
+        отличие от стандартного поиска icontains по нескольким колонкам.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = prefix_filter("username", term)
+        if term.isdigit():
+            condition |= Q(inn=term)
+        return queryset.filter(condition), False
+
+    @admin.display(description="Баланс", ordering="balance")
+    def balance_display(self, obj):
+        return obj.balance_money
+
+    @admin.display(description="Отправлено", ordering="stats__sent_volume")
+    def sent_volume_display(self, obj):
+        stats = getattr(obj, "stats", None)
+        return Money(stats.sent_volume if stats else 0)
+
+    @admin.display(description="Получено", ordering="stats__received_volume")
+    def received_volume_display(self, obj):
+        stats = getattr(obj, "stats", None)
+        return Money(stats.received_volume if stats else 0)
+
+
+@admin.register(BalanceAdjustment)
+class BalanceAdjustmentAdmin(admin.ModelAdmin):
+    """
+    Класс BalanceAdjustmentAdmin представляет собой журнал корректировок
+    балансов в административном интерфейсе. Корректировки выполняются
+    действием в списке пользователей и не редактируются.
+    """
+
+    list_display = ("created_at", "amount_display", "accounts", "reason", "author")
+    list_select_related = ("author",)
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Сумма на счет", ordering="amount")
+    def amount_display(self, obj):
+        return Money(obj.amount)
+
+
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    """
+    Класс DailyStatsAdmin представляет собой панель статистики переводов:
+    сводку по балансам, статистику за последние дни и крупнейших
+    отправителей. Все данные читаются из сводных таблиц, поэтому стоимость
+    панели не зависит от длины истории переводов. День показывается одной
+    строкой с суммами по всем его корзинам (см. core.stats.daily_totals).
+    """
+
+    change_list_template = "admin/core/dailystats/change_list.html"
+    list_display = ("date", "transfers_display", "credits_display", "volume_display")
+    list_per_page = DASHBOARD_DAYS
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return daily_totals()
+
+    @admin.display(description="Переводов", ordering="total_transfers")
+    def transfers_display(self, obj):
+        return obj.total_transfers
+
+    @admin.display(description="Зачислений", ordering="total_credits")
+    def credits_display(self, obj):
+        return obj.total_credits
+
+    @admin.display(description="Объем", ordering="total_volume")
+    def volume_display(self, obj):
+        return Money(obj.total_volume)
+
+    def changelist_view(self, request, extra_context=None):
+        top_senders = (
+            CustomUser.objects.filter(stats__sent_volume__gt=0)
+            .order_by("-stats__sent_volume")
+            .values_list("username", "inn", "stats__sent_count", "stats__sent_volume")
+        )[:DASHBOARD_TOP_SENDERS]
+        extra_context = {
+            **(extra_context or {}),
+            "summary": get_balance_summary(),
+            "top_senders": [
+                (username, inn, count, Money(volume))
+                for username, inn, count, volume in top_senders
+            ],
+        }
+        return super().changelist_view(request, extra_context=extra_context)
@@ -0,0 +1,42 @@
+import heapq
+
+
+def allocate_equal(total, count):
+    """
+    Делит total копеек на count частей, отличающихся не более чем на
+    копейку. Остаток от деления достается первым частям, поэтому сумма
+    частей всегда равна total.
+    """
+    if count <= 0:
+        raise ValueError("Количество частей должно быть положительным")
+    share, remainder = divmod(total, count)
+    return [share + 1] * remainder + [share] * (count - remainder)
+
+
+def allocate_weighted(total, weights):
+    """
+    Делит total копеек пропорционально целым неотрицательным весам weights
+    методом наибольшего остатка: каждая часть получает целую долю
+    total * weight // sum(weights), а оставшиеся копейки по одной получают
+    части с наибольшими дробными остатками (при равенстве - первые по
+    порядку). Сумма частей всегда равна total, и каждая часть отличается от
+    точной пропорциональной доли меньше чем на копейку.
+    """
+    weights = list(weights)
+    weight_sum = sum(weights)
+    if not weights or weight_sum <= 0 or min(weights) < 0:
+        raise ValueError("Веса должны быть неотрицательными и не все нулевыми")
+
+    parts = []
+    remainders = []
+    for weight in weights:
+        part, remainder = divmod(total * weight, weight_sum)
+        parts.append(part)
+        remainders.append(remainder)
+
+    leftover = total - sum(parts)
+    for index in heapq.nlargest(
+        leftover, range(len(parts)), key=lambda i: (remainders[i], -i)
+    ):
+        parts[index] += 1
+    return parts
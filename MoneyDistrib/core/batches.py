@@ -0,0 +1,269 @@
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .caching import invalidate_accounts_on_commit
+from .inns import account_ids_by_inn, is_valid_inn
+from .metrics import timed
+from .models import CustomUser, LedgerEntry, Transfer
+from .money import MAX_AMOUNT, Money
+from .services import lock_account_rows, lock_accounts, split_amount
+from .shards import gather_reserves
+from .stats import record_batch_stats
+from .uploads import STATUS_ERROR, STATUS_OK, STATUS_SKIPPED, parse_amount
+from .utils import add_amounts, chunks
+
+AMOUNT_ERROR = (
+    f"Поле amount должно быть положительной суммой не больше {Money(MAX_AMOUNT)}"
+)
+
+
+class BatchItem:
+    """
+    Класс BatchItem представляет собой одно распределение пакетного запроса
+    (отправитель, ИНН получателей и сумма в копейках) и результат его
+    обработки.
+    """
+
+    __slots__ = (
+        "index",
+        "sender_id",
+        "inns",
+        "amount",
+        "credits",
+        "entries",
+        "transfer",
+        "sender_balance",
+        "status",
+        "errors",
+    )
+
+    def __init__(self, index, sender_id, inns, amount):
+        self.index = index
+        self.sender_id = sender_id
+        self.inns = inns
+        self.amount = amount
+        self.credits = []
+        self.entries = []
+        self.transfer = None
+        self.sender_balance = None
+        self.status = STATUS_OK
+        self.errors = []
+
+    def fail(self, message):
+        self.status = STATUS_ERROR
+        self.errors.append(message)
+
+    def skip(self, message):
+        self.status = STATUS_SKIPPED
+        self.errors = [message]
+
+
+def parse_batch_request(body, max_items, max_credits):
+    """
+    Разбирает JSON-тело пакетного запроса: объект с полем distributions -
+    списком объектов sender, recipients и amount (как в запросе перевода) - и
+    флагом atomic (по умолчанию true). Ошибки в отдельных распределениях
+    записываются в их BatchItem, а ошибки запроса в целом выбрасываются как
+    ValueError. Возвращает список BatchItem и флаг atomic.
+    """
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("Ожидается JSON-объект")
+    distributions = payload.get("distributions")
+    if not isinstance(distributions, list) or not distributions:
+        raise ValueError("Поле distributions должно быть непустым списком")
+    if len(distributions) > max_items:
+        raise ValueError(f"В пакете не может быть больше {max_items} распределений")
+    atomic = payload.get("atomic", True)
+    if not isinstance(atomic, bool):
+        raise ValueError("Поле atomic должно быть true или false")
+
+    items = []
+    credits = 0
+    for index, distribution in enumerate(distributions):
+        if not isinstance(distribution, dict):
+            distribution = {}
+        sender_id = distribution.get("sender")
+        recipients = distribution.get("recipients")
+        amount = parse_amount(str(distribution.get("amount", "")))
+        item = BatchItem(index, sender_id, recipients, amount)
+        items.append(item)
+
+        if not isinstance(sender_id, int) or isinstance(sender_id, bool):
+            item.fail("Поле sender должно быть id отправителя")
+        if amount is None:
+            item.fail(AMOUNT_ERROR)
+        if not isinstance(recipients, list) or not recipients:
+            item.fail("Поле recipients должно быть непустым списком ИНН")
+            item.inns = []
+            continue
+        item.inns = [str(inn) for inn in recipients]
+        credits += len(item.inns)
+        invalid = [inn for inn in item.inns if not is_valid_inn(inn)]
+        if invalid:
+            item.fail(f"Некорректные ИНН: {', '.join(invalid)}")
+        if len(set(item.inns)) < len(item.inns):
+            item.fail("В списке ИНН встречаются дубликаты")
+
+    if credits > max_credits:
+        raise ValueError(f"В пакете не может быть больше {max_credits} получателей")
+    return items, atomic
+
+
+def validate_batch(items):
+    """
+    Проверяет отправителей и получателей всех распределений пакета общими
+    запросами: отправители загружаются пачками pk__in, а получатели всех
+    распределений - через кэш ИНН (см. account_ids_by_inn), поэтому число
+    запросов не зависит от числа распределений. Для корректных
+    распределений рассчитывает суммы зачислений (поровну, без остатка).
+    """
+    valid = [item for item in items if item.status == STATUS_OK]
+
+    senders = set()
+    for chunk in chunks(sorted({item.sender_id for item in valid})):
+        senders.update(
+            CustomUser.objects.exclude(inn="")
+            .filter(pk__in=chunk)
+            .values_list("pk", flat=True)
+        )
+    account_ids = account_ids_by_inn(
+        sorted({inn for item in valid for inn in item.inns})
+    )
+
+    for item in valid:
+        if item.sender_id not in senders:
+            item.fail("Отправителя с таким id нет в системе")
+        missing = [inn for inn in item.inns if inn not in account_ids]
+        if missing:
+            item.fail(f"Пользователи с ИНН не найдены: {', '.join(missing)}")
+        elif any(account_ids[inn] == item.sender_id for inn in item.inns):
+            item.fail("Нельзя отправить деньги самому себе")
+        if item.status == STATUS_OK:
+            item.credits = list(
+                zip(
+                    (account_ids[inn] for inn in item.inns),
+                    split_amount(item.amount, len(item.inns)),
+                )
+            )
+
+
+def settle_batch(items, atomic):
+    """
+    Выполняет корректные распределения пакета в одной транзакции.
+
+    Строки всех участников блокируются один раз в порядке pk (см.
+    lock_accounts), средства участников с сегментами баланса собираются в
+    строках их счетов (см. gather_reserves), после чего распределения
+    применяются по порядку к балансам, прочитанным под блокировкой:
+    зачисление из предыдущего распределения может быть потрачено в
+    следующем. Распределение, которому
+    не хватает средств отправителя, отмечается ошибкой. Если atomic и хотя
+    бы одно распределение пакета не прошло проверку, ничего не переводится,
+    а остальные распределения помечаются пропущенными; иначе выполняются все
+    корректные распределения.
+
+    Балансы меняются пакетными UPDATE на итоговое изменение каждого счета
+    (см. add_amounts), переводы и проводки записываются пачками
+    bulk_create, а статистика обновляется один раз на весь пакет. Строки
+    остаются заблокированными до конца транзакции, поэтому итоговые
+    балансы не могут уйти в минус.
+    """
+    if atomic and any(item.status != STATUS_OK for item in items):
+        skip_pending(items)
+        return
+
+    valid = [item for item in items if item.status == STATUS_OK]
+    if not valid:
+        return
+
+    with timed("settle"), transaction.atomic():
+        account_ids = {
+            pk
+            for item in valid
+            for pk in (item.sender_id, *(pk for pk, _ in item.credits))
+        }
+        balances = lock_accounts(account_ids)
+        balances.update(gather_reserves(account_ids - balances.keys()))
+        balances.update(lock_account_rows(account_ids - balances.keys()))
+        current = dict(balances)
+        for item in valid:
+            apply_item(item, current)
+
+        if atomic and any(item.status != STATUS_OK for item in valid):
+            skip_pending(items)
+            return
+
+        settled = [item for item in valid if item.status == STATUS_OK]
+        if not settled:
+            return
+        add_amounts(
+            CustomUser,
+            "balance",
+            [
+                (pk, current[pk] - balance)
+                for pk, balance in balances.items()
+                if current[pk] != balance
+            ],
+        )
+        record_batch_transfers(settled)
+        invalidate_accounts_on_commit(balances)
+
+
+def apply_item(item, balances):
+    """
+    Применяет распределение item к словарю балансов balances, если у
+    отправителя хватает средств, и запоминает проводки с балансами после
+    них.
+    """
+    pks = [item.sender_id, *(pk for pk, _ in item.credits)]
+    if any(pk not in balances for pk in pks):
+        item.fail("Счет участника перевода не найден")
+        return
+    if balances[item.sender_id] < item.amount:
+        item.fail("У отправителя недостаточно средств.")
+        return
+
+    balances[item.sender_id] -= item.amount
+    item.sender_balance = balances[item.sender_id]
+    item.entries = [(item.sender_id, -item.amount, item.sender_balance)]
+    for pk, amount in item.credits:
+        balances[pk] += amount
+        item.entries.append((pk, amount, balances[pk]))
+
+
+def record_batch_transfers(items):
+    """
+    Записывает выполненные распределения в журнал: записи Transfer и
+    проводки всех распределений двумя пачками bulk_create, - и учитывает их
+    в сводной статистике.
+    """
+    created_at = timezone.now()
+    transfers = Transfer.objects.bulk_create(
+        Transfer(sender_id=item.sender_id, amount=item.amount, created_at=created_at)
+        for item in items
+    )
+    LedgerEntry.objects.bulk_create(
+        LedgerEntry(
+            transfer=transfer,
+            account_id=pk,
+            amount=amount,
+            balance_after=balance_after,
+            created_at=created_at,
+        )
+        for item, transfer in zip(items, transfers)
+        for pk, amount, balance_after in item.entries
+    )
+    for item, transfer in zip(items, transfers):
+        item.transfer = transfer
+    record_batch_stats(
+        [(item.sender_id, item.credits, item.amount) for item in items], created_at
+    )
+
+
+def skip_pending(items):
+    for item in items:
+        if item.status == STATUS_OK:
+            item.skip("Перевод не выполнен из-за ошибок в других распределениях")
@@ -0,0 +1,396 @@
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.db import OperationalError, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .caching import invalidate_users_table
+from .inns import invalidate_inns
+from .models import CustomUser
+from .services import distribute_money, record_openings
+from .shards import reshard_account
+
+# Баланс каждого засеянного пользователя в копейках: хватает на любое число
+# прогонов, поэтому переводы не упираются в нехватку средств.
+SEED_BALANCE = 10**12
+
+# Число пользователей в одном bulk_create при засеве.
+SEED_BATCH_SIZE = 5000
+
+# Число повторов перевода, отклоненного из-за блокировки базы (SQLite),
+# и пауза между повторами в секундах.
+LOCK_RETRIES = 100
+RETRY_DELAY = 0.001
+
+# Число запросов к базе в заголовке Server-Timing (см. RequestTimings).
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(values, percent):
+    """
+    Возвращает перцентиль percent значений values методом ближайшего ранга.
+    """
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(name, latencies, queries, elapsed=None, **extra):
+    """
+    Сводит замеры сценария: задержки операций в секундах, число запросов
+    к базе на операцию и общее время выполнения. Если elapsed не задано,
+    операции считаются выполненными последовательно.
+    """
+    elapsed = sum(latencies) if elapsed is None else elapsed
+    return {
+        "name": name,
+        "operations": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "ops_per_sec": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "queries_per_op": max(queries) if queries else None,
+        **extra,
+    }
+
+
+def measure(operation):
+    """
+    Выполняет operation и возвращает время выполнения в секундах, число
+    запросов к базе и число повторов. Операция, отклоненная из-за
+    блокировки базы (SQLite), повторяется после короткой паузы: время
+    повторов входит в замер, как его увидел бы клиент, а число запросов
+    считается по последней, успешной попытке.
+    """
+    retries = 0
+    started = time.perf_counter()
+    while True:
+        with CaptureQueriesContext(connection) as captured:
+            try:
+                operation()
+            except OperationalError:
+                if retries >= LOCK_RETRIES:
+                    raise
+                retries += 1
+                time.sleep(RETRY_DELAY)
+                continue
+        break
+    return time.perf_counter() - started, len(captured), retries
+
+
+def seed_users(count):
+    """
+    Создает count пользователей пачками bulk_create с непригодными паролями
+    и возвращает их в порядке pk (только pk и ИНН). Начальные балансы
+    записываются в журнал (см. record_openings).
+    """
+    password = make_password(None)
+    start = CustomUser.objects.count()
+    for offset in range(0, count, SEED_BATCH_SIZE):
+        CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f"bench{start + i}",
+                inn=f"{start + i + 1:012d}",
+                password=password,
+                balance=SEED_BALANCE,
+            )
+            for i in range(offset, min(offset + SEED_BATCH_SIZE, count))
+        )
+    users = list(CustomUser.objects.order_by("pk").only("pk", "inn"))
+    if count:
+        record_openings((user.pk, SEED_BALANCE) for user in users[-count:])
+    invalidate_users_table()
+    invalidate_inns()
+    return users
+
+
+class TransferBenchmark:
+    """
+    Класс TransferBenchmark представляет собой набор сценариев замера
+    производительности переводов на засеянных пользователях users.
+    Отправители берутся из начала списка, получатели - из остальных
+    пользователей, поэтому отправитель никогда не переводит сам себе.
+    """
+
+    def __init__(self, users, seed=0):
+        self.users = users
+        self.rng = random.Random(seed)
+
+    def split(self, senders):
+        if len(self.users) <= senders:
+            raise ValueError("Недостаточно пользователей для сценария")
+        return self.users[:senders], self.users[senders:]
+
+    def recipients(self, pool, count):
+        if count > len(pool):
+            raise ValueError(f"Недостаточно пользователей для {count} получателей")
+        return self.rng.sample(pool, count)
+
+    def index_get(self, repeat):
+        """
+        Замер отображения главной страницы со списком пользователей.
+        """
+        client = Client()
+        url = reverse("core:index")
+        latencies, queries = [], []
+        for _ in range(repeat):
+            latency, count, _ = measure(lambda: client.get(url))
+            latencies.append(latency)
+            queries.append(count)
+        return summarize("index_get", latencies, queries)
+
+    def index_post(self, count, repeat):
+        """
+        Замер перевода через форму главной страницы на count получателей:
+        разбор и проверка ИНН, перевод и перенаправление.
+        """
+        client = Client()
+        url = reverse("core:index")
+        (sender,), pool = self.split(1)
+        latencies, queries = [], []
+        retries = 0
+        for _ in range(repeat):
+            data = {
+                "sender": sender.pk,
+                "inn_list": " ".join(
+                    user.inn for user in self.recipients(pool, count)
+                ),
+                "amount": count,
+                "idempotency_key": uuid.uuid4().hex,
+            }
+            latency, queries_count, op_retries = measure(
+                lambda: client.post(url, data)
+            )
+            latencies.append(latency)
+            queries.append(queries_count)
+            retries += op_retries
+        return summarize(
+            f"index_post[{count}]",
+            latencies,
+            queries,
+            recipients=count,
+            retries=retries,
+        )
+
+    def distribute(self, count, repeat):
+        """
+        Замер сервиса distribute_money на count получателей.
+        """
+        (sender,), pool = self.split(1)
+        latencies, queries = [], []
+        retries = 0
+        for _ in range(repeat):
+            acceptors = self.recipients(pool, count)
+            latency, queries_count, op_retries = measure(
+                lambda: distribute_money(sender, acceptors, count)
+            )
+            latencies.append(latency)
+            queries.append(queries_count)
+            retries += op_retries
+        return summarize(
+            f"distribute[{count}]",
+            latencies,
+            queries,
+            recipients=count,
+            retries=retries,
+        )
+
+    def concurrent(self, threads, count, repeat):
+        """
+        Замер пропускной способности: threads отправителей в отдельных
+        потоках выполняют по repeat переводов на count получателей из
+        общего пула, поэтому переводы конкурируют за строки счетов.
+        """
+        senders, pool = self.split(threads)
+        plans = [
+            [self.recipients(pool, count) for _ in range(repeat)] for _ in senders
+        ]
+        return self.run_threads(
+            f"concurrent[{threads}x{count}]", senders, plans, count
+        )
+
+    def hot_sender(self, threads, count, repeat, shards):
+        """
+        Замер пропускной способности переводов с одного нагруженного счета:
+        threads потоков выполняют по repeat переводов на count получателей
+        от одного отправителя, баланс которого разделен на shards сегментов
+        (0 - без сегментов, все переводы ждут блокировку строки счета).
+        После замера сегменты отправителя снова объединяются.
+        """
+        (sender,), pool = self.split(1)
+        plans = [
+            [self.recipients(pool, count) for _ in range(repeat)]
+            for _ in range(threads)
+        ]
+        reshard_account(sender.pk, shards)
+        try:
+            return self.run_threads(
+                f"hot_sender[{threads}x{count},shards={shards}]",
+                [sender] * threads,
+                plans,
+                count,
+                shards=shards,
+            )
+        finally:
+            reshard_account(sender.pk, 0)
+
+    def run_threads(self, name, senders, plans, count, **extra):
+        """
+        Выполняет переводы планов plans - списков получателей - в отдельных
+        потоках, по потоку на отправителя из senders, и сводит замеры.
+        """
+        latencies, queries, errors = [], [], []
+        retries = []
+        lock = threading.Lock()
+
+        def run(sender, plan):
+            try:
+                for acceptors in plan:
+                    latency, queries_count, op_retries = measure(
+                        lambda: distribute_money(sender, acceptors, count)
+                    )
+                    with lock:
+                        latencies.append(latency)
+                        queries.append(queries_count)
+                        retries.append(op_retries)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=run, args=(sender, plan))
+            for sender, plan in zip(senders, plans)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+        return summarize(
+            name,
+            latencies,
+            queries,
+            elapsed=elapsed,
+            threads=len(senders),
+            recipients=count,
+            retries=sum(retries),
+            **extra,
+        )
+
+    def run(self, recipients, repeat, threads, concurrent_recipients, shards=()):
+        """
+        Выполняет все сценарии и возвращает список их сводок. Сценарий
+        hot_sender выполняется для каждого числа сегментов из shards.
+        """
+        results = [self.index_get(repeat)]
+        for count in recipients:
+            results.append(self.index_post(count, repeat))
+            results.append(self.distribute(count, repeat))
+        results.append(self.concurrent(threads, concurrent_recipients, repeat))
+        for count in shards:
+            results.append(
+                self.hot_sender(threads, concurrent_recipients, repeat, count)
+            )
+        return results
+
+
+def http_request(method, url, body=None, headers=None):
+    """
+    Возвращает адрес сервера (host, port) и байты запроса HTTP/1.1 с
+    заголовком Connection: close: каждый запрос открывает свое соединение,
+    поэтому число одновременных запросов равно числу открытых соединений.
+    """
+    parts = urlsplit(url)
+    target = parts.path or "/"
+    if parts.query:
+        target += f"?{parts.query}"
+    lines = [
+        f"{method} {target} HTTP/1.1",
+        f"Host: {parts.netloc}",
+        "Connection: close",
+    ]
+    if body is not None:
+        body = json.dumps(body).encode()
+        lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+    return (parts.hostname, parts.port or 80), head + (body or b"")
+
+
+async def send_request(address, request, timeout):
+    """
+    Отправляет запрос и возвращает код ответа и его заголовки.
+    """
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(*address), timeout
+    )
+    try:
+        writer.write(request)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head = response.split(b"\r\n\r\n", 1)[0].decode("latin-1").split("\r\n")
+    headers = {}
+    for line in head[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return int(head[0].split()[1]), headers
+
+
+async def http_load(name, requests, concurrency, total, timeout=30):
+    """
+    Выполняет total запросов, которые строит функция requests(номер), не
+    более concurrency одновременно, и сводит замеры (см. summarize). Ответы
+    с кодом 4xx/5xx и ошибки соединения считаются в поле errors и в
+    задержки не входят. Число запросов к базе берется из заголовка
+    Server-Timing.
+    """
+    latencies, queries, statuses = [], [], {}
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for number in counter:
+            address, request = requests(number)
+            started = time.perf_counter()
+            try:
+                status, headers = await send_request(address, request, timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                errors += 1
+                continue
+            statuses[status] = statuses.get(status, 0) + 1
+            if status >= 400:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            match = SERVER_TIMING_QUERIES.search(headers.get("server-timing", ""))
+            if match:
+                queries.append(int(match[1]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    extra = {
+        "concurrency": concurrency,
+        "errors": errors,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+    if not latencies:
+        return {"name": name, "operations": 0, **extra}
+    return summarize(name, latencies, queries, elapsed=elapsed, **extra)
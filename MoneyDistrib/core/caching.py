@@ -0,0 +1,178 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import CustomUser
+from .pagination import KeysetPage, decode_cursor, keyset_paginate
+from .shards import add_shard_balances
+
+# Псевдоним кэша страниц списка пользователей (см. CACHES в settings).
+USERS_CACHE = "users"
+
+# Бэкенды кэша Django, которые не видны другим процессам: сброс кэша в
+# одном процессе не дошел бы до остальных, поэтому кэши, которые сбрасываются
+# после изменений в базе, с ними не работают.
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+# Число счетов, начиная с которого перевод сбрасывает весь кэш списка
+# пользователей вместо версий отдельных счетов.
+MAX_INVALIDATED_ACCOUNTS = 1000
+
+TABLE_KEY = "users:table"
+GENERATION_KEY = "users:generation"
+
+
+def account_key(pk):
+    return f"users:account:{pk}"
+
+
+def get_token(cache, key):
+    """
+    Возвращает метку key, создавая ее, если метки нет в кэше.
+    """
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        token = cache.get(key)
+    return token
+
+
+def get_account_tokens(cache, pks):
+    """
+    Возвращает словарь pk -> метка версии счета, создавая недостающие
+    метки. Отсутствие метки не считается версией: иначе вытесненная из
+    кэша метка совпала бы с меткой страницы, сохраненной до перевода.
+    """
+    keys = {account_key(pk): pk for pk in pks}
+    tokens = cache.get_many(keys)
+    for key in keys.keys() - tokens.keys():
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+    if len(tokens) < len(keys):
+        tokens = cache.get_many(keys)
+    return {keys[key]: token for key, token in tokens.items()}
+
+
+def shared_users_cache():
+    """
+    Возвращает кэш страниц списка пользователей или None, если он хранится
+    в памяти процесса (см. PROCESS_LOCAL_CACHES): сброс страниц после
+    перевода в одном процессе не дошел бы до остальных, и они до истечения
+    USERS_PAGE_CACHE_TTL показывали бы прежние балансы.
+    """
+    cache = caches[USERS_CACHE]
+    if isinstance(cache, PROCESS_LOCAL_CACHES):
+        return None
+    return cache
+
+
+def page_key(table, cursor, page_size):
+    key = repr((decode_cursor(cursor), page_size)).encode()
+    return f"users:page:{table}:{hashlib.md5(key).hexdigest()}"
+
+
+def users_page(cursor, page_size):
+    """
+    Возвращает страницу списка пользователей главной страницы (см.
+    keyset_paginate) из кэша или из базы. Баланс счета с сегментами
+    показывается вместе с сегментами (см. add_shard_balances).
+
+    Вместе со строками страницы хранятся метки версий ее счетов. Перевод
+    после фиксации заменяет метки затронутых счетов (invalidate_accounts),
+    поэтому страница с измененным балансом больше не считается актуальной,
+    а страницы с другими счетами остаются в кэше. Появление, удаление и
+    переименование пользователей меняют состав страниц и сбрасывают весь
+    кэш списка (invalidate_users_table).
+
+    Страница из базы сохраняется, только если за время ее чтения не была
+    зафиксирована ни одна операция со счетами (метка поколения не
+    изменилась): иначе метки версий, прочитанные после запроса, могли бы
+    оказаться новее прочитанных балансов. Если кэш не общий для процессов
+    (см. shared_users_cache), страница всегда читается из базы.
+    """
+    cache = shared_users_cache()
+    if cache is None:
+        return load_users_page(cursor, page_size)
+    table = get_token(cache, TABLE_KEY)
+    key = page_key(table, cursor, page_size)
+
+    cached = cache.get(key)
+    if cached is not None:
+        rows, next_cursor, tokens = cached
+        if get_account_tokens(cache, tokens) == tokens:
+            return KeysetPage(rows, next_cursor)
+
+    generation = get_token(cache, GENERATION_KEY)
+    page = load_users_page(cursor, page_size)
+    tokens = get_account_tokens(cache, [row["id"] for row in page])
+    if cache.get(GENERATION_KEY) == generation:
+        cache.set(
+            key,
+            (page.rows, page.next_cursor, tokens),
+            settings.USERS_PAGE_CACHE_TTL,
+        )
+    return page
+
+
+def load_users_page(cursor, page_size):
+    """
+    Читает страницу списка пользователей из базы.
+    """
+    page = keyset_paginate(
+        CustomUser.objects.exclude(inn="").values(
+            "id", "username", "inn", "balance", "balance_shards"
+        ),
+        cursor,
+        page_size,
+    )
+    add_shard_balances(page.rows)
+    return page
+
+
+def invalidate_accounts(pks):
+    """
+    Помечает измененными страницы списка пользователей со счетами pks. Если
+    счетов больше MAX_INVALIDATED_ACCOUNTS, сбрасывает весь кэш списка.
+    """
+    cache = shared_users_cache()
+    if cache is None:
+        return
+    token = uuid.uuid4().hex
+    cache.set(GENERATION_KEY, token, timeout=None)
+    if len(pks) > MAX_INVALIDATED_ACCOUNTS:
+        cache.set(TABLE_KEY, token, timeout=None)
+    else:
+        cache.set_many({account_key(pk): token for pk in pks}, timeout=None)
+
+
+def invalidate_accounts_on_commit(pks):
+    """
+    Сбрасывает кэш страниц со счетами pks после фиксации текущей
+    транзакции: до фиксации другие запросы еще видят старые балансы.
+    """
+    pks = list(pks)
+    transaction.on_commit(lambda: invalidate_accounts(pks))
+
+
+def invalidate_users_table():
+    """
+    Сбрасывает весь кэш списка пользователей.
+    """
+    cache = shared_users_cache()
+    if cache is None:
+        return
+    token = uuid.uuid4().hex
+    cache.set(GENERATION_KEY, token, timeout=None)
+    cache.set(TABLE_KEY, token, timeout=None)
+
+
+def invalidate_users_table_on_commit():
+    """
+    Сбрасывает весь кэш списка пользователей после фиксации текущей
+    транзакции.
+    """
+    transaction.on_commit(invalidate_users_table)
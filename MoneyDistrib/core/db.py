@@ -0,0 +1,30 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import record_query
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Переключает базу SQLite в режим журнала WAL: читатели не блокируют
+    писателя и наоборот, а synchronous=NORMAL в этом режиме сохраняет
+    целостность базы при меньшем числе fsync. Для других СУБД ничего не
+    делает.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """
+    Подключает учет запросов к базе в метриках HTTP-запросов (см.
+    record_query). Сигнал приходит при каждом переподключении, поэтому
+    обертка добавляется в объект подключения только один раз.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
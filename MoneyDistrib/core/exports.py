@@ -0,0 +1,179 @@
+import csv
+import json
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CustomUser, LedgerEntry
+from .money import Money
+from .pagination import keyset_chunks
+from .shards import add_shard_balances
+from .uploads import parse_amount
+from .utils import Echo, prefix_filter
+
+# Форматы выгрузки и их типы содержимого.
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+BALANCE_COLUMNS = ("id", "inn", "username", "balance")
+STATEMENT_COLUMNS = (
+    "id",
+    "created_at",
+    "transfer",
+    "adjustment",
+    "shard",
+    "amount",
+    "balance_after",
+)
+
+
+def parse_export_format(value):
+    """
+    Проверяет формат выгрузки (по умолчанию csv). Некорректное значение -
+    ValueError.
+    """
+    value = value or "csv"
+    if value not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Формат выгрузки должен быть одним из: {', '.join(EXPORT_FORMATS)}"
+        )
+    return value
+
+
+def parse_balance_filters(min_balance=None, max_balance=None, inn_prefix=None):
+    """
+    Разбирает фильтры выгрузки балансов: границы баланса в рублях (как в
+    файле распределения) и префикс ИНН. Пустые значения означают отсутствие
+    фильтра. Возвращает словарь аргументов balance_chunks, некорректные
+    значения - ValueError.
+    """
+    filters = {"inn_prefix": inn_prefix or ""}
+    for name, value in (("min_balance", min_balance), ("max_balance", max_balance)):
+        filters[name] = None
+        if value:
+            filters[name] = parse_amount(value, allow_zero=True)
+            if filters[name] is None:
+                raise ValueError(f"Параметр {name} должен быть неотрицательной суммой")
+    prefix = filters["inn_prefix"]
+    if prefix and (not prefix.isdecimal() or len(prefix) > 12):
+        raise ValueError("Параметр inn_prefix должен состоять из цифр ИНН")
+    return filters
+
+
+def parse_statement_period(since=None, until=None):
+    """
+    Разбирает период выписки: даты since и until (включительно) в формате
+    ГГГГ-ММ-ДД. Возвращает словарь аргументов statement_chunks с границами
+    [since, until + 1 день) в текущем часовом поясе, некорректные даты -
+    ValueError.
+    """
+    period = {}
+    for name, value, shift in (("since", since, 0), ("until", until, 1)):
+        period[name] = None
+        if value:
+            try:
+                day = date.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Параметр {name} должен быть датой ГГГГ-ММ-ДД")
+            period[name] = timezone.make_aware(
+                datetime.combine(day + timedelta(days=shift), time.min)
+            )
+    return period
+
+
+def balance_chunks(chunk_size, min_balance=None, max_balance=None, inn_prefix=""):
+    """
+    Выдает пачками по chunk_size строк балансы пользователей с ИНН в
+    порядке id: словари с полями BALANCE_COLUMNS и балансом в рублях.
+    Читаются только нужные колонки, пачки - отдельными запросами (см.
+    keyset_chunks), поэтому память не зависит от числа счетов.
+
+    Баланс счета с сегментами складывается с сегментами (см.
+    add_shard_balances), и фильтр по балансу для таких счетов проверяется
+    после этого, а не в запросе.
+    """
+    users = CustomUser.objects.exclude(inn="")
+    if inn_prefix:
+        users = users.filter(prefix_filter("inn", inn_prefix))
+    in_range = Q()
+    if min_balance is not None:
+        in_range &= Q(balance__gte=min_balance)
+    if max_balance is not None:
+        in_range &= Q(balance__lte=max_balance)
+    if in_range:
+        users = users.filter(in_range | Q(balance_shards__gt=0))
+
+    rows = users.values("id", "inn", "username", "balance", "balance_shards")
+    for chunk in keyset_chunks(rows, chunk_size):
+        add_shard_balances(chunk)
+        chunk = [
+            {
+                "id": row["id"],
+                "inn": row["inn"],
+                "username": row["username"],
+                "balance": str(Money(row["balance"])),
+            }
+            for row in chunk
+            if (min_balance is None or row["balance"] >= min_balance)
+            and (max_balance is None or row["balance"] <= max_balance)
+        ]
+        if chunk:
+            yield chunk
+
+
+def statement_chunks(account_id, chunk_size, since=None, until=None):
+    """
+    Выдает пачками по chunk_size строк выписку по счету account_id - его
+    проводки за период [since, until) в порядке (created_at, id): словари с
+    полями STATEMENT_COLUMNS и суммами в рублях. Пачки читаются отдельными
+    запросами по индексу (account, created_at), поэтому память не зависит
+    от длины истории.
+    """
+    entries = LedgerEntry.objects.filter(account_id=account_id)
+    if since is not None:
+        entries = entries.filter(created_at__gte=since)
+    if until is not None:
+        entries = entries.filter(created_at__lt=until)
+
+    rows = entries.values(
+        "id",
+        "created_at",
+        "transfer_id",
+        "adjustment_id",
+        "shard",
+        "amount",
+        "balance_after",
+    )
+    for chunk in keyset_chunks(rows, chunk_size, ("created_at", "id")):
+        yield [
+            {
+                "id": row["id"],
+                "created_at": row["created_at"].isoformat(),
+                "transfer": row["transfer_id"],
+                "adjustment": row["adjustment_id"],
+                "shard": row["shard"],
+                "amount": str(Money(row["amount"])),
+                "balance_after": str(Money(row["balance_after"])),
+            }
+            for row in chunk
+        ]
+
+
+def render_chunks(chunks, columns, export_format):
+    """
+    Выдает выгрузку в формате export_format по строке на пачку chunks:
+    CSV с заголовком columns или JSON Lines (объект на строку).
+    """
+    if export_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(columns)
+        for chunk in chunks:
+            yield "".join(
+                writer.writerow([row[column] for column in columns]) for row in chunk
+            )
+    else:
+        for chunk in chunks:
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk)
@@ -1,7 +1,14 @@
+import uuid
+
 from django import forms
 from django.core.exceptions import ValidationError
+from django.core.validators import FileExtensionValidator
 
+from .inns import is_valid_inn, parse_inn_list, resolve_inns
+from .metrics import timed
 from .models import CustomUser
+from .money import to_cents
+from .widgets import SenderLookupWidget
 
 
 class MoneyTransferForm(forms.Form):
@@ -13,7 +20,7 @@ class MoneyTransferForm(forms.Form):
     sender = forms.ModelChoiceField(
         queryset=CustomUser.objects.exclude(inn=""),
         label="Отправитель",
-        widget=forms.Select(attrs={"class": "form-control"}),
+        widget=SenderLookupWidget(attrs={"class": "form-control"}),
     )
     inn_list = forms.CharField(
         label="Список ИНН получателей",
@@ -22,33 +29,48 @@ class MoneyTransferForm(forms.Form):
     )
     amount = forms.DecimalField(
         label="Сумма перевода (на всех получателей)",
-        max_digits=10,
+        max_digits=17,
         decimal_places=2,
         widget=forms.NumberInput(
             attrs={"class": "form-control", "step": 0.01, "min": 0}
         ),
     )
+    background = forms.BooleanField(
+        label="Выполнить в фоне",
+        required=False,
+        help_text="Для больших распределений: перевод выполнит фоновый обработчик",
+    )
+    idempotency_key = forms.CharField(
+        max_length=255,
+        required=False,
+        initial=uuid.uuid4,
+        widget=forms.HiddenInput,
+    )
+
+    def clean_sender(self):
+        """
+        Метод clean_sender запоминает выбранного отправителя в виджете, чтобы
+        при повторной отрисовке формы показать его без запроса к базе.
+        """
+        sender = self.cleaned_data["sender"]
+        self.fields["sender"].widget.selected_label = str(sender)
+        return sender
+
+    def clean_amount(self):
+        """
+        Метод clean_amount переводит сумму перевода в копейки.
+        """
+        return to_cents(self.cleaned_data["amount"])
 
     def clean_inn_list(self):
         """
         Метод clean_inn_list проверяет валидность и уникальность ИНН в списке
         получателей и возвращает список объектов CustomUser, соответствующих ИНН.
+        Все пользователи загружаются пачками запросов inn__in, а ошибки по всем
+        ИНН возвращаются сразу.
         """
-        inn_list = self.cleaned_data["inn_list"]
-
-        inns = [
-            inn.strip() for inn in inn_list.replace(",", " ").split() if inn.strip()
-        ]
-
-        for inn in inns:
-            if not is_valid_inn(inn):
-                raise ValidationError(f"Некорректный ИНН: {inn}")
-            if not CustomUser.objects.filter(inn=inn).exists():
-                raise ValidationError(f"Пользователь с ИНН {inn} не найден")
-            if len(set(inns)) != len(inns):
-                raise ValidationError(f"В списке ИНН встречаются дубликаты")
-
-        return CustomUser.objects.filter(inn__in=inns)
+        with timed("inn_lookup"):
+            return resolve_inns(parse_inn_list(self.cleaned_data["inn_list"]))
 
     def clean(self):
         """
@@ -73,15 +95,75 @@ class MoneyTransferForm(forms.Form):
         if sender in inn_list:
             raise ValidationError(f"Нельзя отправить деньги самому себе")
 
-        if amount < 0 or amount is None:
+        if amount is None or amount < 0:
             raise ValidationError(f"Сумма должна быть положительной.")
 
-        if amount > sender.balance:
+        if amount > sender.total_balance:
             raise ValidationError(f"У отправителя недостаточно средств.")
 
 
-def is_valid_inn(inn):
+class DistributionUploadForm(forms.Form):
     """
-    Функция is_valid_inn проверяет валидность ИНН на основе его длины и состава.
+    Класс DistributionUploadForm представляет собой форму загрузки файла
+    распределения (CSV или XLSX) с ИНН получателей и индивидуальными суммами.
     """
-    return inn.isdigit() and 10 <= len(inn) <= 12
+
+    sender = forms.ModelChoiceField(
+        queryset=CustomUser.objects.exclude(inn=""),
+        label="Отправитель",
+        widget=SenderLookupWidget(attrs={"class": "form-control"}),
+    )
+    file = forms.FileField(
+        label="Файл распределения",
+        help_text="CSV или XLSX: ИНН получателя и сумма в каждой строке",
+        validators=[FileExtensionValidator(["csv", "xlsx"])],
+    )
+    idempotency_key = forms.CharField(
+        max_length=255,
+        required=False,
+        initial=uuid.uuid4,
+        widget=forms.HiddenInput,
+    )
+
+
+class AccountImportForm(forms.Form):
+    """
+    Класс AccountImportForm представляет собой форму импорта пользователей
+    из файла (CSV или XLSX) в административном интерфейсе.
+    """
+
+    file = forms.FileField(
+        label="Файл пользователей",
+        help_text="CSV или XLSX: ИНН, имя пользователя, email, баланс, пароль",
+        validators=[FileExtensionValidator(["csv", "xlsx"])],
+    )
+    unusable_passwords = forms.BooleanField(
+        label="Без паролей",
+        required=False,
+        help_text="Не хешировать пароли из файла: пользователи не смогут "
+        "входить по паролю",
+    )
+
+
+class BalanceAdjustmentForm(forms.Form):
+    """
+    Класс BalanceAdjustmentForm представляет собой форму корректировки
+    баланса выбранных пользователей в административном интерфейсе.
+    """
+
+    amount = forms.DecimalField(
+        label="Сумма на каждый счет",
+        max_digits=17,
+        decimal_places=2,
+        help_text="Положительная сумма зачисляется, отрицательная списывается",
+    )
+    reason = forms.CharField(label="Основание", max_length=255)
+
+    def clean_amount(self):
+        """
+        Метод clean_amount переводит сумму корректировки в копейки.
+        """
+        amount = to_cents(self.cleaned_data["amount"])
+        if amount == 0:
+            raise ValidationError(f"Сумма корректировки не может быть нулевой.")
+        return amount
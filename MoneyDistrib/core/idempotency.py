@@ -0,0 +1,121 @@
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+
+from .models import IdempotencyKey
+
+# Заголовки ответа, которые сохраняются вместе с ключом и воспроизводятся
+# при повторном запросе.
+STORED_HEADERS = ("Content-Type", "Content-Disposition", "Location")
+
+REPLAY_HEADER = "Idempotent-Replayed"
+
+
+class IdempotencyKeyReused(Exception):
+    """
+    Ключ идемпотентности уже использован для запроса с другими данными.
+    """
+
+    def __init__(self):
+        super().__init__("Ключ идемпотентности уже использован для другого запроса")
+
+
+def request_fingerprint(data):
+    """
+    Возвращает отпечаток нормализованных данных запроса data - SHA-256 их
+    записи в JSON с упорядоченными ключами.
+    """
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def replay_response(key, fingerprint=""):
+    """
+    Возвращает сохраненный ответ на запрос с ключом key или None, если
+    запрос с таким ключом еще не выполнялся. Выполняет один запрос по
+    уникальному индексу и не обращается к счетам. Если ключ сохранен с
+    другим отпечатком данных, выбрасывает IdempotencyKeyReused.
+    """
+    if not key:
+        return None
+    stored = (
+        IdempotencyKey.objects.filter(key=key, status_code__isnull=False)
+        .values_list("status_code", "headers", "body", "fingerprint")
+        .first()
+    )
+    if stored is None:
+        return None
+    return stored_response(*stored, fingerprint)
+
+
+async def areplay_response(key, fingerprint=""):
+    """
+    Асинхронный вариант replay_response для асинхронных представлений.
+    """
+    if not key:
+        return None
+    stored = await (
+        IdempotencyKey.objects.filter(key=key, status_code__isnull=False)
+        .values_list("status_code", "headers", "body", "fingerprint")
+        .afirst()
+    )
+    if stored is None:
+        return None
+    return stored_response(*stored, fingerprint)
+
+
+def stored_response(status_code, headers, body, stored_fingerprint, fingerprint):
+    """
+    Восстанавливает ответ, сохраненный вместе с ключом идемпотентности,
+    если отпечаток данных запроса fingerprint совпадает с сохраненным.
+    Ключи, сохраненные без отпечатка, не проверяются.
+    """
+    if stored_fingerprint and stored_fingerprint != fingerprint:
+        raise IdempotencyKeyReused()
+    response = HttpResponse(body, status=status_code)
+    for name, value in headers.items():
+        response[name] = value
+    response[REPLAY_HEADER] = "true"
+    return response
+
+
+def idempotent_response(key, action, fingerprint=""):
+    """
+    Выполняет action() - функцию, возвращающую HttpResponse, - не более
+    одного раза для ключа key. Вместе с ключом сохраняется отпечаток данных
+    запроса fingerprint (см. request_fingerprint), и повтор ключа с другими
+    данными выбрасывает IdempotencyKeyReused.
+
+    Ключ резервируется вставкой в уникальный индекс в той же транзакции,
+    что и action, а ответ сохраняется перед ее фиксацией. Параллельный
+    запрос с тем же ключом ждет фиксации на уникальном индексе и получает
+    сохраненный ответ. Если action выбрасывает исключение, ключ не
+    сохраняется, и запрос можно повторить.
+    """
+    if not key:
+        return action()
+
+    replay = replay_response(key, fingerprint)
+    if replay is not None:
+        return replay
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(key=key, fingerprint=fingerprint)
+            response = action()
+            record.status_code = response.status_code
+            record.headers = {
+                name: response[name]
+                for name in STORED_HEADERS
+                if response.has_header(name)
+            }
+            record.body = response.content.decode(response.charset)
+            record.save(update_fields=["status_code", "headers", "body"])
+    except IntegrityError:
+        replay = replay_response(key, fingerprint)
+        if replay is None:
+            raise
+        return replay
+    return response
@@ -0,0 +1,262 @@
+import threading
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connection, transaction
+
+from .caching import PROCESS_LOCAL_CACHES, get_token
+from .models import CustomUser
+from .pagination import keyset_chunks
+from .utils import QUERY_CHUNK_SIZE, chunks
+
+# Ключ метки поколения кэша ИНН в кэше Django INN_CACHE_ALIAS. Смена
+# метки сбрасывает кэш во всех процессах.
+INN_GENERATION_KEY = "inns:generation"
+
+
+def inn_key(token, inn):
+    return f"inns:{token}:{inn}"
+
+
+class InnCache:
+    """
+    Класс InnCache представляет собой ограниченный LRU-кэш соответствия
+    ИНН -> id счета в памяти процесса на INN_CACHE_SIZE записей. Записи
+    принадлежат одному поколению: обращение с другим поколением сначала
+    очищает кэш.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.generation = None
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def switch(self, generation):
+        if generation != self.generation:
+            self.entries.clear()
+            self.generation = generation
+
+    def get_many(self, inns, generation):
+        found = {}
+        with self.lock:
+            self.switch(generation)
+            for inn in inns:
+                pk = self.entries.get(inn)
+                if pk is not None:
+                    self.entries.move_to_end(inn)
+                    found[inn] = pk
+        return found
+
+    def set_many(self, account_ids, generation):
+        with self.lock:
+            self.switch(generation)
+            for inn, pk in account_ids.items():
+                self.entries[inn] = pk
+                self.entries.move_to_end(inn)
+            while len(self.entries) > settings.INN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+        Очищает кэш и меняет номер версии version, входящий в поколение:
+        записи, прочитанные из базы до сброса, в кэш уже не попадут.
+        """
+        with self.lock:
+            self.version += 1
+            self.entries.clear()
+
+
+inn_cache = InnCache()
+
+
+def is_valid_inn(inn):
+    """
+    Функция is_valid_inn проверяет валидность ИНН на основе его длины и состава.
+    """
+    return inn.isdigit() and 10 <= len(inn) <= 12
+
+
+def parse_inn_list(inn_list):
+    """
+    Разбивает строку с ИНН, разделенными запятыми или пробелами, на список.
+    """
+    return inn_list.replace(",", " ").split()
+
+
+def shared_inn_cache():
+    """
+    Возвращает кэш Django INN_CACHE_ALIAS, общий для процессов сервера, или
+    None, если кэш ИНН отключен: не задан INN_CACHE_SIZE или
+    INN_CACHE_ALIAS либо этот кэш хранится в памяти процесса (см.
+    PROCESS_LOCAL_CACHES). Иначе другой процесс мог бы продолжить находить
+    по ИНН прежний счет после изменения ИНН и зачислить деньги не тому
+    пользователю.
+    """
+    if not settings.INN_CACHE_SIZE or not settings.INN_CACHE_ALIAS:
+        return None
+    cache = caches[settings.INN_CACHE_ALIAS]
+    if isinstance(cache, PROCESS_LOCAL_CACHES):
+        return None
+    return cache
+
+
+def inn_cache_generation():
+    """
+    Возвращает текущее поколение кэша ИНН: номер версии кэша процесса и
+    метку поколения в общем кэше.
+    """
+    return inn_cache.version, get_token(shared_inn_cache(), INN_GENERATION_KEY)
+
+
+def invalidate_inns():
+    """
+    Сбрасывает кэш ИНН процесса и, если кэш ИНН включен, общий кэш ИНН.
+    """
+    shared = shared_inn_cache()
+    if shared is not None:
+        shared.set(INN_GENERATION_KEY, uuid.uuid4().hex, timeout=None)
+    inn_cache.invalidate()
+
+
+def invalidate_inns_on_commit():
+    """
+    Сбрасывает кэш ИНН после фиксации текущей транзакции: до фиксации
+    другие запросы еще видят старые ИНН и могут снова заполнить кэш.
+    """
+    transaction.on_commit(invalidate_inns)
+
+
+def load_account_ids(inns, chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Загружает из базы словарь ИНН -> id счета для inns запросами inn__in по
+    chunk_size ИНН. Ненайденных ИНН в словаре нет.
+    """
+    account_ids = {}
+    for chunk in chunks(inns, chunk_size):
+        account_ids.update(
+            CustomUser.objects.filter(inn__in=chunk).values_list("inn", "pk")
+        )
+    return account_ids
+
+
+def store_account_ids(account_ids, generation):
+    """
+    Сохраняет соответствия account_ids, прочитанные из базы в поколении
+    generation, в кэш процесса и общий кэш, если поколение не сменилось за
+    время чтения.
+    """
+    if not account_ids or inn_cache_generation() != generation:
+        return
+    inn_cache.set_many(account_ids, generation)
+    shared_inn_cache().set_many(
+        {inn_key(generation[1], inn): pk for inn, pk in account_ids.items()},
+        timeout=None,
+    )
+
+
+def account_ids_by_inn(inns, chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Возвращает словарь ИНН -> id счета для inns (ненайденных ИНН в нем
+    нет). Соответствия ищутся в LRU-кэше процесса, затем в общем кэше
+    INN_CACHE_ALIAS и только для оставшихся ИНН - в базе (см.
+    load_account_ids), после чего найденные попадают в оба кэша. Поэтому
+    повторные списки получателей не обращаются к базе. Отсутствие ИНН не
+    кэшируется: новый пользователь находится сразу.
+
+    Кэш сбрасывается целиком после фиксации изменения ИНН или удаления
+    пользователя (см. core.signals) во всех процессах, поэтому работает
+    только с общим кэшем (см. shared_inn_cache). Внутри транзакции кэш не
+    используется:
+    она может видеть свои еще не зафиксированные изменения ИНН, а
+    прочитанное в ней может быть отменено.
+    """
+    shared = shared_inn_cache()
+    if shared is None or connection.in_atomic_block:
+        return load_account_ids(inns, chunk_size)
+
+    generation = inn_cache_generation()
+    account_ids = inn_cache.get_many(inns, generation)
+    missing = [inn for inn in inns if inn not in account_ids]
+
+    if missing:
+        keys = {inn_key(generation[1], inn): inn for inn in missing}
+        found = {keys[key]: pk for key, pk in shared.get_many(keys).items()}
+        inn_cache.set_many(found, generation)
+        account_ids.update(found)
+        missing = [inn for inn in missing if inn not in found]
+
+    if missing:
+        loaded = load_account_ids(missing, chunk_size)
+        store_account_ids(loaded, generation)
+        account_ids.update(loaded)
+    return account_ids
+
+
+def warm_inn_cache(chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Сбрасывает кэш ИНН во всех процессах и заполняет его соответствиями
+    всех пользователей с ИНН, читая их пачками по chunk_size (см.
+    keyset_chunks). В кэш процесса попадают последние INN_CACHE_SIZE из них.
+    Кэш ИНН должен быть включен (см. shared_inn_cache). Возвращает число
+    прочитанных ИНН.
+    """
+    invalidate_inns()
+    generation = inn_cache_generation()
+    rows = CustomUser.objects.exclude(inn="").values("id", "inn")
+    count = 0
+    for chunk in keyset_chunks(rows, chunk_size):
+        store_account_ids({row["inn"]: row["id"] for row in chunk}, generation)
+        count += len(chunk)
+    return count
+
+
+def resolve_inns(inns, chunk_size=QUERY_CHUNK_SIZE):
+    """
+    Проверяет список ИНН за один проход и находит счета получателей через
+    кэш ИНН (см. account_ids_by_inn), загружая недостающие запросами
+    inn__in по chunk_size ИНН.
+
+    Возвращает список CustomUser в порядке следования ИНН, у которых
+    загружены только pk и ИНН (остальные поля читаются при обращении, как
+    после QuerySet.only()). Если в списке
+    есть некорректные, повторяющиеся или ненайденные ИНН, выбрасывает
+    ValidationError со всеми ошибками сразу.
+    """
+    errors = []
+    seen = set()
+    duplicates = set()
+    valid_inns = []
+
+    for inn in inns:
+        if not is_valid_inn(inn):
+            errors.append(ValidationError(f"Некорректный ИНН: {inn}"))
+        elif inn in seen:
+            duplicates.add(inn)
+        else:
+            seen.add(inn)
+            valid_inns.append(inn)
+
+    if duplicates:
+        errors.append(
+            ValidationError(
+                f"В списке ИНН встречаются дубликаты: {', '.join(sorted(duplicates))}"
+            )
+        )
+
+    account_ids = account_ids_by_inn(valid_inns, chunk_size)
+
+    for inn in valid_inns:
+        if inn not in account_ids:
+            errors.append(ValidationError(f"Пользователь с ИНН {inn} не найден"))
+
+    if errors:
+        raise ValidationError(errors)
+
+    return [
+        CustomUser.from_db(DEFAULT_DB_ALIAS, ["id", "inn"], [account_ids[inn], inn])
+        for inn in valid_inns
+    ]
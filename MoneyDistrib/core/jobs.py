@@ -0,0 +1,108 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DistributionJob
+from .services import settle, split_amount
+
+Status = DistributionJob.Status
+
+
+class JobConflict(Exception):
+    """
+    Пачка задания уже обработана другим обработчиком.
+    """
+
+
+def submit_distribution(sender, acceptors, amount):
+    """
+    Ставит распределение суммы amount копеек поровну между acceptors
+    в очередь фонового обработчика. Возвращает созданное задание DistributionJob.
+    """
+    amounts = split_amount(amount, len(acceptors))
+    return DistributionJob.objects.create(
+        sender=sender,
+        credits=[[acceptor.pk, part] for acceptor, part in zip(acceptors, amounts)],
+        total=len(acceptors),
+    )
+
+
+def claim_job(stale_after=None):
+    """
+    Захватывает самое старое ожидающее задание, а при указанном stale_after
+    также задание, зависшее в статусе running дольше stale_after (например,
+    после падения обработчика). Захват выполняется условным UPDATE, поэтому
+    одно задание не достанется двум обработчикам. Возвращает задание или None.
+    """
+    now = timezone.now()
+    candidates = DistributionJob.objects.filter(status=Status.PENDING)
+    if stale_after is not None:
+        candidates = candidates | DistributionJob.objects.filter(
+            status=Status.RUNNING, updated_at__lt=now - stale_after
+        )
+
+    candidates = candidates.order_by("created_at", "pk").only("status", "updated_at")
+    for job in candidates[:10]:
+        claimed = DistributionJob.objects.filter(
+            pk=job.pk, status=job.status, updated_at=job.updated_at
+        ).update(status=Status.RUNNING, updated_at=now)
+        if claimed:
+            return DistributionJob.objects.get(pk=job.pk)
+    return None
+
+
+def fail_job(job, error):
+    """
+    Переводит задание в статус ошибки с сообщением error.
+    """
+    DistributionJob.objects.filter(pk=job.pk).update(
+        status=Status.FAILED, error=error, updated_at=timezone.now()
+    )
+
+
+def resume_job(pk):
+    """
+    Возобновляет задание pk, завершившееся ошибкой: возвращает его в
+    очередь, и обработчик продолжает его с первой необработанной пачки.
+    Возвращает False, если задание не в статусе ошибки.
+    """
+    return bool(
+        DistributionJob.objects.filter(pk=pk, status=Status.FAILED).update(
+            status=Status.PENDING, error="", updated_at=timezone.now()
+        )
+    )
+
+
+def run_job(job, batch_size):
+    """
+    Выполняет задание пачками по batch_size получателей начиная с
+    job.processed. Каждая пачка переводится отдельной транзакцией вместе
+    с продвижением счетчика processed.
+
+    Если пачку выполнить нельзя (например, у отправителя не хватает
+    средств), задание переводится в статус ошибки: уже переведенные пачки
+    остаются выполненными, а после устранения причины задание можно
+    возобновить (см. resume_job).
+    """
+    sender = job.sender
+    while job.processed < job.total:
+        start = job.processed
+        batch = [(pk, amount) for pk, amount in job.credits[start : start + batch_size]]
+        try:
+            with transaction.atomic():
+                advanced = DistributionJob.objects.filter(
+                    pk=job.pk, processed=start
+                ).update(processed=start + len(batch), updated_at=timezone.now())
+                if not advanced:
+                    raise JobConflict()
+                settle(sender, batch)
+        except JobConflict:
+            return
+        except ValidationError as e:
+            fail_job(job, " ".join(e.messages))
+            return
+        job.processed = start + len(batch)
+
+    DistributionJob.objects.filter(pk=job.pk).update(
+        status=Status.DONE, updated_at=timezone.now()
+    )
@@ -0,0 +1,277 @@
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmarks import http_load, http_request, seed_users
+from core.models import CustomUser
+
+SCENARIOS = ("search", "transfer")
+
+# Сколько секунд ждать, пока запущенный сервер начнет принимать соединения.
+SERVER_START_TIMEOUT = 30
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Сервер завершился с кодом {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f"Сервер не начал принимать соединения на порту {port}")
+
+
+@contextmanager
+def run_server(command, port, **env):
+    """
+    Запускает сервер приложения командой command с дополнительными
+    переменными окружения env и ждет, пока он начнет принимать соединения на
+    порту port. После блока with сервер останавливается.
+    """
+    process = subprocess.Popen(
+        command, cwd=settings.BASE_DIR, env={**os.environ, **env}
+    )
+    try:
+        wait_for_port(port, process)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=SERVER_START_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class Command(BaseCommand):
+    """
+    Команда benchmark_http сравнивает число одновременных соединений, которое
+    выдерживают серверы приложения: ASGI (uvicorn, MoneyDistrib.asgi) с
+    асинхронными представлениями и WSGI (gunicorn, MoneyDistrib.wsgi). Для
+    каждого сервера, сценария (поиск пользователей, перевод через JSON API)
+    и уровня параллельности выполняется заданное число запросов, каждый в
+    своем соединении, и выводятся p50/p99 задержки, число ответов в секунду,
+    число ошибок и запросов к базе на ответ в формате JSON.
+
+    Серверы работают с базой из настроек, поэтому переводы меняют балансы:
+    запускайте замер на отдельной базе. Без --target команда сама запускает
+    оба сервера с одинаковым числом процессов.
+    """
+
+    help = "Сравнивает задержку и пропускную способность серверов ASGI и WSGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            default=[],
+            metavar="NAME=URL",
+            help="Уже запущенный сервер, например asgi=http://127.0.0.1:8000",
+        )
+        parser.add_argument(
+            "--workers", type=int, default=2, help="Число процессов каждого сервера"
+        )
+        parser.add_argument(
+            "--wsgi-threads",
+            type=int,
+            default=1,
+            help="Число потоков в процессе gunicorn",
+        )
+        parser.add_argument(
+            "--concurrency",
+            default="1,10,100",
+            help="Числа одновременных соединений через запятую",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Число запросов на каждый уровень параллельности",
+        )
+        parser.add_argument(
+            "--scenario",
+            default=",".join(SCENARIOS),
+            help="Сценарии через запятую: search, transfer",
+        )
+        parser.add_argument(
+            "--recipients",
+            type=int,
+            default=10,
+            help="Число получателей в сценарии transfer",
+        )
+        parser.add_argument(
+            "--seed-users",
+            type=int,
+            default=0,
+            help="Сколько пользователей засеять в базу перед замером",
+        )
+        parser.add_argument("--output", help="Файл для результатов в формате JSON")
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",")]
+        except ValueError:
+            raise CommandError("--concurrency должен быть списком чисел через запятую")
+        scenarios = options["scenario"].split(",")
+        if not set(scenarios) <= set(SCENARIOS):
+            raise CommandError(
+                f"Неизвестный сценарий, доступны: {', '.join(SCENARIOS)}"
+            )
+        targets = self.parse_targets(options["target"])
+
+        if options["seed_users"]:
+            seed_users(options["seed_users"])
+        requests = {
+            scenario: getattr(self, f"{scenario}_requests")(options)
+            for scenario in scenarios
+        }
+
+        with ExitStack() as stack:
+            if not targets:
+                targets = self.start_servers(stack, options)
+            results = [
+                {
+                    "target": target,
+                    **asyncio.run(
+                        http_load(
+                            scenario,
+                            lambda number: build(url, number),
+                            level,
+                            options["requests"],
+                        )
+                    ),
+                }
+                for target, url in targets.items()
+                for scenario, build in requests.items()
+                for level in levels
+            ]
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "targets": targets,
+                "requests": options["requests"],
+            },
+            "results": results,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
+
+    def parse_targets(self, values):
+        targets = {}
+        for value in values:
+            name, separator, url = value.partition("=")
+            if not separator or not url.startswith("http://"):
+                raise CommandError("--target должен иметь вид NAME=http://host:port")
+            targets[name] = url.rstrip("/")
+        return targets
+
+    def start_servers(self, stack, options):
+        """
+        Запускает серверы ASGI и WSGI на свободных портах и возвращает их
+        адреса. Сервер ASGI запускается без постоянных подключений к базе
+        (CONN_MAX_AGE=0): под ASGI каждый запрос работает с базой в своем
+        потоке, и постоянные подключения копились бы до max_connections.
+        """
+        for module in ("uvicorn", "gunicorn"):
+            if importlib.util.find_spec(module) is None:
+                raise CommandError(
+                    "Для запуска серверов установите зависимости из "
+                    "requirements-deploy.txt или передайте --target"
+                )
+        workers = options["workers"]
+        asgi_port, wsgi_port = free_port(), free_port()
+        asgi = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "MoneyDistrib.asgi:application",
+            f"--port={asgi_port}",
+            f"--workers={workers}",
+            "--log-level=warning",
+        ]
+        wsgi = [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "MoneyDistrib.wsgi:application",
+            f"--bind=127.0.0.1:{wsgi_port}",
+            f"--workers={workers}",
+            f"--threads={options['wsgi_threads']}",
+            "--log-level=warning",
+        ]
+        return {
+            "asgi": stack.enter_context(run_server(asgi, asgi_port, CONN_MAX_AGE="0")),
+            "wsgi": stack.enter_context(run_server(wsgi, wsgi_port)),
+        }
+
+    def search_requests(self, options):
+        """
+        Возвращает построитель запросов поиска пользователей по префиксу
+        ИНН из одной цифры.
+        """
+        path = reverse("core:user_search")
+
+        def build(url, number):
+            return http_request("GET", f"{url}{path}?q={number % 10}")
+
+        return build
+
+    def transfer_requests(self, options):
+        """
+        Возвращает построитель переводов через JSON API от пользователя с
+        наибольшим балансом на первых по ИНН пользователей. Все переводы
+        идут от одного отправителя, поэтому конкурируют за строку его счета,
+        как при массовых выплатах.
+        """
+        users = CustomUser.objects.exclude(inn="")
+        sender = users.order_by("-balance").first()
+        recipients = list(
+            users.exclude(pk=getattr(sender, "pk", None))
+            .order_by("inn")
+            .values_list("inn", flat=True)[: options["recipients"]]
+        )
+        if len(recipients) < options["recipients"]:
+            raise CommandError(
+                "Недостаточно пользователей для сценария transfer, "
+                "засейте их параметром --seed-users"
+            )
+        path = reverse("core:api_transfers")
+        payload = {
+            "sender": sender.pk,
+            "recipients": recipients,
+            "amount": f"{options['recipients'] / 100:.2f}",
+        }
+
+        def build(url, number):
+            return http_request("POST", f"{url}{path}", payload)
+
+        return build
@@ -0,0 +1,129 @@
+import json
+import os
+import platform
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from core.benchmarks import TransferBenchmark, seed_users
+
+
+class Command(BaseCommand):
+    """
+    Команда benchmark_transfers замеряет задержку и пропускную способность
+    переводов: отображение главной страницы, перевод через форму и сервис
+    distribute_money на разное число получателей и параллельные переводы от
+    нескольких отправителей, в том числе с одного нагруженного счета с разным
+    числом сегментов баланса. Для каждого сценария выводятся p50/p99
+    задержки, число операций в секунду и число запросов к базе на операцию
+    в формате JSON, пригодном для сравнения между версиями.
+
+    Замер выполняется на отдельной тестовой базе, которая создается
+    миграциями и удаляется после замера, поэтому рабочие данные не
+    затрагиваются. Для SQLite тестовая база создается во временном файле,
+    а не в памяти, чтобы параллельные потоки работали с ней как с настоящей
+    базой.
+    """
+
+    help = "Замеряет производительность переводов на тестовой базе"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", type=int, default=20000, help="Число засеянных пользователей"
+        )
+        parser.add_argument(
+            "--recipients",
+            default="1,100,10000",
+            help="Числа получателей в сценариях через запятую",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=10, help="Число повторов каждого сценария"
+        )
+        parser.add_argument(
+            "--threads", type=int, default=4, help="Число параллельных отправителей"
+        )
+        parser.add_argument(
+            "--concurrent-recipients",
+            type=int,
+            default=10,
+            help="Число получателей в параллельных переводах",
+        )
+        parser.add_argument(
+            "--shards",
+            default="0,8",
+            help="Числа сегментов баланса отправителя в сценарии hot_sender "
+            "через запятую (пустая строка - без сценария)",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Начальное значение генератора"
+        )
+        parser.add_argument("--output", help="Файл для результатов в формате JSON")
+
+    def handle(self, *args, **options):
+        try:
+            recipients = [int(count) for count in options["recipients"].split(",")]
+        except ValueError:
+            raise CommandError("--recipients должен быть списком чисел через запятую")
+        try:
+            shards = [int(count) for count in options["shards"].split(",") if count]
+        except ValueError:
+            raise CommandError("--shards должен быть списком чисел через запятую")
+        needed = max(recipients + [options["concurrent_recipients"]])
+        if options["users"] <= needed + options["threads"]:
+            raise CommandError(
+                f"Нужно больше {needed + options['threads']} пользователей"
+            )
+
+        with tempfile.TemporaryDirectory() as directory:
+            results = self.run_on_test_db(directory, recipients, shards, options)
+
+        report = {
+            "meta": {
+                "created_at": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "users": options["users"],
+                "repeat": options["repeat"],
+                "seed": options["seed"],
+            },
+            "results": results,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output + "\n")
+        self.stdout.write(output)
+
+    def run_on_test_db(self, directory, recipients, shards, options):
+        """
+        Создает тестовую базу, засевает пользователей, выполняет сценарии и
+        удаляет базу.
+        """
+        old_name = connection.settings_dict["NAME"]
+        test_settings = connection.settings_dict["TEST"]
+        if connection.vendor == "sqlite":
+            connection.settings_dict["TEST"] = {
+                **test_settings,
+                "NAME": os.path.join(directory, "benchmark.sqlite3"),
+            }
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            benchmark = TransferBenchmark(
+                seed_users(options["users"]), seed=options["seed"]
+            )
+            return benchmark.run(
+                recipients,
+                options["repeat"],
+                options["threads"],
+                options["concurrent_recipients"],
+                shards,
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict["TEST"] = test_settings
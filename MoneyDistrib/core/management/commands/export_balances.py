@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import (
+    BALANCE_COLUMNS,
+    EXPORT_FORMATS,
+    balance_chunks,
+    parse_balance_filters,
+    render_chunks,
+)
+
+
+def write_export(command, content, path):
+    """
+    Записывает выгрузку content - итератор строк - в файл path или, если он
+    не задан, в стандартный вывод команды command по мере получения строк.
+    """
+    if not path:
+        for part in content:
+            command.stdout.write(part, ending="")
+        return
+    try:
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            for part in content:
+                file.write(part)
+    except OSError as e:
+        raise CommandError(f"Не удалось записать файл: {e}")
+
+
+class Command(BaseCommand):
+    """
+    Команда export_balances выгружает балансы пользователей в CSV или JSON
+    Lines с фильтрами по балансу и префиксу ИНН. Строки читаются из базы
+    пачками по --chunk-size и сразу записываются, поэтому память не зависит
+    от числа счетов.
+    """
+
+    help = "Выгружает балансы пользователей в CSV или JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=EXPORT_FORMATS, default="csv", help="Формат выгрузки"
+        )
+        parser.add_argument("--output", help="Файл выгрузки (по умолчанию - stdout)")
+        parser.add_argument("--min-balance", help="Наименьший баланс в рублях")
+        parser.add_argument("--max-balance", help="Наибольший баланс в рублях")
+        parser.add_argument("--inn-prefix", help="Префикс ИНН")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.EXPORT_CHUNK_SIZE,
+            help="Количество строк, читаемых из базы за один раз",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_balance_filters(
+                options["min_balance"], options["max_balance"], options["inn_prefix"]
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        chunks = balance_chunks(options["chunk_size"], **filters)
+        write_export(
+            self,
+            render_chunks(chunks, BALANCE_COLUMNS, options["format"]),
+            options["output"],
+        )
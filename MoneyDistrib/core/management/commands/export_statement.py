@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.exports import (
+    EXPORT_FORMATS,
+    STATEMENT_COLUMNS,
+    parse_statement_period,
+    render_chunks,
+    statement_chunks,
+)
+from core.management.commands.export_balances import write_export
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+    Команда export_statement выгружает выписку по счету пользователя -
+    проводки с балансом после каждой - в CSV или JSON Lines за выбранный
+    период. Проводки читаются из базы пачками по --chunk-size, поэтому
+    память не зависит от длины истории.
+    """
+
+    help = "Выгружает выписку по счету в CSV или JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("inn", help="ИНН пользователя")
+        parser.add_argument(
+            "--format", choices=EXPORT_FORMATS, default="csv", help="Формат выгрузки"
+        )
+        parser.add_argument("--output", help="Файл выгрузки (по умолчанию - stdout)")
+        parser.add_argument("--since", help="Первый день периода, ГГГГ-ММ-ДД")
+        parser.add_argument("--until", help="Последний день периода, ГГГГ-ММ-ДД")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.EXPORT_CHUNK_SIZE,
+            help="Количество строк, читаемых из базы за один раз",
+        )
+
+    def handle(self, *args, **options):
+        pk = (
+            CustomUser.objects.filter(inn=options["inn"])
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if pk is None:
+            raise CommandError(f"Пользователь с ИНН {options['inn']} не найден")
+        try:
+            period = parse_statement_period(options["since"], options["until"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        chunks = statement_chunks(pk, options["chunk_size"], **period)
+        write_export(
+            self,
+            render_chunks(chunks, STATEMENT_COLUMNS, options["format"]),
+            options["output"],
+        )
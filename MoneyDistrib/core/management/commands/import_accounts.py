@@ -0,0 +1,45 @@
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from core.accounts import import_accounts_file
+
+
+class Command(BaseCommand):
+    """
+    Команда import_accounts создает пользователей из CSV- или XLSX-файла с
+    колонками ИНН, имя пользователя, email, баланс и пароль или обновляет
+    имя и email уже существующих пользователей с теми же ИНН. Пользователи
+    записываются пачками в одной транзакции: при ошибке в любой строке
+    файл не импортируется.
+    """
+
+    help = "Импортирует пользователей из CSV- или XLSX-файла"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу CSV или XLSX")
+        parser.add_argument(
+            "--unusable-passwords",
+            action="store_true",
+            help="Не хешировать пароли из файла, а создать пользователей "
+            "без возможности входа по паролю",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], "rb") as file:
+                created, updated = import_accounts_file(
+                    File(file, name=options["path"]),
+                    unusable_passwords=options["unusable_passwords"],
+                )
+        except OSError as e:
+            raise CommandError(f"Не удалось открыть файл: {e}")
+        except ValidationError as e:
+            for error in e.messages:
+                self.stderr.write(error)
+            raise CommandError(f"Файл не импортирован: ошибок {len(e.messages)}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импорт завершен: создано {created}, обновлено {updated}"
+            )
+        )
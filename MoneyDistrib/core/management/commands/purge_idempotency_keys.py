@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+from core.utils import QUERY_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Команда purge_idempotency_keys удаляет ключи идемпотентности старше
+    IDEMPOTENCY_KEY_TTL секунд. Ключи удаляются пачками по индексу
+    created_at, чтобы не держать долгих блокировок.
+    """
+
+    help = "Удаляет устаревшие ключи идемпотентности"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ttl",
+            type=int,
+            default=settings.IDEMPOTENCY_KEY_TTL,
+            help="Время жизни ключа в секундах",
+        )
+
+    def handle(self, *args, **options):
+        expired = IdempotencyKey.objects.filter(
+            created_at__lt=timezone.now() - timedelta(seconds=options["ttl"])
+        )
+        deleted = 0
+        while True:
+            pks = list(expired.values_list("pk", flat=True)[:QUERY_CHUNK_SIZE])
+            if not pks:
+                break
+            deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write(f"Удалено ключей идемпотентности: {deleted}")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    """
+    Команда rebuild_stats пересчитывает сводную статистику переводов по
+    счетам и дням и сводку по балансам из журнала проводок. Запускается
+    один раз после миграции для уже накопленной истории и после изменения
+    балансов в обход моделей.
+    """
+
+    help = "Пересчитывает сводную статистику переводов и балансов"
+
+    def handle(self, *args, **options):
+        accounts, days = rebuild_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Статистика пересчитана: счетов {accounts}, дней {days}"
+            )
+        )
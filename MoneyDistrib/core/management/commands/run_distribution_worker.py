@@ -0,0 +1,66 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import claim_job, fail_job, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Команда run_distribution_worker запускает фоновый обработчик заданий
+    распределения. Задания берутся из таблицы DistributionJob, внешний
+    брокер сообщений не нужен; можно запускать несколько обработчиков.
+    Непредвиденная ошибка задания записывается в журнал, а задание
+    переводится в статус ошибки, чтобы обработчик не падал на нем снова.
+    """
+
+    help = "Выполняет фоновые задания распределения средств"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество получателей, переводимых одной транзакцией",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза в секундах между проверками очереди, если она пуста",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=300,
+            help="Через сколько секунд без прогресса задание считается зависшим "
+            "и перезапускается",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Выполнить все ожидающие задания и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(seconds=options["stale_after"])
+        while True:
+            job = claim_job(stale_after)
+            if job is None:
+                if options["once"]:
+                    return
+                time.sleep(options["poll_interval"])
+                continue
+
+            self.stdout.write(f"Задание #{job.pk}: {job.processed}/{job.total}")
+            try:
+                run_job(job, options["batch_size"])
+            except Exception as e:
+                logger.exception("Задание #%s завершилось ошибкой", job.pk)
+                fail_job(job, f"Непредвиденная ошибка: {e!r}")
+            job.refresh_from_db()
+            self.stdout.write(f"Задание #{job.pk}: {job.status}")
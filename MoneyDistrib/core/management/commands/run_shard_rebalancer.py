@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.shards import rebalance_accounts
+
+
+class Command(BaseCommand):
+    """
+    Команда run_shard_rebalancer запускает фоновое перераспределение
+    балансов счетов с сегментами: средства каждого счета снова делятся
+    поровну между его сегментами, чтобы списания не упирались в пустые
+    сегменты, а накопленная в сегментах статистика переносится в
+    AccountStats и DailyStats.
+    """
+
+    help = "Перераспределяет балансы счетов между их сегментами"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Пауза в секундах между перераспределениями",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Перераспределить балансы один раз и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            accounts = rebalance_accounts()
+            if options["once"]:
+                self.stdout.write(f"Перераспределено счетов: {accounts}")
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import CustomUser
+from core.shards import MAX_BALANCE_SHARDS, reshard_account
+
+
+class Command(BaseCommand):
+    """
+    Команда shard_account делит баланс нагруженного счета (казначейского
+    счета массовых выплат или популярного получателя) между несколькими
+    сегментами, которые переводы списывают и пополняют независимо, или
+    возвращает весь баланс в строку счета при --shards 0.
+    """
+
+    help = "Делит баланс счета на сегменты для параллельных переводов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("inn", help="ИНН пользователя")
+        parser.add_argument(
+            "--shards",
+            type=int,
+            required=True,
+            help=f"Число сегментов от 0 до {MAX_BALANCE_SHARDS} (0 - без сегментов)",
+        )
+
+    def handle(self, *args, **options):
+        pk = (
+            CustomUser.objects.filter(inn=options["inn"])
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if pk is None:
+            raise CommandError(f"Пользователь с ИНН {options['inn']} не найден")
+        try:
+            count = reshard_account(pk, options["shards"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            self.style.SUCCESS(f"Счет {options['inn']}: сегментов баланса {count}")
+        )
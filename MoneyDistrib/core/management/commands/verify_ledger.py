@@ -0,0 +1,141 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from core.models import BalanceShard, CustomUser, LedgerEntry
+from core.money import Money
+
+
+class Command(BaseCommand):
+    """
+    Команда verify_ledger сверяет балансы счетов с журналом проводок.
+
+    Проводки читаются потоком в порядке (счет, время) пачками по chunk_size
+    записей, поэтому память не зависит от размера журнала. Для каждого счета
+    проверяется непрерывность цепочки балансов, начиная с нулевого баланса
+    (начальный баланс счета записывается в журнал корректировкой, см.
+    record_openings), и совпадение последнего баланса в журнале с текущим
+    балансом счета, а для каждого перевода - нулевая сумма проводок. У
+    счета с сегментами баланса цепочка проверяется отдельно для остатка и
+    каждого сегмента, а с балансом счета сравнивается сумма их последних
+    балансов. Счет без проводок в журнале должен иметь нулевой баланс.
+    """
+
+    help = "Сверяет балансы счетов с журналом проводок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Количество записей, читаемых из базы за один раз",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        errors = []
+
+        entries = (
+            LedgerEntry.objects.order_by("account_id", "created_at", "id")
+            .values_list("account_id", "shard", "amount", "balance_after")
+            .iterator(chunk_size=chunk_size)
+        )
+        balances = (
+            CustomUser.objects.order_by("pk")
+            .values_list("pk", "balance")
+            .iterator(chunk_size=chunk_size)
+        )
+        shard_balances = dict(
+            BalanceShard.objects.values("account_id")
+            .annotate(total=Sum("balance"))
+            .values_list("account_id", "total")
+        )
+
+        accounts = 0
+        current_account = None
+        last_balances = {}
+        for account_id, shard, amount, balance_after in entries:
+            if account_id != current_account:
+                if current_account is not None:
+                    self.check_balance(
+                        current_account,
+                        sum(last_balances.values()),
+                        balances,
+                        shard_balances,
+                        errors,
+                    )
+                current_account = account_id
+                last_balances = {}
+                accounts += 1
+            last_balance = last_balances.get(shard, 0)
+            if last_balance + amount != balance_after:
+                chain = "" if shard is None else f" (сегмент {shard})"
+                errors.append(
+                    f"Счет {account_id}{chain}: разрыв цепочки балансов "
+                    f"{Money(last_balance)} + {Money(amount)} != "
+                    f"{Money(balance_after)}"
+                )
+            last_balances[shard] = balance_after
+        if current_account is not None:
+            self.check_balance(
+                current_account,
+                sum(last_balances.values()),
+                balances,
+                shard_balances,
+                errors,
+            )
+        for pk, balance in balances:
+            self.check_empty(pk, balance, shard_balances, errors)
+
+        unbalanced = (
+            LedgerEntry.objects.filter(transfer__isnull=False)
+            .values("transfer_id")
+            .annotate(total=Sum("amount"))
+            .exclude(total=0)
+            .order_by("transfer_id")
+            .values_list("transfer_id", "total")
+        )
+        for transfer_id, total in unbalanced.iterator(chunk_size=chunk_size):
+            errors.append(f"Перевод {transfer_id}: сумма проводок {Money(total)} != 0")
+
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f"Найдено расхождений: {len(errors)}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Журнал сходится с балансами {accounts} счетов")
+        )
+
+    def check_balance(self, account_id, ledger_balance, balances, shards, errors):
+        """
+        Сравнивает последний баланс счета в журнале с текущим балансом
+        (вместе с суммой балансов сегментов из словаря shards). Потоки
+        проводок и счетов отсортированы по pk, поэтому курсор по счетам
+        продвигается синхронно с журналом, а пропущенные счета не имеют
+        проводок и проверяются в check_empty.
+        """
+        for pk, balance in balances:
+            if pk >= account_id:
+                break
+            self.check_empty(pk, balance, shards, errors)
+        else:
+            pk = None
+        if pk != account_id:
+            errors.append(f"Счет {account_id} не найден")
+            return
+        balance += shards.get(pk, 0)
+        if balance != ledger_balance:
+            errors.append(
+                f"Счет {account_id}: баланс {Money(balance)} != "
+                f"{Money(ledger_balance)} по журналу"
+            )
+
+    def check_empty(self, account_id, balance, shards, errors):
+        """
+        Проверяет, что у счета без проводок в журнале нулевой баланс (вместе
+        с сегментами): иначе баланс изменен в обход журнала.
+        """
+        balance += shards.get(account_id, 0)
+        if balance:
+            errors.append(
+                f"Счет {account_id}: баланс {Money(balance)} без проводок в журнале"
+            )
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.inns import shared_inn_cache, warm_inn_cache
+
+
+class Command(BaseCommand):
+    """
+    Команда warm_inn_cache сбрасывает общий кэш ИНН (INN_CACHE_ALIAS) и
+    заполняет его соответствиями всех пользователей с ИНН: после изменения
+    ИНН в обход моделей и перед запуском сервера, чтобы первые переводы не
+    загружали получателей из базы. Кэш ИНН работает, только если этот кэш
+    общий для процессов сервера (например, USERS_CACHE_DIR).
+    """
+
+    help = "Сбрасывает и заполняет общий кэш соответствий ИНН и счетов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=settings.EXPORT_CHUNK_SIZE,
+            help="Количество пользователей, читаемых из базы за один раз",
+        )
+
+    def handle(self, *args, **options):
+        if shared_inn_cache() is None:
+            raise CommandError(
+                "Кэш ИНН отключен: INN_CACHE_ALIAS должен быть общим для процессов"
+            )
+        count = warm_inn_cache(options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"В кэш ИНН загружено: {count}"))
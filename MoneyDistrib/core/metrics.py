@@ -0,0 +1,237 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Границы корзин гистограмм длительности в секундах и числа запросов к базе.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Метка представления для запросов, не сопоставленных ни одному URL: так
+# число временных рядов не растет от запросов к произвольным адресам.
+UNMATCHED_VIEW = "unmatched"
+
+_current = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """
+    Класс RequestTimings представляет собой замеры одного запроса: число
+    запросов к базе, время в базе и длительности этапов обработки (проверка
+    формы, перевод, отрисовка шаблона) в секундах.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = {}
+
+    def add(self, phase, duration):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def execute(self, execute, sql, params, many, context):
+        """
+        Выполняет запрос к базе, учитывая его в числе запросов и суммарном
+        времени.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        """
+        Возвращает значение заголовка Server-Timing.
+        """
+        entries = [f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"']
+        entries += [
+            f"{phase};dur={duration * 1000:.1f}"
+            for phase, duration in self.phases.items()
+        ]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def collect_timings():
+    """
+    Начинает замеры запроса и возвращает RequestTimings, в который
+    timed() записывает этапы, выполненные внутри блока with.
+    """
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов (см. connection.execute_wrappers), которая
+    учитывает запрос в замерах текущего HTTP-запроса. Подключается к каждому
+    подключению к базе при его создании, а не на время запроса: под ASGI
+    запросы к базе выполняются в потоках sync_to_async со своими
+    подключениями, а замеры передаются в них через contextvars.
+    """
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.execute(execute, sql, params, many, context)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Замеряет длительность блока with как этап phase текущего запроса. Вне
+    запроса (команды, фоновый обработчик) ничего не делает.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+class Histogram:
+    """
+    Класс Histogram представляет собой гистограмму Prometheus с метками:
+    для каждого набора значений меток хранятся счетчики корзин, сумма и
+    число наблюдений.
+    """
+
+    def __init__(self, name, help_text, labels, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, values, value):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * len(self.buckets), 0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self.series.items()):
+            labels = format_labels(self.labels, values)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = format_labels(
+                    self.labels + ("le",), values + (format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = format_labels(self.labels + ("le",), values + ("+Inf",))
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    """
+    Класс Counter представляет собой счетчик Prometheus с метками.
+    """
+
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}
+
+    def inc(self, values):
+        self.series[values] = self.series.get(values, 0) + 1
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for values, count in sorted(self.series.items()):
+            lines.append(f"{self.name}{format_labels(self.labels, values)} {count}")
+        return lines
+
+
+def format_labels(names, values):
+    pairs = ",".join(
+        f'{name}="{escape_label(value)}"' for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    Класс Registry представляет собой метрики запросов процесса в памяти.
+    Метрики не разделяются между процессами: каждый процесс сервера
+    приложений отдает свои значения, а суммирует их Prometheus.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter(
+            "moneydistrib_requests_total",
+            "Число обработанных HTTP-запросов",
+            ("view", "method", "status"),
+        )
+        self.duration = Histogram(
+            "moneydistrib_request_duration_seconds",
+            "Длительность обработки HTTP-запроса",
+            ("view",),
+            DURATION_BUCKETS,
+        )
+        self.phases = Histogram(
+            "moneydistrib_request_phase_seconds",
+            "Длительность этапов обработки запроса, включая время в базе (db)",
+            ("view", "phase"),
+            DURATION_BUCKETS,
+        )
+        self.queries = Histogram(
+            "moneydistrib_request_queries",
+            "Число запросов к базе за HTTP-запрос",
+            ("view",),
+            QUERY_BUCKETS,
+        )
+
+    def record(self, view, method, status, timings, total):
+        """
+        Учитывает замеры timings запроса к представлению view.
+        """
+        with self.lock:
+            self.requests.inc((view, method, str(status)))
+            self.duration.observe((view,), total)
+            self.queries.observe((view,), timings.queries)
+            self.phases.observe((view, "db"), timings.db_time)
+            for phase, duration in timings.phases.items():
+                self.phases.observe((view, phase), duration)
+
+    def expose(self):
+        """
+        Возвращает метрики в текстовом формате Prometheus.
+        """
+        with self.lock:
+            metrics = (self.requests, self.duration, self.phases, self.queries)
+            lines = [line for metric in metrics for line in metric.expose()]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,48 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import UNMATCHED_VIEW, collect_timings, registry
+
+
+class RequestMetricsMiddleware:
+    """
+    Класс RequestMetricsMiddleware представляет собой промежуточный слой,
+    замеряющий каждый запрос: число запросов к базе и время в ней (см.
+    record_query), этапы, отмеченные timed(), и общую длительность. Замеры
+    добавляются в ответ заголовком Server-Timing и учитываются в метриках
+    Prometheus (см. core.metrics). Накладные расходы - несколько вызовов
+    perf_counter на запрос к базе и короткая блокировка при записи метрик.
+
+    Слой поддерживает и синхронные, и асинхронные запросы, поэтому под ASGI
+    асинхронные представления выполняются без переключения в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with collect_timings() as timings:
+            response = self.get_response(request)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        with collect_timings() as timings:
+            response = await self.get_response(request)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        total = time.perf_counter() - timings.started
+        match = request.resolver_match
+        view = match.view_name if match else UNMATCHED_VIEW
+        registry.record(view, request.method, response.status_code, timings, total)
+        response["Server-Timing"] = timings.server_timing(total)
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 3.2 on 2026-10-18 13:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Сумма, списанная со счета отправителя', max_digits=10, verbose_name='Сумма')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата перевода')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sent_transfers', to=settings.AUTH_USER_MODEL, verbose_name='Отправитель')),
+            ],
+            options={
+                'verbose_name': 'Перевод',
+                'verbose_name_plural': 'Переводы',
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Изменение баланса: отрицательное для списания', max_digits=10, verbose_name='Сумма')),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Баланс после проводки')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата проводки')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to=settings.AUTH_USER_MODEL, verbose_name='Счет')),
+                ('transfer', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='core.transfer', verbose_name='Перевод')),
+            ],
+            options={
+                'verbose_name': 'Проводка',
+                'verbose_name_plural': 'Проводки',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'created_at'], name='core_ledger_account_time_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_ledger'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['username', 'id'], name='core_user_username_id_idx'),
+        ),
+    ]
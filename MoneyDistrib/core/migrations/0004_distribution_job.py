@@ -0,0 +1,38 @@
+# Generated by Django 3.2 on 2026-10-18 13:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_user_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistributionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credits', models.JSONField(help_text='Список пар [id получателя, сумма]', verbose_name='Зачисления')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает'), ('running', 'Выполняется'), ('done', 'Выполнено'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус')),
+                ('total', models.PositiveIntegerField(verbose_name='Всего получателей')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='Обработано получателей')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата изменения')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='distribution_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Отправитель')),
+            ],
+            options={
+                'verbose_name': 'Фоновое распределение',
+                'verbose_name_plural': 'Фоновые распределения',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='distributionjob',
+            index=models.Index(fields=['status', 'created_at'], name='core_job_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 13:31
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_distribution_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='Ключ')),
+                ('status_code', models.PositiveSmallIntegerField(null=True, verbose_name='Код ответа')),
+                ('headers', models.JSONField(default=dict, verbose_name='Заголовки ответа')),
+                ('body', models.TextField(blank=True, verbose_name='Тело ответа')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Ключ идемпотентности',
+                'verbose_name_plural': 'Ключи идемпотентности',
+            },
+        ),
+    ]
@@ -0,0 +1,106 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import Cast, Round
+
+# (модель, поле) с денежными суммами, переводимыми из рублей в копейки.
+MONEY_FIELDS = [
+    ("customuser", "balance"),
+    ("transfer", "amount"),
+    ("ledgerentry", "amount"),
+    ("ledgerentry", "balance_after"),
+]
+
+
+def to_kopecks(apps, schema_editor):
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model("core", model_name)
+        model.objects.update(
+            **{
+                f"{field}_kopecks": Cast(
+                    Round(F(field) * 100), output_field=models.BigIntegerField()
+                )
+            }
+        )
+
+    DistributionJob = apps.get_model("core", "DistributionJob")
+    for job in DistributionJob.objects.iterator():
+        job.credits = [
+            [pk, int(Decimal(amount).scaleb(2))] for pk, amount in job.credits
+        ]
+        job.save(update_fields=["credits"])
+
+
+def to_rubles(apps, schema_editor):
+    for model_name, field in MONEY_FIELDS:
+        model = apps.get_model("core", model_name)
+        model.objects.update(
+            **{
+                field: ExpressionWrapper(
+                    F(f"{field}_kopecks") * Decimal("0.01"),
+                    output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                )
+            }
+        )
+
+    DistributionJob = apps.get_model("core", "DistributionJob")
+    for job in DistributionJob.objects.iterator():
+        job.credits = [
+            [pk, str(Decimal(amount).scaleb(-2))] for pk, amount in job.credits
+        ]
+        job.save(update_fields=["credits"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_idempotency_key'),
+    ]
+
+    operations = [
+        *(
+            migrations.AddField(
+                model_name=model_name,
+                name=f"{field}_kopecks",
+                field=models.BigIntegerField(default=0),
+            )
+            for model_name, field in MONEY_FIELDS
+        ),
+        migrations.RunPython(to_kopecks, to_rubles),
+        *(
+            migrations.RemoveField(model_name=model_name, name=field)
+            for model_name, field in MONEY_FIELDS
+        ),
+        *(
+            migrations.RenameField(
+                model_name=model_name, old_name=f"{field}_kopecks", new_name=field
+            )
+            for model_name, field in MONEY_FIELDS
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='balance',
+            field=models.BigIntegerField(default=0, help_text='Текущий остаток по счету в копейках', verbose_name='Баланс, коп.'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='amount',
+            field=models.BigIntegerField(help_text='Сумма, списанная со счета отправителя, в копейках', verbose_name='Сумма, коп.'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='amount',
+            field=models.BigIntegerField(help_text='Изменение баланса в копейках: отрицательное для списания', verbose_name='Сумма, коп.'),
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='balance_after',
+            field=models.BigIntegerField(verbose_name='Баланс после проводки, коп.'),
+        ),
+        migrations.AlterField(
+            model_name='distributionjob',
+            name='credits',
+            field=models.JSONField(help_text='Список пар [id получателя, сумма в копейках]', verbose_name='Зачисления'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 3.2 on 2026-10-18 13:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+
+
+def fill_balance_summary(apps, schema_editor):
+    CustomUser = apps.get_model("core", "CustomUser")
+    BalanceSummary = apps.get_model("core", "BalanceSummary")
+    summary = CustomUser.objects.aggregate(
+        total_balance=Sum("balance"), accounts=Count("id")
+    )
+    BalanceSummary.objects.create(
+        pk=1,
+        total_balance=summary["total_balance"] or 0,
+        accounts=summary["accounts"],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_balance_kopecks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountStats',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.customuser', verbose_name='Счет')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Отправлено переводов')),
+                ('sent_volume', models.BigIntegerField(default=0, verbose_name='Отправлено, коп.')),
+                ('received_count', models.PositiveIntegerField(default=0, verbose_name='Получено переводов')),
+                ('received_volume', models.BigIntegerField(default=0, verbose_name='Получено, коп.')),
+            ],
+            options={
+                'verbose_name': 'Статистика счета',
+                'verbose_name_plural': 'Статистика счетов',
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_balance', models.BigIntegerField(default=0, verbose_name='Сумма балансов, коп.')),
+                ('accounts', models.IntegerField(default=0, verbose_name='Число счетов')),
+            ],
+            options={
+                'verbose_name': 'Сводка по балансам',
+                'verbose_name_plural': 'Сводка по балансам',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Дата')),
+                ('transfer_count', models.PositiveIntegerField(default=0, verbose_name='Переводов')),
+                ('credit_count', models.PositiveIntegerField(default=0, verbose_name='Зачислений')),
+                ('volume', models.BigIntegerField(default=0, verbose_name='Объем, коп.')),
+            ],
+            options={
+                'verbose_name': 'Статистика за день',
+                'verbose_name_plural': 'Статистика по дням',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='accountstats',
+            index=models.Index(fields=['-sent_volume'], name='core_stats_sent_volume_idx'),
+        ),
+        migrations.RunPython(fill_balance_summary, migrations.RunPython.noop),
+    ]
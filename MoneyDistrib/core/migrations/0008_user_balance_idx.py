@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['balance'], name='core_user_balance_idx'),
+        ),
+    ]
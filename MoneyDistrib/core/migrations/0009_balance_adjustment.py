@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 13:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_user_balance_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceAdjustment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.BigIntegerField(help_text='Изменение баланса каждого счета: отрицательное для списания', verbose_name='Сумма на счет, коп.')),
+                ('accounts', models.PositiveIntegerField(verbose_name='Число счетов')),
+                ('reason', models.CharField(max_length=255, verbose_name='Основание')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата корректировки')),
+            ],
+            options={
+                'verbose_name': 'Корректировка баланса',
+                'verbose_name_plural': 'Корректировки балансов',
+            },
+        ),
+        migrations.AlterField(
+            model_name='ledgerentry',
+            name='transfer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='core.transfer', verbose_name='Перевод'),
+        ),
+        migrations.AddField(
+            model_name='balanceadjustment',
+            name='author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='balance_adjustments', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AddField(
+            model_name='ledgerentry',
+            name='adjustment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='core.balanceadjustment', verbose_name='Корректировка'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('adjustment__isnull', True), ('transfer__isnull', False)), models.Q(('adjustment__isnull', False), ('transfer__isnull', True)), _connector='OR'), name='core_ledger_single_source'),
+        ),
+    ]
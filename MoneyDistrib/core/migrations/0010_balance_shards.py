@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_balance_adjustment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="balance_shards",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Число строк BalanceShard, между которыми разделен баланс нагруженного счета (0 - баланс хранится только в строке счета)",
+                verbose_name="Сегментов баланса",
+            ),
+        ),
+        migrations.AddField(
+            model_name="ledgerentry",
+            name="shard",
+            field=models.PositiveSmallIntegerField(
+                blank=True, null=True, verbose_name="Сегмент баланса"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="balance",
+            field=models.BigIntegerField(
+                default=0,
+                help_text="Текущий остаток по счету в копейках (для счета с сегментами - остаток вне сегментов)",
+                verbose_name="Баланс, коп.",
+            ),
+        ),
+        migrations.CreateModel(
+            name="BalanceShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "index",
+                    models.PositiveSmallIntegerField(verbose_name="Номер сегмента"),
+                ),
+                (
+                    "balance",
+                    models.BigIntegerField(default=0, verbose_name="Баланс, коп."),
+                ),
+                ("sent_count", models.PositiveIntegerField(default=0)),
+                ("sent_volume", models.BigIntegerField(default=0)),
+                ("received_count", models.PositiveIntegerField(default=0)),
+                ("received_volume", models.BigIntegerField(default=0)),
+                ("day", models.DateField(blank=True, null=True)),
+                ("day_transfers", models.PositiveIntegerField(default=0)),
+                ("day_credits", models.PositiveIntegerField(default=0)),
+                ("day_volume", models.BigIntegerField(default=0)),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Счет",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Сегмент баланса",
+                "verbose_name_plural": "Сегменты баланса",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="balanceshard",
+            constraint=models.UniqueConstraint(
+                fields=("account", "index"), name="core_shard_account_index"
+            ),
+        ),
+    ]
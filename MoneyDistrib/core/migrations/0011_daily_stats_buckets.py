@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_balance_shards"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="dailystats",
+            options={
+                "ordering": ["-date", "bucket"],
+                "verbose_name": "Статистика за день",
+                "verbose_name_plural": "Статистика по дням",
+            },
+        ),
+        migrations.AddField(
+            model_name="dailystats",
+            name="bucket",
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="Корзина"),
+        ),
+        migrations.AlterField(
+            model_name="dailystats",
+            name="date",
+            field=models.DateField(verbose_name="Дата"),
+        ),
+        migrations.AddConstraint(
+            model_name="dailystats",
+            constraint=models.UniqueConstraint(
+                fields=("date", "bucket"), name="core_daily_stats_date_bucket"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_daily_stats_buckets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                help_text="SHA-256 нормализованных данных запроса",
+                max_length=64,
+                verbose_name="Отпечаток запроса",
+            ),
+        ),
+    ]
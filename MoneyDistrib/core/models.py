@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
+
+from .money import Money
 
 
 class CustomUser(AbstractUser):
@@ -15,13 +18,418 @@ class CustomUser(AbstractUser):
         verbose_name="ИНН",
         help_text="ИНН пользователя",
     )
-    balance = models.fields.DecimalField(
-        max_digits=10,
-        decimal_places=2,
-        default=0.00,
-        verbose_name="Баланс",
-        help_text="Текущий остаток по счету",
+    balance = models.fields.BigIntegerField(
+        default=0,
+        verbose_name="Баланс, коп.",
+        help_text="Текущий остаток по счету в копейках (для счета с сегментами - "
+        "остаток вне сегментов)",
+    )
+    balance_shards = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name="Сегментов баланса",
+        help_text="Число строк BalanceShard, между которыми разделен баланс "
+        "нагруженного счета (0 - баланс хранится только в строке счета)",
     )
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["username", "id"], name="core_user_username_id_idx"),
+            models.Index(fields=["balance"], name="core_user_balance_idx"),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.inn})"
+
+    @property
+    def total_balance(self):
+        """
+        Возвращает баланс счета в копейках вместе с сегментами баланса.
+        """
+        if not self.balance_shards:
+            return self.balance
+        shards = self.shards.aggregate(total=models.Sum("balance"))["total"]
+        return self.balance + (shards or 0)
+
+    @property
+    def balance_money(self):
+        return Money(self.total_balance)
+
+
+class BalanceShard(models.Model):
+    """
+    Класс BalanceShard представляет собой сегмент баланса нагруженного
+    счета. Баланс такого счета - сумма остатка в строке счета и балансов
+    всех его сегментов. Перевод списывает или зачисляет деньги на один
+    сегмент, блокируя только его строку, поэтому параллельные переводы с
+    одним счетом не ждут друг друга. Статистика переводов через сегмент
+    накапливается в его строке и переносится в AccountStats и DailyStats
+    при перераспределении сегментов (см. core.shards).
+    """
+
+    account = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="shards",
+        verbose_name="Счет",
+    )
+    index = models.PositiveSmallIntegerField(verbose_name="Номер сегмента")
+    balance = models.BigIntegerField(default=0, verbose_name="Баланс, коп.")
+    sent_count = models.PositiveIntegerField(default=0)
+    sent_volume = models.BigIntegerField(default=0)
+    received_count = models.PositiveIntegerField(default=0)
+    received_volume = models.BigIntegerField(default=0)
+    day = models.DateField(null=True, blank=True)
+    day_transfers = models.PositiveIntegerField(default=0)
+    day_credits = models.PositiveIntegerField(default=0)
+    day_volume = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Сегмент баланса"
+        verbose_name_plural = "Сегменты баланса"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["account", "index"], name="core_shard_account_index"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Сегмент {self.index} счета {self.account_id}: {Money(self.balance)}"
+
+
+class Transfer(models.Model):
+    """
+    Класс Transfer представляет собой одно распределение средств от
+    отправителя между получателями. Проводки по счетам хранятся в LedgerEntry.
+    """
+
+    sender = models.ForeignKey(
+        CustomUser,
+        on_delete=models.PROTECT,
+        related_name="sent_transfers",
+        verbose_name="Отправитель",
+    )
+    amount = models.BigIntegerField(
+        verbose_name="Сумма, коп.",
+        help_text="Сумма, списанная со счета отправителя, в копейках",
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Дата перевода",
+    )
+
+    class Meta:
+        verbose_name = "Перевод"
+        verbose_name_plural = "Переводы"
+
+    def __str__(self):
+        return f"Перевод #{self.pk} от {self.sender_id} на {Money(self.amount)}"
+
+
+class LedgerEntryQuerySet(models.QuerySet):
+    def for_account(self, account):
+        """
+        Возвращает выписку по счету в хронологическом порядке.
+        """
+        return self.filter(account=account).order_by("created_at", "id")
+
+    def balance_at(self, account, moment):
+        """
+        Возвращает баланс счета на момент moment по последней проводке до него
+        или None, если проводок по счету до этого момента не было. У счета с
+        сегментами баланса суммируются последние балансы остатка и каждого
+        сегмента.
+        """
+        entries = self.filter(account=account, created_at__lte=moment)
+        balances = [
+            entries.filter(shard=shard)
+            .order_by("-created_at", "-id")
+            .values_list("balance_after", flat=True)
+            .first()
+            for shard in entries.order_by().values_list("shard", flat=True).distinct()
+        ]
+        return sum(balances) if balances else None
+
+
+class BalanceAdjustment(models.Model):
+    """
+    Класс BalanceAdjustment представляет собой корректировку балансов
+    администратором: одинаковая сумма зачисляется (или списывается) на
+    каждый из выбранных счетов. Проводки по счетам хранятся в LedgerEntry.
+    """
+
+    amount = models.BigIntegerField(
+        verbose_name="Сумма на счет, коп.",
+        help_text="Изменение баланса каждого счета: отрицательное для списания",
+    )
+    accounts = models.PositiveIntegerField(verbose_name="Число счетов")
+    reason = models.CharField(max_length=255, verbose_name="Основание")
+    author = models.ForeignKey(
+        CustomUser,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="balance_adjustments",
+        verbose_name="Автор",
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Дата корректировки",
+    )
+
+    class Meta:
+        verbose_name = "Корректировка баланса"
+        verbose_name_plural = "Корректировки балансов"
+
+    def __str__(self):
+        return f"Корректировка #{self.pk}: {Money(self.amount)} x {self.accounts}"
+
+
+class LedgerEntry(models.Model):
+    """
+    Класс LedgerEntry представляет собой проводку по счету в журнале
+    переводов. Записи только добавляются: каждая хранит изменение баланса
+    и баланс счета после проводки. Проводка относится либо к переводу,
+    либо к корректировке баланса администратором.
+
+    Проводка по сегменту баланса (shard) хранит баланс этого сегмента, а
+    проводка без сегмента - остаток в строке счета, поэтому цепочка
+    балансов непрерывна для каждого сегмента в отдельности.
+    """
+
+    transfer = models.ForeignKey(
+        Transfer,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="entries",
+        verbose_name="Перевод",
+    )
+    adjustment = models.ForeignKey(
+        BalanceAdjustment,
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="entries",
+        verbose_name="Корректировка",
+    )
+    account = models.ForeignKey(
+        CustomUser,
+        on_delete=models.PROTECT,
+        related_name="ledger_entries",
+        verbose_name="Счет",
+    )
+    amount = models.BigIntegerField(
+        verbose_name="Сумма, коп.",
+        help_text="Изменение баланса в копейках: отрицательное для списания",
+    )
+    shard = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        verbose_name="Сегмент баланса",
+    )
+    balance_after = models.BigIntegerField(
+        verbose_name="Баланс после проводки, коп.",
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Дата проводки",
+    )
+
+    objects = LedgerEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Проводка"
+        verbose_name_plural = "Проводки"
+        indexes = [
+            models.Index(
+                fields=["account", "created_at"],
+                name="core_ledger_account_time_idx",
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(transfer__isnull=False, adjustment__isnull=True)
+                | models.Q(transfer__isnull=True, adjustment__isnull=False),
+                name="core_ledger_single_source",
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.account_id}: {Money(self.amount)} -> {Money(self.balance_after)}"
+        )
+
+
+class DistributionJob(models.Model):
+    """
+    Класс DistributionJob представляет собой распределение средств,
+    выполняемое фоновым обработчиком (команда run_distribution_worker)
+    пачками получателей. Поле processed продвигается в той же транзакции,
+    что и перевод пачки, поэтому повторный запуск задания продолжает его с
+    первой необработанной пачки и не переводит деньги дважды.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Ожидает"
+        RUNNING = "running", "Выполняется"
+        DONE = "done", "Выполнено"
+        FAILED = "failed", "Ошибка"
+
+    sender = models.ForeignKey(
+        CustomUser,
+        on_delete=models.PROTECT,
+        related_name="distribution_jobs",
+        verbose_name="Отправитель",
+    )
+    credits = models.JSONField(
+        verbose_name="Зачисления",
+        help_text="Список пар [id получателя, сумма в копейках]",
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+        verbose_name="Статус",
+    )
+    total = models.PositiveIntegerField(verbose_name="Всего получателей")
+    processed = models.PositiveIntegerField(
+        default=0, verbose_name="Обработано получателей"
+    )
+    error = models.TextField(blank=True, verbose_name="Ошибка")
+    created_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Дата создания"
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now, verbose_name="Дата изменения"
+    )
+
+    class Meta:
+        verbose_name = "Фоновое распределение"
+        verbose_name_plural = "Фоновые распределения"
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="core_job_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"Задание #{self.pk}: {self.processed}/{self.total} ({self.status})"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Класс IdempotencyKey представляет собой ключ идемпотентности запроса
+    на перевод и сохраненный ответ на него. Повторный запрос с тем же ключом
+    получает сохраненный ответ без повторного выполнения перевода, а запрос
+    с тем же ключом, но другими данными отклоняется по отпечатку данных.
+    Устаревшие ключи удаляются командой purge_idempotency_keys.
+    """
+
+    key = models.CharField(max_length=255, unique=True, verbose_name="Ключ")
+    fingerprint = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name="Отпечаток запроса",
+        help_text="SHA-256 нормализованных данных запроса",
+    )
+    status_code = models.PositiveSmallIntegerField(
+        null=True, verbose_name="Код ответа"
+    )
+    headers = models.JSONField(default=dict, verbose_name="Заголовки ответа")
+    body = models.TextField(blank=True, verbose_name="Тело ответа")
+    created_at = models.DateTimeField(
+        default=timezone.now, db_index=True, verbose_name="Дата создания"
+    )
+
+    class Meta:
+        verbose_name = "Ключ идемпотентности"
+        verbose_name_plural = "Ключи идемпотентности"
+
+    def __str__(self):
+        return self.key
+
+
+class AccountStats(models.Model):
+    """
+    Класс AccountStats представляет собой сводную статистику переводов по
+    счету: число и объем отправленных и полученных переводов. Строка
+    обновляется в транзакции каждого перевода (см. core.stats.record_stats),
+    поэтому чтение статистики не требует агрегирования журнала.
+    """
+
+    account = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="Счет",
+    )
+    sent_count = models.PositiveIntegerField(
+        default=0, verbose_name="Отправлено переводов"
+    )
+    sent_volume = models.BigIntegerField(default=0, verbose_name="Отправлено, коп.")
+    received_count = models.PositiveIntegerField(
+        default=0, verbose_name="Получено переводов"
+    )
+    received_volume = models.BigIntegerField(default=0, verbose_name="Получено, коп.")
+
+    class Meta:
+        verbose_name = "Статистика счета"
+        verbose_name_plural = "Статистика счетов"
+        indexes = [
+            models.Index(fields=["-sent_volume"], name="core_stats_sent_volume_idx"),
+        ]
+
+    def __str__(self):
+        return f"Статистика счета {self.account_id}"
+
+
+class DailyStats(models.Model):
+    """
+    Класс DailyStats представляет собой сводную статистику переводов за
+    день: число переводов, число зачислений и объем. Статистика дня
+    разделена между несколькими строками-корзинами, и перевод обновляет
+    случайную из них, чтобы параллельные переводы не ждали блокировки одной
+    строки дня. Итоги дня - суммы по всем его корзинам (см.
+    core.stats.daily_totals).
+    """
+
+    date = models.DateField(verbose_name="Дата")
+    bucket = models.PositiveSmallIntegerField(default=0, verbose_name="Корзина")
+    transfer_count = models.PositiveIntegerField(default=0, verbose_name="Переводов")
+    credit_count = models.PositiveIntegerField(default=0, verbose_name="Зачислений")
+    volume = models.BigIntegerField(default=0, verbose_name="Объем, коп.")
+
+    class Meta:
+        verbose_name = "Статистика за день"
+        verbose_name_plural = "Статистика по дням"
+        ordering = ["-date", "bucket"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "bucket"], name="core_daily_stats_date_bucket"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.transfer_count} на {Money(self.volume)}"
+
+
+class BalanceSummary(models.Model):
+    """
+    Класс BalanceSummary представляет собой единственную строку со
+    сводными данными по всем счетам: сумму балансов и число счетов.
+    Переводы не меняют сумму балансов, поэтому строка обновляется только
+    при создании, изменении и удалении пользователей (см. core.signals).
+    Массовые bulk_create и QuerySet.update сводку не обновляют - после них
+    ее пересчитывает команда rebuild_stats.
+    """
+
+    total_balance = models.BigIntegerField(
+        default=0, verbose_name="Сумма балансов, коп."
+    )
+    accounts = models.IntegerField(default=0, verbose_name="Число счетов")
+
+    class Meta:
+        verbose_name = "Сводка по балансам"
+        verbose_name_plural = "Сводка по балансам"
+
+    def __str__(self):
+        return f"{self.accounts} счетов на {Money(self.total_balance)}"
@@ -0,0 +1,79 @@
+from decimal import Decimal
+from functools import total_ordering
+
+CENT = Decimal("0.01")
+
+# Наибольшая сумма в копейках, как у полей сумм в формах (max_digits=17,
+# decimal_places=2): суммы и балансы помещаются в BIGINT с запасом.
+MAX_AMOUNT = 10**17 - 1
+
+
+def to_cents(amount):
+    """
+    Переводит сумму в рублях (Decimal с точностью до копеек) в целое
+    число копеек.
+    """
+    return int(Decimal(amount).quantize(CENT).scaleb(2))
+
+
+def from_cents(cents):
+    """
+    Переводит целое число копеек в сумму в рублях.
+    """
+    return Decimal(cents).scaleb(-2)
+
+
+@total_ordering
+class Money:
+    """
+    Класс Money представляет собой денежную сумму, хранящуюся как целое
+    число копеек. Балансы и суммы переводов хранятся в базе в копейках, а
+    Money используется для их отображения в рублях.
+    """
+
+    __slots__ = ("kopecks",)
+
+    def __init__(self, kopecks):
+        self.kopecks = int(kopecks)
+
+    @classmethod
+    def from_decimal(cls, amount):
+        return cls(to_cents(amount))
+
+    @property
+    def amount(self):
+        return from_cents(self.kopecks)
+
+    def __str__(self):
+        sign = "-" if self.kopecks < 0 else ""
+        rubles, kopecks = divmod(abs(self.kopecks), 100)
+        return f"{sign}{rubles}.{kopecks:02d}"
+
+    def __repr__(self):
+        return f"Money({self.kopecks})"
+
+    def __eq__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.kopecks == other.kopecks
+
+    def __lt__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return self.kopecks < other.kopecks
+
+    def __hash__(self):
+        return hash(self.kopecks)
+
+    def __add__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.kopecks + other.kopecks)
+
+    def __sub__(self, other):
+        if not isinstance(other, Money):
+            return NotImplemented
+        return Money(self.kopecks - other.kopecks)
+
+    def __neg__(self):
+        return Money(-self.kopecks)
@@ -0,0 +1,153 @@
+import base64
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# Число строк, начиная с которого EstimatedCountPaginator показывает оценку
+# числа строк вместо точного COUNT(*).
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+class KeysetPage:
+    """
+    Класс KeysetPage представляет собой страницу выборки, полученную
+    постраничной навигацией по ключу (username, id), и курсор следующей
+    страницы.
+    """
+
+    def __init__(self, rows, next_cursor):
+        self.rows = rows
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(username, pk):
+    """
+    Кодирует ключ последней строки страницы в курсор для URL.
+    """
+    data = json.dumps([username, pk], ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Декодирует курсор в пару (username, id). Возвращает None, если курсор
+    пустой или поврежден.
+    """
+    if not cursor:
+        return None
+    try:
+        username, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(username, str) or not isinstance(pk, int):
+        return None
+    return username, pk
+
+
+def keyset_paginate(queryset, cursor, page_size):
+    """
+    Возвращает страницу queryset размером page_size, начинающуюся после
+    строки, закодированной в cursor. Выборка упорядочивается по
+    (username, id) и фильтруется по ключу, поэтому стоимость запроса не
+    зависит от номера страницы. queryset должен отдавать словари с ключами
+    username и id (QuerySet.values()).
+    """
+    key = decode_cursor(cursor)
+    if key is not None:
+        username, pk = key
+        queryset = queryset.filter(
+            Q(username__gt=username) | Q(username=username, id__gt=pk)
+        )
+
+    rows = list(queryset.order_by("username", "id")[: page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1]["username"], rows[-1]["id"])
+    return KeysetPage(rows, next_cursor)
+
+
+def estimated_row_count(model, using="default"):
+    """
+    Возвращает оценку числа строк в таблице модели по статистике
+    планировщика PostgreSQL (pg_class.reltuples) или None, если оценка
+    недоступна: другая СУБД или таблица еще не анализировалась.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Класс EstimatedCountPaginator представляет собой Paginator, который для
+    выборки без фильтров по большой таблице берет число строк из статистики
+    PostgreSQL вместо COUNT(*), читающего всю таблицу. Для выборок с
+    фильтрами, небольших таблиц и других СУБД число строк считается точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def after_key(fields, key):
+    """
+    Возвращает условие отбора строк, ключ которых по полям fields больше
+    key в лексикографическом порядке, например для (created_at, id):
+    created_at > t OR (created_at = t AND id > pk).
+    """
+    condition = Q(**{f"{fields[-1]}__gt": key[-1]})
+    for field, value in zip(fields[-2::-1], key[-2::-1]):
+        condition = Q(**{f"{field}__gt": value}) | Q(**{field: value}) & condition
+    return condition
+
+
+def keyset_chunks(queryset, chunk_size, fields=("id",)):
+    """
+    Выдает строки queryset пачками (списками) по chunk_size в порядке
+    полей fields, которые должны однозначно упорядочивать выборку.
+    queryset должен отдавать словари с этими полями (QuerySet.values()).
+
+    Каждая пачка читается отдельным коротким запросом с условием на ключ
+    последней строки предыдущей пачки (см. after_key), поэтому память
+    ограничена одной пачкой, а между пачками не держится ни курсор, ни
+    транзакция. В отличие от QuerySet.iterator() это работает и через
+    PgBouncer в режиме транзакций, где серверные курсоры отключены и
+    psycopg2 прочитал бы всю выборку в память.
+    """
+    queryset = queryset.order_by(*fields)
+    chunk = list(queryset[:chunk_size])
+    while chunk:
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        key = [chunk[-1][field] for field in fields]
+        chunk = list(queryset.filter(after_key(fields, key))[:chunk_size])
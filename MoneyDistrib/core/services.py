@@ -0,0 +1,315 @@
+from dataclasses import dataclass
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .allocation import allocate_equal, allocate_weighted
+from .caching import invalidate_accounts_on_commit
+from .metrics import timed
+from .models import BalanceAdjustment, CustomUser, LedgerEntry, Transfer
+from .shards import account_balance, gather_reserves, settle_shards, sharded_accounts
+from .stats import adjust_balance_summary, record_stats
+from .utils import add_amounts, chunks
+
+# Основание корректировки, которой в журнал записывается начальный баланс
+# нового счета.
+OPENING_REASON = "Начальный баланс"
+
+
+@dataclass
+class Distribution:
+    """
+    Результат распределения: запись о переводе, баланс отправителя после
+    списания и список пар (получатель, зачисленная сумма). Суммы в копейках.
+    """
+
+    transfer: Transfer
+    sender_balance: int
+    credits: list
+
+
+def split_amount(amount, count, shares=None):
+    """
+    Делит сумму amount копеек на count частей поровну или пропорционально
+    долям shares методом наибольшего остатка, поэтому сумма частей всегда
+    точно равна amount. Число долей должно быть равно count, иначе
+    выбрасывается ValueError. Возвращает список сумм в копейках.
+    """
+    if shares is None:
+        return allocate_equal(amount, count)
+    shares = list(shares)
+    if len(shares) != count:
+        raise ValueError(
+            f"Число долей ({len(shares)}) не равно числу получателей ({count})"
+        )
+    return allocate_weighted(amount, shares)
+
+
+def lock_accounts(account_ids):
+    """
+    Блокирует строки счетов account_ids (SELECT ... FOR UPDATE) до конца
+    текущей транзакции. Строки блокируются в порядке возрастания pk, поэтому
+    параллельные переводы с пересекающимися счетами не могут взаимно
+    заблокировать друг друга. Возвращает словарь pk -> баланс счета.
+
+    Счета с сегментами баланса не блокируются и в результат не попадают:
+    их сегменты блокируются после строк остальных счетов (см. core.shards).
+    """
+    balances = {}
+    for chunk in chunks(sorted(set(account_ids))):
+        balances.update(
+            CustomUser.objects.select_for_update()
+            .filter(pk__in=chunk, balance_shards=0)
+            .order_by("pk")
+            .values_list("pk", "balance")
+        )
+    return balances
+
+
+def lock_account_rows(account_ids):
+    """
+    Блокирует строки счетов account_ids в порядке pk без условия на
+    balance_shards. Нужна для счетов, которых нет ни в результате
+    lock_accounts, ни среди счетов с сегментами: сегменты такого счета
+    удалены (reshard_account с count=0) между этими двумя чтениями, и теперь
+    его можно проводить по строке. Для пустого account_ids запрос к базе не
+    выполняется. Возвращает словарь pk -> баланс счета без удаленных счетов.
+    """
+    balances = {}
+    for chunk in chunks(sorted(set(account_ids))):
+        balances.update(
+            CustomUser.objects.select_for_update()
+            .filter(pk__in=chunk)
+            .order_by("pk")
+            .values_list("pk", "balance")
+        )
+    return balances
+
+
+def distribute_money(sender, acceptors, amount, shares=None):
+    """
+    Распределяет сумму amount копеек между получателями acceptors поровну
+    или пропорционально долям shares без остатка. Возвращает Distribution.
+    """
+    credits = list(zip(acceptors, split_amount(amount, len(acceptors), shares)))
+
+    transfer, sender_balance = settle(
+        sender, [(acceptor.pk, amount) for acceptor, amount in credits]
+    )
+
+    return Distribution(
+        transfer=transfer, sender_balance=sender_balance, credits=credits
+    )
+
+
+def settle(sender, credits):
+    """
+    Списывает со счета sender сумму всех зачислений credits - списка пар
+    (pk получателя, сумма в копейках) - и зачисляет их получателям.
+
+    Перевод выполняется в одной транзакции: строки участников блокируются
+    в порядке pk, отправитель списывается один раз условным UPDATE (только
+    если на счете хватает средств), получатели пополняются пакетными UPDATE
+    (см. credit_accounts), а перевод и проводки по всем счетам записываются
+    в журнал одной пачкой bulk_create. В той же транзакции обновляется
+    сводная статистика переводов (см. record_stats), а после фиксации
+    сбрасывается кэш страниц списка пользователей с этими счетами.
+
+    У участников с сегментами баланса (см. core.shards) строка счета не
+    блокируется: списание и зачисления проводятся по одному из сегментов
+    счета, поэтому параллельные переводы с нагруженным счетом выполняются
+    одновременно. Если сегменты счета удалены параллельной транзакцией
+    между lock_accounts и sharded_accounts или уже после них, счет
+    проводится по заблокированной строке как счет без сегментов (см.
+    lock_account_rows). Если какого-то из счетов уже нет (например, получатель
+    фонового задания удален после постановки в очередь), перевод не
+    выполняется. Возвращает запись Transfer и баланс отправителя после
+    списания.
+    """
+    total = sum(amount for _, amount in credits)
+    account_ids = [sender.pk, *(pk for pk, _ in credits)]
+
+    with timed("settle"), transaction.atomic():
+        balances = lock_accounts(account_ids)
+        sharded = sharded_accounts(set(account_ids) - balances.keys())
+        balances.update(
+            lock_account_rows(set(account_ids) - balances.keys() - sharded.keys())
+        )
+        missing = sorted(set(account_ids) - balances.keys() - sharded.keys())
+        if missing:
+            raise ValidationError(f"Счета не найдены: {', '.join(map(str, missing))}")
+
+        if sender.pk not in sharded:
+            debit_account(sender.pk, total)
+
+        if sharded:
+            shards, removed = settle_shards(sender.pk, credits, total, sharded)
+            if removed:
+                balances.update(removed)
+                sharded = {pk: n for pk, n in sharded.items() if pk not in removed}
+                if sender.pk in removed:
+                    debit_account(sender.pk, total)
+            credit_accounts(
+                [(pk, amount) for pk, amount in credits if pk not in sharded]
+            )
+        else:
+            shards = {}
+            credit_accounts(credits)
+        transfer = record_transfer(sender, balances, credits, total, shards)
+        record_stats(sender.pk, credits, total, transfer.created_at, sharded)
+        invalidate_accounts_on_commit(account_ids)
+
+        if sender.pk in sharded:
+            sender_balance = account_balance(sender.pk)
+        else:
+            sender_balance = balances[sender.pk] - total
+    return transfer, sender_balance
+
+
+def debit_account(pk, amount):
+    """
+    Списывает amount копеек со счета pk условным UPDATE, только если на
+    счете хватает средств; иначе выбрасывает ValidationError.
+    """
+    debited = CustomUser.objects.filter(pk=pk, balance__gte=amount).update(
+        balance=F("balance") - amount
+    )
+    if not debited:
+        raise ValidationError(f"У отправителя недостаточно средств.")
+
+
+def credit_accounts(credits):
+    """
+    Зачисляет суммы credits - список пар (pk, сумма в копейках) - на счета
+    пакетными UPDATE (см. add_amounts).
+    """
+    add_amounts(CustomUser, "balance", credits)
+
+
+def record_transfer(sender, balances, credits, total, shards=None):
+    """
+    Записывает перевод в журнал: одну запись Transfer и по проводке на
+    каждый затронутый счет с балансом после проводки, рассчитанным от
+    балансов balances, прочитанных под блокировкой. Для счетов с сегментами
+    баланса номер сегмента и его баланс после проводки берутся из словаря
+    shards (pk -> (номер сегмента, баланс)).
+    """
+    shards = shards or {}
+    created_at = timezone.now()
+    transfer = Transfer.objects.create(
+        sender=sender, amount=total, created_at=created_at
+    )
+    entries = []
+    for pk, amount in [(sender.pk, -total), *credits]:
+        shard, balance_after = shards.get(pk) or (None, balances[pk] + amount)
+        entries.append(
+            LedgerEntry(
+                transfer=transfer,
+                account_id=pk,
+                shard=shard,
+                amount=amount,
+                balance_after=balance_after,
+                created_at=created_at,
+            )
+        )
+    LedgerEntry.objects.bulk_create(entries)
+    return transfer
+
+
+def adjust_balances(account_ids, amount, reason, author=None):
+    """
+    Изменяет баланс каждого из счетов account_ids на amount копеек
+    (отрицательная сумма - списание) и записывает корректировку в журнал.
+
+    Корректировка выполняется в одной транзакции: строки счетов блокируются
+    в порядке pk, балансы меняются пакетными UPDATE по pk__in (при
+    списании - только у счетов, на которых хватает средств), а запись
+    BalanceAdjustment и проводки по всем счетам добавляются одной пачкой.
+    Средства счетов с сегментами баланса перед корректировкой собираются в
+    строке счета (см. gather_reserves). Если хотя бы на одном счете не
+    хватает средств для списания, корректировка не выполняется. Возвращает
+    запись BalanceAdjustment.
+    """
+    account_ids = sorted(set(account_ids))
+
+    with transaction.atomic():
+        balances = lock_accounts(account_ids)
+        balances.update(gather_reserves(set(account_ids) - balances.keys()))
+        balances.update(lock_account_rows(set(account_ids) - balances.keys()))
+        missing = [pk for pk in account_ids if pk not in balances]
+        if missing:
+            raise ValidationError(f"Счета не найдены: {', '.join(map(str, missing))}")
+
+        for chunk in chunks(account_ids):
+            accounts = CustomUser.objects.filter(pk__in=chunk)
+            if amount < 0:
+                accounts = accounts.filter(balance__gte=-amount)
+            if accounts.update(balance=F("balance") + amount) != len(chunk):
+                raise ValidationError(
+                    f"На некоторых счетах недостаточно средств для списания."
+                )
+
+        created_at = timezone.now()
+        adjustment = BalanceAdjustment.objects.create(
+            amount=amount,
+            accounts=len(account_ids),
+            reason=reason,
+            author=author,
+            created_at=created_at,
+        )
+        LedgerEntry.objects.bulk_create(
+            LedgerEntry(
+                adjustment=adjustment,
+                account_id=pk,
+                amount=amount,
+                balance_after=balances[pk] + amount,
+                created_at=created_at,
+            )
+            for pk in account_ids
+        )
+        adjust_balance_summary(amount * len(account_ids))
+        invalidate_accounts_on_commit(account_ids)
+
+    return adjustment
+
+
+def record_openings(balances):
+    """
+    Записывает в журнал начальные балансы новых счетов balances - список
+    пар (pk, баланс в копейках), - чтобы цепочка балансов каждого счета
+    начиналась с нуля (см. verify_ledger). Счета с одинаковым балансом
+    записываются одной корректировкой OPENING_REASON; корректировки и
+    проводки добавляются пачками bulk_create, нулевые балансы пропускаются.
+    Балансы счетов и сводка по балансам не меняются: новые счета уже учтены
+    в ней.
+    """
+    accounts = {}
+    for pk, balance in balances:
+        if balance:
+            accounts.setdefault(balance, []).append(pk)
+    if not accounts:
+        return
+
+    created_at = timezone.now()
+    adjustments = BalanceAdjustment.objects.bulk_create(
+        BalanceAdjustment(
+            amount=amount,
+            accounts=len(account_ids),
+            reason=OPENING_REASON,
+            created_at=created_at,
+        )
+        for amount, account_ids in accounts.items()
+    )
+    LedgerEntry.objects.bulk_create(
+        LedgerEntry(
+            adjustment=adjustment,
+            account_id=pk,
+            amount=adjustment.amount,
+            balance_after=adjustment.amount,
+            created_at=created_at,
+        )
+        for adjustment, account_ids in zip(adjustments, accounts.values())
+        for pk in account_ids
+    )
@@ -0,0 +1,401 @@
+import random
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .allocation import allocate_equal
+from .models import (
+    AccountStats,
+    BalanceAdjustment,
+    BalanceShard,
+    CustomUser,
+    LedgerEntry,
+)
+from .stats import PENDING_STATS, add_daily_stats
+from .utils import chunks
+
+# Наибольшее число сегментов баланса одного счета.
+MAX_BALANCE_SHARDS = 64
+
+# Причина корректировок, которыми в журнал записываются перемещения денег
+# между остатком счета и его сегментами.
+SHARD_MOVE_REASON = "Перераспределение сегментов баланса"
+
+
+class ShardsRemoved(Exception):
+    """
+    Сегменты счета удалены параллельной транзакцией (reshard_account с
+    count=0) после того, как счет был прочитан как счет с сегментами.
+    Строка счета к этому моменту заблокирована, reserve - баланс в ней.
+    """
+
+    def __init__(self, reserve):
+        super().__init__(reserve)
+        self.reserve = reserve
+
+
+def sharded_accounts(account_ids):
+    """
+    Возвращает словарь pk -> число сегментов для тех счетов из account_ids,
+    баланс которых разделен на сегменты. Для пустого account_ids запрос к
+    базе не выполняется.
+    """
+    sharded = {}
+    for chunk in chunks(sorted(set(account_ids))):
+        sharded.update(
+            CustomUser.objects.filter(pk__in=chunk, balance_shards__gt=0).values_list(
+                "pk", "balance_shards"
+            )
+        )
+    return sharded
+
+
+def account_balance(pk):
+    """
+    Возвращает баланс счета pk в копейках вместе с сегментами баланса.
+    """
+    reserve = CustomUser.objects.filter(pk=pk).values_list("balance", flat=True).get()
+    shards = BalanceShard.objects.filter(account_id=pk).aggregate(total=Sum("balance"))
+    return reserve + (shards["total"] or 0)
+
+
+def add_shard_balances(rows):
+    """
+    Прибавляет к балансу строк rows - словарей с ключами id, balance и
+    balance_shards - балансы сегментов. Запрос к базе выполняется, только
+    если среди строк есть счета с сегментами.
+    """
+    sharded = [row["id"] for row in rows if row["balance_shards"]]
+    if not sharded:
+        return
+    totals = dict(
+        BalanceShard.objects.filter(account_id__in=sharded)
+        .values("account_id")
+        .annotate(total=Sum("balance"))
+        .values_list("account_id", "total")
+    )
+    for row in rows:
+        row["balance"] += totals.get(row["id"], 0)
+
+
+def settle_shards(sender_id, credits, total, sharded):
+    """
+    Выполняет часть перевода, приходящуюся на счета sharded с сегментами
+    баланса (словарь pk -> число сегментов): списание total копеек с
+    отправителя sender_id и зачисления credits - списка пар (pk, сумма).
+    Строки счетов при этом не блокируются: каждый счет меняет баланс одного
+    своего сегмента, а сегменты разных счетов блокируются в порядке pk.
+
+    Статистика дня перевода накапливается в первом затронутом сегменте,
+    поэтому такой перевод не обновляет корзины DailyStats. Возвращает пару
+    словарей: pk -> (номер сегмента, баланс сегмента после проводки) и
+    pk -> баланс в строке счета для счетов, сегменты которых успели удалить
+    (см. ShardsRemoved). Такие счета ничем не изменены, их строки
+    заблокированы, и проводить их нужно как счета без сегментов.
+    """
+    amounts = dict(credits)
+    day = (len(credits), total)
+    entries = {}
+    removed = {}
+    for pk in sorted(sharded):
+        try:
+            if pk == sender_id:
+                entries[pk] = debit_shard(pk, total, day)
+            else:
+                entries[pk] = credit_shard(pk, sharded[pk], amounts[pk], day)
+        except ShardsRemoved as e:
+            removed[pk] = e.reserve
+            continue
+        day = None
+    return entries, removed
+
+
+def debit_shard(pk, amount, day=None):
+    """
+    Списывает amount копеек с одного из сегментов счета pk и учитывает
+    отправленный перевод в статистике сегмента.
+
+    Сегмент выбирается случайно среди тех, на которых хватает средств и
+    строки которых не заблокированы другими транзакциями (SELECT ... FOR
+    UPDATE SKIP LOCKED), поэтому параллельные списания расходятся по разным
+    сегментам. Если заблокированы все такие сегменты, списание ждет
+    случайный из них, а если средств не хватает ни на одном сегменте, все
+    средства счета собираются в одном сегменте (см. gather_shard). day -
+    пара (число зачислений, сумма) для статистики дня или None. Возвращает
+    пару (номер сегмента, баланс сегмента после списания).
+    """
+    shard = (
+        BalanceShard.objects.select_for_update(skip_locked=True)
+        .filter(account_id=pk, balance__gte=amount)
+        .order_by("?")
+        .first()
+    )
+    if shard is None:
+        shard = (
+            BalanceShard.objects.select_for_update()
+            .filter(account_id=pk, balance__gte=amount)
+            .order_by("?")
+            .first()
+        )
+    if shard is None:
+        shard = gather_shard(pk, amount)
+    changes = {
+        "sent_count": F("sent_count") + 1,
+        "sent_volume": F("sent_volume") + amount,
+    }
+    return update_shard(shard, -amount, changes, day)
+
+
+def credit_shard(pk, count, amount, day=None):
+    """
+    Зачисляет amount копеек на случайный незаблокированный сегмент счета
+    pk с count сегментами, а если заблокированы все, - на случайный сегмент
+    с ожиданием его блокировки. Учитывает полученное зачисление в
+    статистике сегмента. Возвращает пару (номер сегмента, баланс сегмента
+    после зачисления).
+
+    Если такого сегмента уже нет (число сегментов изменили после чтения
+    count), блокирует строку счета и все сегменты и зачисляет на случайный
+    из оставшихся; если сегментов не осталось, выбрасывает ShardsRemoved.
+    """
+    shard = (
+        BalanceShard.objects.select_for_update(skip_locked=True)
+        .filter(account_id=pk)
+        .order_by("?")
+        .first()
+    )
+    if shard is None:
+        shard = (
+            BalanceShard.objects.select_for_update()
+            .filter(account_id=pk, index=random.randrange(count))
+            .first()
+        )
+    if shard is None:
+        reserve, count, shards = lock_shards(pk)
+        if not count:
+            raise ShardsRemoved(reserve)
+        shard = random.choice(shards)
+    changes = {
+        "received_count": F("received_count") + 1,
+        "received_volume": F("received_volume") + amount,
+    }
+    return update_shard(shard, amount, changes, day)
+
+
+def update_shard(shard, amount, changes, day):
+    """
+    Меняет баланс заблокированного сегмента shard на amount копеек вместе с
+    полями статистики changes одним UPDATE. Если задан day, учитывает
+    перевод в статистике дня сегмента; накопленная статистика прошлого дня
+    сначала переносится в DailyStats.
+    """
+    if day is not None:
+        credits, volume = day
+        date = timezone.localdate()
+        if shard.day == date:
+            changes.update(
+                day_transfers=F("day_transfers") + 1,
+                day_credits=F("day_credits") + credits,
+                day_volume=F("day_volume") + volume,
+            )
+        else:
+            if shard.day_transfers:
+                add_daily_stats(
+                    shard.day, shard.day_transfers, shard.day_credits, shard.day_volume
+                )
+            changes.update(
+                day=date, day_transfers=1, day_credits=credits, day_volume=volume
+            )
+    BalanceShard.objects.filter(pk=shard.pk).update(
+        balance=F("balance") + amount, **changes
+    )
+    return shard.index, shard.balance + amount
+
+
+def lock_shards(pk):
+    """
+    Блокирует строку счета pk и все его сегменты в порядке номеров.
+    Возвращает остаток в строке счета, число сегментов по строке счета
+    (прочитанное под блокировкой) и список сегментов.
+
+    В PostgreSQL строка счета блокируется как FOR NO KEY UPDATE: переводы
+    по сегментам не блокируют строку счета, но записи Transfer и
+    LedgerEntry со ссылкой на счет берут на нее блокировку FOR KEY SHARE,
+    и обычный FOR UPDATE здесь взаимно блокировался бы с ними.
+    """
+    no_key = connection.features.has_select_for_no_key_update
+    reserve, count = (
+        CustomUser.objects.select_for_update(no_key=no_key)
+        .filter(pk=pk)
+        .values_list("balance", "balance_shards")
+        .get()
+    )
+    shards = list(
+        BalanceShard.objects.select_for_update().filter(account_id=pk).order_by("index")
+    )
+    return reserve, count, shards
+
+
+def gather_shard(pk, amount):
+    """
+    Собирает все средства счета pk в его самом крупном сегменте, чтобы с
+    него можно было списать amount копеек. Блокирует строку счета и все
+    сегменты; если средств счета не хватает, выбрасывает ValidationError,
+    а если сегментов у счета уже нет, - ShardsRemoved. Возвращает сегмент.
+    """
+    reserve, count, shards = lock_shards(pk)
+    if not count:
+        raise ShardsRemoved(reserve)
+    total = reserve + sum(shard.balance for shard in shards)
+    if total < amount:
+        raise ValidationError(f"У отправителя недостаточно средств.")
+    target = max(shards, key=lambda shard: shard.balance)
+    move_balances(pk, reserve, shards, 0, {target.index: total})
+    return target
+
+
+def gather_reserves(account_ids):
+    """
+    Блокирует строки и сегменты тех счетов из account_ids, баланс которых
+    разделен на сегменты, в порядке pk и переносит все средства каждого
+    такого счета в остаток в его строке. После этого со счетом можно
+    работать как со счетом без сегментов до конца транзакции (пакеты
+    распределений, корректировки); сегменты снова пополнит
+    rebalance_accounts. Возвращает словарь pk -> баланс счета.
+    """
+    balances = {}
+    for pk in sorted(sharded_accounts(account_ids)):
+        reserve, _, shards = lock_shards(pk)
+        balances[pk] = reserve + sum(shard.balance for shard in shards)
+        move_balances(pk, reserve, shards, balances[pk], {})
+    return balances
+
+
+def move_balances(pk, reserve, shards, new_reserve, new_balances):
+    """
+    Перемещает деньги счета pk между остатком в строке счета (сейчас
+    reserve) и заблокированными сегментами shards так, чтобы остаток стал
+    new_reserve, а балансы сегментов - new_balances (словарь номер ->
+    баланс, по умолчанию 0). Общий баланс счета не меняется. Перемещение
+    записывается в журнал корректировкой с нулевой суммой и проводками по
+    остатку и каждому измененному сегменту.
+    """
+    entries = []
+    if new_reserve != reserve:
+        CustomUser.objects.filter(pk=pk).update(balance=new_reserve)
+        entries.append((None, new_reserve - reserve, new_reserve))
+    for shard in shards:
+        balance = new_balances.get(shard.index, 0)
+        if balance != shard.balance:
+            BalanceShard.objects.filter(pk=shard.pk).update(balance=balance)
+            entries.append((shard.index, balance - shard.balance, balance))
+            shard.balance = balance
+    if not entries:
+        return
+
+    created_at = timezone.now()
+    adjustment = BalanceAdjustment.objects.create(
+        amount=0, accounts=1, reason=SHARD_MOVE_REASON, created_at=created_at
+    )
+    LedgerEntry.objects.bulk_create(
+        LedgerEntry(
+            adjustment=adjustment,
+            account_id=pk,
+            shard=index,
+            amount=amount,
+            balance_after=balance_after,
+            created_at=created_at,
+        )
+        for index, amount, balance_after in entries
+    )
+
+
+def flush_shard_stats(pk, shards):
+    """
+    Переносит статистику, накопленную в сегментах shards счета pk, в
+    AccountStats и DailyStats и обнуляет ее в сегментах.
+    """
+    pending = [shard for shard in shards if shard.sent_count or shard.received_count]
+    if not pending:
+        return
+
+    AccountStats.objects.bulk_create(
+        [AccountStats(account_id=pk)], ignore_conflicts=True
+    )
+    AccountStats.objects.filter(pk=pk).update(
+        **{
+            field: F(field) + sum(getattr(shard, field) for shard in pending)
+            for field in (
+                "sent_count",
+                "sent_volume",
+                "received_count",
+                "received_volume",
+            )
+        }
+    )
+    days = {}
+    for shard in pending:
+        if shard.day_transfers:
+            transfers, credits, volume = days.get(shard.day, (0, 0, 0))
+            days[shard.day] = (
+                transfers + shard.day_transfers,
+                credits + shard.day_credits,
+                volume + shard.day_volume,
+            )
+    for date in sorted(days):
+        add_daily_stats(date, *days[date])
+    BalanceShard.objects.filter(pk__in=[shard.pk for shard in pending]).update(
+        **PENDING_STATS
+    )
+
+
+@transaction.atomic
+def reshard_account(pk, count=None):
+    """
+    Делит баланс счета pk поровну между count сегментами (по умолчанию -
+    текущим числом сегментов счета) и переносит накопленную в сегментах
+    статистику в AccountStats и DailyStats. При count=0 сегменты удаляются,
+    и весь баланс возвращается в строку счета.
+
+    Строка счета и все сегменты блокируются до конца транзакции, поэтому
+    параллельные переводы с этим счетом ждут окончания перераспределения.
+    Возвращает число сегментов счета.
+    """
+    if count is not None and not 0 <= count <= MAX_BALANCE_SHARDS:
+        raise ValueError(f"Число сегментов должно быть от 0 до {MAX_BALANCE_SHARDS}")
+    reserve, current, shards = lock_shards(pk)
+    count = current if count is None else count
+    flush_shard_stats(pk, shards)
+
+    existing = {shard.index for shard in shards}
+    shards.extend(
+        BalanceShard.objects.bulk_create(
+            BalanceShard(account_id=pk, index=index)
+            for index in range(count)
+            if index not in existing
+        )
+    )
+    total = reserve + sum(shard.balance for shard in shards)
+    balances = dict(enumerate(allocate_equal(total, count))) if count else {}
+    move_balances(pk, reserve, shards, 0 if count else total, balances)
+
+    BalanceShard.objects.filter(account_id=pk, index__gte=count).delete()
+    if count != current:
+        CustomUser.objects.filter(pk=pk).update(balance_shards=count)
+    return count
+
+
+def rebalance_accounts():
+    """
+    Перераспределяет балансы всех счетов с сегментами (см.
+    reshard_account), каждый счет - отдельной транзакцией. Возвращает число
+    обработанных счетов.
+    """
+    accounts = CustomUser.objects.filter(balance_shards__gt=0).order_by("pk")
+    count = 0
+    for pk in accounts.values_list("pk", flat=True).iterator():
+        reshard_account(pk)
+        count += 1
+    return count
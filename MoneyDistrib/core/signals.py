@@ -0,0 +1,108 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .caching import invalidate_accounts_on_commit, invalidate_users_table_on_commit
+from .inns import invalidate_inns_on_commit
+from .models import CustomUser
+from .services import record_openings
+from .stats import adjust_balance_summary
+
+# Поля пользователя, изменение которых меняет состав страниц списка
+# пользователей на главной странице.
+USERS_TABLE_FIELDS = {"username", "inn"}
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_balance_change(sender, instance, update_fields=None, **kwargs):
+    """
+    Запоминает изменение баланса сохраняемого пользователя для сводки по
+    балансам и изменение его ИНН для кэша ИНН. Старые значения читаются из
+    базы одним запросом, только если сохраняется существующий пользователь
+    вместе с полем balance или inn.
+    """
+    instance._balance_delta = 0
+    instance._inn_changed = False
+    if instance._state.adding:
+        return
+    if update_fields is not None and not {"balance", "inn"} & set(update_fields):
+        return
+    old = (
+        CustomUser.objects.filter(pk=instance.pk).values_list("balance", "inn").first()
+    )
+    if old is None:
+        return
+    old_balance, old_inn = old
+    if update_fields is None or "balance" in update_fields:
+        instance._balance_delta = instance.balance - old_balance
+    instance._inn_changed = old_inn != instance.inn
+
+
+@receiver(post_save, sender=CustomUser)
+def update_summary_on_save(sender, instance, created, **kwargs):
+    """
+    Учитывает нового пользователя или изменение баланса в сводке.
+    """
+    if created:
+        adjust_balance_summary(instance.balance, 1)
+    elif instance._balance_delta:
+        adjust_balance_summary(instance._balance_delta)
+
+
+@receiver(post_save, sender=CustomUser)
+def record_opening_on_create(sender, instance, created, **kwargs):
+    """
+    Записывает в журнал начальный баланс нового пользователя, чтобы его
+    цепочка балансов начиналась с нуля (см. verify_ledger).
+    """
+    if created:
+        record_openings([(instance.pk, instance.balance)])
+
+
+@receiver(post_delete, sender=CustomUser)
+def update_summary_on_delete(sender, instance, **kwargs):
+    """
+    Исключает удаленного пользователя из сводки.
+    """
+    adjust_balance_summary(-instance.balance, -1)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_users_cache_on_save(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """
+    Сбрасывает кэш страниц списка пользователей после сохранения
+    пользователя: весь кэш, если мог измениться состав страниц, или только
+    страницы с этим счетом, если изменился баланс.
+    """
+    if created or update_fields is None or USERS_TABLE_FIELDS & set(update_fields):
+        invalidate_users_table_on_commit()
+    elif instance._balance_delta:
+        invalidate_accounts_on_commit([instance.pk])
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_users_cache_on_delete(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш страниц списка пользователей после удаления
+    пользователя.
+    """
+    invalidate_users_table_on_commit()
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_inn_cache_on_save(sender, instance, created, **kwargs):
+    """
+    Сбрасывает кэш ИНН после фиксации изменения ИНН пользователя. Новый
+    пользователь кэш не меняет: отсутствие ИНН в нем не хранится.
+    """
+    if not created and instance._inn_changed:
+        invalidate_inns_on_commit()
+
+
+@receiver(post_delete, sender=CustomUser)
+def invalidate_inn_cache_on_delete(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш ИНН после фиксации удаления пользователя.
+    """
+    invalidate_inns_on_commit()
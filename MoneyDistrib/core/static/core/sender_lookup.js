@@ -0,0 +1,38 @@
+document.addEventListener("DOMContentLoaded", function () {
+  document.querySelectorAll("[data-sender-lookup]").forEach(function (input) {
+    var target = document.getElementById(input.dataset.target);
+    var options = document.getElementById(input.getAttribute("list"));
+    var pending = null;
+
+    input.addEventListener("input", function () {
+      var match = Array.prototype.find.call(options.options, function (option) {
+        return option.value === input.value;
+      });
+      target.value = match ? match.dataset.id : "";
+      if (match || input.value.length < 2) {
+        return;
+      }
+
+      if (pending) {
+        pending.abort();
+      }
+      pending = new AbortController();
+      fetch(input.dataset.senderLookup + "?q=" + encodeURIComponent(input.value), {
+        signal: pending.signal,
+      })
+        .then(function (response) {
+          return response.json();
+        })
+        .then(function (data) {
+          options.innerHTML = "";
+          data.results.forEach(function (user) {
+            var option = document.createElement("option");
+            option.value = user.username + " (" + user.inn + ")";
+            option.dataset.id = user.id;
+            options.appendChild(option);
+          });
+        })
+        .catch(function () {});
+    });
+  });
+});
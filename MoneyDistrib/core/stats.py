@@ -0,0 +1,259 @@
+import random
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    AccountStats,
+    BalanceShard,
+    BalanceSummary,
+    CustomUser,
+    DailyStats,
+    LedgerEntry,
+    Transfer,
+)
+from .utils import add_amounts, chunks
+
+# Первичный ключ единственной строки BalanceSummary.
+SUMMARY_PK = 1
+
+# Число строк-корзин DailyStats, между которыми делится статистика дня.
+DAILY_STATS_BUCKETS = 16
+
+# Поля статистики, накапливаемой в строках сегментов баланса (BalanceShard),
+# и их начальные значения.
+PENDING_STATS = {
+    "sent_count": 0,
+    "sent_volume": 0,
+    "received_count": 0,
+    "received_volume": 0,
+    "day": None,
+    "day_transfers": 0,
+    "day_credits": 0,
+    "day_volume": 0,
+}
+
+
+def record_stats(sender_id, credits, total, moment, sharded=()):
+    """
+    Учитывает перевод в сводной статистике: у отправителя sender_id
+    увеличиваются число и объем отправленных переводов, у получателей из
+    credits - списка пар (pk, сумма в копейках) - число и объем полученных,
+    а у дня перевода moment - число переводов, зачислений и объем.
+    Вызывается внутри транзакции перевода, после блокировки строк счетов,
+    поэтому строки статистики счетов обновляются в том же порядке, что и
+    сами счета. Статистика дня прибавляется к случайной корзине дня (см.
+    add_daily_stats), поэтому переводы разных счетов не ждут друг друга.
+
+    Счета sharded с сегментами баланса пропускаются: их статистика, как и
+    статистика дня перевода с их участием, накапливается в строках
+    сегментов (см. core.shards).
+    """
+    account_ids = [
+        pk for pk in (sender_id, *(pk for pk, _ in credits)) if pk not in sharded
+    ]
+    AccountStats.objects.bulk_create(
+        [AccountStats(account_id=pk) for pk in account_ids], ignore_conflicts=True
+    )
+    if sender_id not in sharded:
+        AccountStats.objects.filter(pk=sender_id).update(
+            sent_count=F("sent_count") + 1, sent_volume=F("sent_volume") + total
+        )
+    if sharded:
+        credits = [(pk, amount) for pk, amount in credits if pk not in sharded]
+    add_amounts(
+        AccountStats, "received_volume", credits, count_field="received_count"
+    )
+
+    if not sharded:
+        add_daily_stats(timezone.localdate(moment), 1, len(credits), total)
+
+
+def record_batch_stats(transfers, moment):
+    """
+    Учитывает в сводной статистике пакет переводов transfers - список троек
+    (pk отправителя, зачисления, сумма) - выполненных в одной транзакции.
+    Число и объем переводов суммируются по счетам заранее, поэтому счет,
+    участвующий в нескольких переводах пакета, обновляется одной строкой
+    UPDATE, а корзина дня - одним UPDATE на весь пакет.
+    """
+    sent, received = {}, {}
+    for sender_id, credits, total in transfers:
+        count, volume = sent.get(sender_id, (0, 0))
+        sent[sender_id] = (count + 1, volume + total)
+        for pk, amount in credits:
+            count, volume = received.get(pk, (0, 0))
+            received[pk] = (count + 1, volume + amount)
+
+    AccountStats.objects.bulk_create(
+        [AccountStats(account_id=pk) for pk in sorted(sent.keys() | received.keys())],
+        ignore_conflicts=True,
+    )
+    for totals, count_field, volume_field in (
+        (sent, "sent_count", "sent_volume"),
+        (received, "received_count", "received_volume"),
+    ):
+        add_amounts(
+            AccountStats,
+            count_field,
+            [(pk, count) for pk, (count, _) in totals.items()],
+        )
+        add_amounts(
+            AccountStats,
+            volume_field,
+            [(pk, volume) for pk, (_, volume) in totals.items()],
+        )
+
+    add_daily_stats(
+        timezone.localdate(moment),
+        len(transfers),
+        sum(count for count, _ in received.values()),
+        sum(volume for _, volume in sent.values()),
+    )
+
+
+def add_daily_stats(date, transfers, credits, volume):
+    """
+    Прибавляет к статистике дня date число переводов, зачислений и объем в
+    копейках. Статистика записывается в случайную из DAILY_STATS_BUCKETS
+    корзин дня, поэтому параллельные переводы обычно блокируют разные
+    строки. Создает строку корзины и строку корзины 0, по которой день
+    показывается в итогах (см. daily_totals), если их еще нет.
+    """
+    bucket = random.randrange(DAILY_STATS_BUCKETS)
+    DailyStats.objects.bulk_create(
+        [DailyStats(date=date, bucket=index) for index in sorted({0, bucket})],
+        ignore_conflicts=True,
+    )
+    DailyStats.objects.filter(date=date, bucket=bucket).update(
+        transfer_count=F("transfer_count") + transfers,
+        credit_count=F("credit_count") + credits,
+        volume=F("volume") + volume,
+    )
+
+
+def daily_totals():
+    """
+    Возвращает QuerySet итогов по дням: строки корзины 0, по одной на день,
+    с суммами по всем корзинам дня в полях total_transfers, total_credits и
+    total_volume.
+    """
+    day = DailyStats.objects.filter(date=OuterRef("date")).order_by().values("date")
+
+    def total(field):
+        return Subquery(day.annotate(total=Sum(field)).values("total"))
+
+    return DailyStats.objects.filter(bucket=0).annotate(
+        total_transfers=total("transfer_count"),
+        total_credits=total("credit_count"),
+        total_volume=total("volume"),
+    )
+
+
+def adjust_balance_summary(balance_delta, accounts_delta=0):
+    """
+    Изменяет сумму балансов и число счетов в BalanceSummary на заданные
+    величины. Создает строку сводки, если ее еще нет.
+    """
+    summary = BalanceSummary.objects.filter(pk=SUMMARY_PK)
+    changes = {
+        "total_balance": F("total_balance") + balance_delta,
+        "accounts": F("accounts") + accounts_delta,
+    }
+    if not summary.update(**changes):
+        BalanceSummary.objects.bulk_create(
+            [BalanceSummary(pk=SUMMARY_PK)], ignore_conflicts=True
+        )
+        summary.update(**changes)
+
+
+def get_balance_summary():
+    """
+    Возвращает строку BalanceSummary или пустую сводку, если ее еще нет.
+    """
+    summary = BalanceSummary.objects.filter(pk=SUMMARY_PK).first()
+    return summary or BalanceSummary(pk=SUMMARY_PK)
+
+
+@transaction.atomic
+def rebuild_stats():
+    """
+    Пересчитывает всю сводную статистику по журналу переводов и балансам
+    счетов. Нужна один раз для уже накопленной истории и для исправления
+    расхождений после изменения балансов в обход моделей (QuerySet.update).
+    Статистика, накопленная в сегментах баланса, обнуляется: журнал уже
+    содержит эти переводы. Возвращает число пересчитанных счетов и дней.
+    """
+    stats = {}
+
+    def account_stats(pk):
+        if pk not in stats:
+            stats[pk] = AccountStats(account_id=pk)
+        return stats[pk]
+
+    sent = (
+        Transfer.objects.order_by()
+        .values("sender_id")
+        .annotate(count=Count("id"), volume=Sum("amount"))
+        .values_list("sender_id", "count", "volume")
+    )
+    for pk, count, volume in sent:
+        row = account_stats(pk)
+        row.sent_count, row.sent_volume = count, volume
+
+    received = (
+        LedgerEntry.objects.filter(transfer__isnull=False)
+        .exclude(account_id=F("transfer__sender_id"))
+        .order_by()
+        .values("account_id")
+        .annotate(count=Count("id"), volume=Sum("amount"))
+        .values_list("account_id", "count", "volume")
+    )
+    for pk, count, volume in received:
+        row = account_stats(pk)
+        row.received_count, row.received_volume = count, volume
+
+    days = {}
+    by_day = (
+        Transfer.objects.annotate(date=TruncDate("created_at"))
+        .order_by()
+        .values("date")
+        .annotate(count=Count("id"), volume=Sum("amount"))
+        .values_list("date", "count", "volume")
+    )
+    for date, count, volume in by_day:
+        days[date] = DailyStats(date=date, transfer_count=count, volume=volume)
+    credits_by_day = (
+        LedgerEntry.objects.filter(transfer__isnull=False)
+        .exclude(account_id=F("transfer__sender_id"))
+        .annotate(date=TruncDate("transfer__created_at"))
+        .order_by()
+        .values("date")
+        .annotate(count=Count("id"))
+        .values_list("date", "count")
+    )
+    for date, count in credits_by_day:
+        days[date].credit_count = count
+
+    summary = CustomUser.objects.aggregate(
+        total_balance=Sum("balance"), accounts=Count("id")
+    )
+    shards = BalanceShard.objects.aggregate(total_balance=Sum("balance"))
+
+    BalanceShard.objects.update(**PENDING_STATS)
+    AccountStats.objects.all().delete()
+    for chunk in chunks(list(stats.values())):
+        AccountStats.objects.bulk_create(chunk)
+    DailyStats.objects.all().delete()
+    DailyStats.objects.bulk_create(days.values())
+    BalanceSummary.objects.update_or_create(
+        pk=SUMMARY_PK,
+        defaults={
+            "total_balance": (summary["total_balance"] or 0)
+            + (shards["total_balance"] or 0),
+            "accounts": summary["accounts"],
+        },
+    )
+    return len(stats), len(days)
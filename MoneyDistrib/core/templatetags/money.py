@@ -0,0 +1,15 @@
+from django import template
+
+from ..money import Money
+
+register = template.Library()
+
+
+@register.filter
+def money(kopecks):
+    """
+    Форматирует сумму в копейках как сумму в рублях.
+    """
+    if kopecks is None or kopecks == "":
+        return ""
+    return str(Money(kopecks))
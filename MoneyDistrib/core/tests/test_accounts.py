@@ -0,0 +1,165 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..accounts import import_accounts_file
+from ..models import CustomUser
+from ..stats import get_balance_summary
+
+
+def make_csv(lines, name="accounts.csv"):
+    return SimpleUploadedFile(name, "\n".join(lines).encode(), "text/csv")
+
+
+class ImportAccountsTest(TestCase):
+    """
+    Тестирование импорта пользователей из файла.
+    """
+
+    def test_create_accounts(self):
+        """
+        Тестирование создания пользователей с балансом и паролем и записи
+        начальных балансов в журнал.
+        """
+        lines = [
+            "inn;username;email;balance;password",
+            "000000000001;user1;user1@example.com;10,50;secret",
+            "000000000002;user2;;;",
+            "000000000003;user3;;0;",
+        ]
+
+        self.assertEqual(import_accounts_file(make_csv(lines)), (3, 0))
+
+        user1 = CustomUser.objects.get(inn="000000000001")
+        self.assertEqual(user1.username, "user1")
+        self.assertEqual(user1.email, "user1@example.com")
+        self.assertEqual(user1.balance, 1050)
+        self.assertTrue(user1.check_password("secret"))
+        self.assertFalse(CustomUser.objects.get(username="user2").has_usable_password())
+        summary = get_balance_summary()
+        self.assertEqual((summary.accounts, summary.total_balance), (3, 1050))
+        self.assertEqual(
+            list(user1.ledger_entries.values_list("amount", "balance_after")),
+            [(1050, 1050)],
+        )
+        call_command("verify_ledger", stdout=StringIO())
+
+    def test_unusable_passwords(self):
+        """
+        Тестирование импорта без хеширования паролей.
+        """
+        lines = ["000000000001;user1;;;secret"]
+
+        import_accounts_file(make_csv(lines), unusable_passwords=True)
+
+        self.assertFalse(CustomUser.objects.get().has_usable_password())
+
+    def test_upsert_existing_accounts(self):
+        """
+        Тестирование обновления имени и email существующих пользователей
+        без изменения баланса и пароля.
+        """
+        CustomUser.objects.create_user(
+            username="old", password="password", inn="000000000001", balance=500
+        )
+        lines = [
+            "000000000001;renamed;new@example.com;100;secret",
+            "000000000002;user2;;;",
+        ]
+
+        self.assertEqual(import_accounts_file(make_csv(lines)), (1, 1))
+
+        user = CustomUser.objects.get(inn="000000000001")
+        self.assertEqual((user.username, user.email), ("renamed", "new@example.com"))
+        self.assertEqual(user.balance, 500)
+        self.assertTrue(user.check_password("password"))
+        self.assertEqual(CustomUser.objects.count(), 2)
+        summary = get_balance_summary()
+        self.assertEqual((summary.accounts, summary.total_balance), (2, 500))
+        call_command("verify_ledger", stdout=StringIO())
+
+    def test_errors_reject_whole_file(self):
+        """
+        Тестирование того, что ошибка в любой строке отменяет импорт.
+        """
+        CustomUser.objects.create_user(username="taken", inn="000000000009")
+        lines = [
+            "000000000001;user1;;;",
+            "123;user2;;;",
+            "000000000001;user3;;;",
+            "000000000004;;;;",
+            "000000000005;user5;not-an-email;;",
+            "000000000006;user6;;abc;",
+        ]
+
+        with self.assertRaises(ValidationError) as raised:
+            import_accounts_file(make_csv(lines))
+        self.assertEqual(
+            [message.split(":")[0] for message in raised.exception.messages],
+            ["Строка 2", "Строка 3", "Строка 4", "Строка 5", "Строка 6"],
+        )
+
+        with self.assertRaises(ValidationError) as raised:
+            import_accounts_file(make_csv(["000000000001;taken;;;"]))
+        self.assertIn("Имя taken уже занято", raised.exception.messages[0])
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_command(self):
+        """
+        Тестирование команды import_accounts.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "accounts.csv")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("000000000001;user1;;;\n000000000002;user2;;;\n")
+
+            out = StringIO()
+            call_command("import_accounts", path, "--unusable-passwords", stdout=out)
+            self.assertIn("создано 2, обновлено 0", out.getvalue())
+
+            with open(path, "w", encoding="utf-8") as file:
+                file.write("123;user1;;;\n")
+            with self.assertRaises(CommandError):
+                call_command("import_accounts", path, stderr=StringIO())
+
+        self.assertEqual(CustomUser.objects.count(), 2)
+
+
+class ImportAccountsAdminTest(TestCase):
+    """
+    Тестирование страницы импорта пользователей в админке.
+    """
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username="admin", password="password", inn="000000000100"
+        )
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:core_customuser_import")
+
+    def test_import(self):
+        """
+        Тестирование импорта файла через админку.
+        """
+        response = self.client.post(
+            self.url,
+            {"file": make_csv(["000000000001;user1;;;"]), "unusable_passwords": "on"},
+        )
+
+        self.assertRedirects(response, reverse("admin:core_customuser_changelist"))
+        self.assertTrue(CustomUser.objects.filter(username="user1").exists())
+
+    def test_import_errors(self):
+        """
+        Тестирование вывода ошибок импорта.
+        """
+        response = self.client.post(self.url, {"file": make_csv(["123;user1;;;"])})
+
+        self.assertContains(response, "Строка 1")
+        self.assertFalse(CustomUser.objects.filter(username="user1").exists())
@@ -0,0 +1,159 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import BalanceAdjustment, CustomUser
+from ..pagination import EstimatedCountPaginator
+from ..services import OPENING_REASON
+
+
+class CustomUserAdminTest(TestCase):
+    """
+    Тестирование списка пользователей в админке: поиска, фильтра по
+    балансу и загружаемых колонок.
+    """
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username="admin", password="password", inn="000000000001"
+        )
+        self.user1 = CustomUser.objects.create_user(
+            username="user1", inn="000000000002", balance=0
+        )
+        self.user10 = CustomUser.objects.create_user(
+            username="user10", inn="000000000003", balance=50_000
+        )
+        self.user2 = CustomUser.objects.create_user(
+            username="user2", inn="000000000004", balance=20_000_000
+        )
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:core_customuser_changelist")
+
+    def changelist_users(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return {user.username for user in response.context["cl"].result_list}
+
+    def test_search_by_username_prefix(self):
+        """
+        Тестирование поиска по префиксу имени пользователя.
+        """
+        self.assertEqual(self.changelist_users(q="user1"), {"user1", "user10"})
+        self.assertEqual(self.changelist_users(q="ser"), set())
+
+    def test_search_by_inn(self):
+        """
+        Тестирование поиска по точному ИНН.
+        """
+        self.assertEqual(self.changelist_users(q="000000000003"), {"user10"})
+        self.assertEqual(self.changelist_users(q="00000000000"), set())
+
+    def test_balance_filter(self):
+        """
+        Тестирование фильтра по диапазону баланса.
+        """
+        self.assertEqual(self.changelist_users(balance="zero"), {"admin", "user1"})
+        self.assertEqual(self.changelist_users(balance="lt1000"), {"user10"})
+        self.assertEqual(self.changelist_users(balance="gte100000"), {"user2"})
+
+    def test_only_displayed_columns(self):
+        """
+        Тестирование того, что список загружает только отображаемые колонки
+        вместе со статистикой одним запросом.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.changelist_users()
+        selects = [query["sql"] for query in queries if "sent_volume" in query["sql"]]
+        self.assertEqual(len(selects), 1)
+        self.assertNotIn("date_joined", selects[0])
+
+
+    def test_adjust_balance_action(self):
+        """
+        Тестирование действия изменения баланса выбранных пользователей.
+        """
+        data = {
+            "action": "adjust_balance",
+            "_selected_action": [self.user1.pk, self.user10.pk],
+        }
+        response = self.client.post(self.url, data)
+        self.assertContains(response, "Выбрано пользователей: 2")
+
+        response = self.client.post(
+            self.url, {**data, "apply": "1", "amount": "-1.00", "reason": "Тест"}
+        )
+        self.assertRedirects(response, self.url)
+        self.assertFalse(
+            BalanceAdjustment.objects.exclude(reason=OPENING_REASON).exists()
+        )
+
+        response = self.client.post(
+            self.url, {**data, "apply": "1", "amount": "10.50", "reason": "Тест"}
+        )
+        self.assertRedirects(response, self.url)
+        self.user1.refresh_from_db()
+        self.user10.refresh_from_db()
+        self.assertEqual((self.user1.balance, self.user10.balance), (1050, 51_050))
+        adjustment = BalanceAdjustment.objects.exclude(reason=OPENING_REASON).get()
+        self.assertEqual(adjustment.author, self.admin)
+
+    def test_balance_read_only_on_change_form(self):
+        """
+        Тестирование того, что баланс на форме пользователя только
+        отображается и не меняется сохранением формы.
+        """
+        url = reverse("admin:core_customuser_change", args=[self.user10.pk])
+
+        response = self.client.get(url)
+
+        self.assertNotContains(response, 'name="balance"')
+        self.assertContains(response, "500.00")
+
+        response = self.client.post(
+            url,
+            {
+                "username": "user10",
+                "inn": "000000000003",
+                "is_active": "on",
+                "date_joined_0": "2024-01-01",
+                "date_joined_1": "00:00:00",
+                "balance": "1",
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.user10.refresh_from_db()
+        self.assertEqual(self.user10.balance, 50_000)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    """
+    Тестирование Paginator с оценкой числа строк.
+    """
+
+    def setUp(self):
+        for i in range(3):
+            CustomUser.objects.create_user(username=f"user{i}", inn=f"{i + 1:012d}")
+
+    def test_exact_count_without_estimate(self):
+        """
+        Тестирование точного подсчета, если оценка недоступна (SQLite).
+        """
+        paginator = EstimatedCountPaginator(CustomUser.objects.order_by("pk"), 2)
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_estimated_count(self):
+        """
+        Тестирование оценки числа строк для большой таблицы без фильтров
+        и точного подсчета для выборки с фильтром.
+        """
+        with mock.patch("core.pagination.estimated_row_count", return_value=1_000_000):
+            paginator = EstimatedCountPaginator(CustomUser.objects.order_by("pk"), 2)
+            self.assertEqual(paginator.count, 1_000_000)
+
+            filtered = CustomUser.objects.filter(username="user1").order_by("pk")
+            self.assertEqual(EstimatedCountPaginator(filtered, 2).count, 1)
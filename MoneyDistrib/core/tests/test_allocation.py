@@ -0,0 +1,76 @@
+import random
+
+from django.test import SimpleTestCase
+
+from ..allocation import allocate_equal, allocate_weighted
+
+
+class AllocationTest(SimpleTestCase):
+    """
+    Тестирование распределения суммы в копейках методом наибольшего остатка.
+    Свойства проверяются на случайных входных данных с фиксированным seed.
+    """
+
+    cases = 500
+
+    def setUp(self):
+        self.random = random.Random(20231018)
+
+    def test_equal_examples(self):
+        """
+        Тестирование равного распределения на примерах.
+        """
+        self.assertEqual(allocate_equal(10000, 3), [3334, 3333, 3333])
+        self.assertEqual(allocate_equal(2, 3), [1, 1, 0])
+        self.assertEqual(allocate_equal(0, 2), [0, 0])
+
+    def test_weighted_examples(self):
+        """
+        Тестирование распределения пропорционально весам на примерах.
+        """
+        self.assertEqual(allocate_weighted(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(allocate_weighted(100, [1, 2]), [33, 67])
+        self.assertEqual(allocate_weighted(1000, [5, 3, 0]), [625, 375, 0])
+
+    def test_invalid_input(self):
+        """
+        Тестирование отказа на некорректных входных данных.
+        """
+        with self.assertRaises(ValueError):
+            allocate_equal(100, 0)
+        for weights in ([], [0, 0], [1, -1]):
+            with self.subTest(weights=weights), self.assertRaises(ValueError):
+                allocate_weighted(100, weights)
+
+    def test_equal_properties(self):
+        """
+        Тестирование того, что равные части в сумме дают исходную сумму и
+        отличаются не более чем на копейку.
+        """
+        for _ in range(self.cases):
+            total = self.random.randint(0, 10**12)
+            count = self.random.randint(1, 1000)
+            with self.subTest(total=total, count=count):
+                parts = allocate_equal(total, count)
+                self.assertEqual(len(parts), count)
+                self.assertEqual(sum(parts), total)
+                self.assertLessEqual(max(parts) - min(parts), 1)
+
+    def test_weighted_properties(self):
+        """
+        Тестирование того, что части по весам в сумме дают исходную сумму и
+        отличаются от точной доли меньше чем на копейку.
+        """
+        for _ in range(self.cases):
+            total = self.random.randint(0, 10**12)
+            weights = [
+                self.random.randint(0, 1000)
+                for _ in range(self.random.randint(1, 200))
+            ]
+            weights[self.random.randrange(len(weights))] += 1
+            with self.subTest(total=total, weights=weights):
+                parts = allocate_weighted(total, weights)
+                weight_sum = sum(weights)
+                self.assertEqual(sum(parts), total)
+                for part, weight in zip(parts, weights):
+                    self.assertLess(abs(part * weight_sum - total * weight), weight_sum)
@@ -0,0 +1,203 @@
+import json
+
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+
+from ..batches import AMOUNT_ERROR, parse_batch_request, settle_batch, validate_batch
+from ..models import AccountStats, CustomUser, LedgerEntry, Transfer
+from ..stats import daily_totals, rebuild_stats
+
+
+def batch_body(distributions, **extra):
+    return json.dumps({"distributions": distributions, **extra})
+
+
+class ParseBatchRequestTest(SimpleTestCase):
+    """
+    Тестирование разбора пакетного запроса.
+    """
+
+    def parse(self, body, max_items=10, max_credits=100):
+        return parse_batch_request(body, max_items, max_credits)
+
+    def test_parse(self):
+        items, atomic = self.parse(
+            batch_body(
+                [
+                    {"sender": 1, "recipients": ["1234567890"], "amount": "10.50"},
+                    {"sender": "1", "recipients": ["12", "12"], "amount": "-1"},
+                    {
+                        "sender": 1,
+                        "recipients": ["1234567890"],
+                        "amount": "999999999999999.99",
+                    },
+                    {
+                        "sender": 1,
+                        "recipients": ["1234567890"],
+                        "amount": "1000000000000000",
+                    },
+                ],
+                atomic=False,
+            )
+        )
+
+        self.assertFalse(atomic)
+        self.assertEqual(items[0].status, "ok")
+        self.assertEqual(items[0].amount, 1050)
+        self.assertEqual(items[1].status, "error")
+        self.assertEqual(
+            items[1].errors,
+            [
+                "Поле sender должно быть id отправителя",
+                AMOUNT_ERROR,
+                "Некорректные ИНН: 12, 12",
+                "В списке ИНН встречаются дубликаты",
+            ],
+        )
+        self.assertEqual(items[2].amount, 10**17 - 1)
+        self.assertEqual(items[3].errors, [AMOUNT_ERROR])
+
+    def test_invalid_request(self):
+        """
+        Тестирование ошибок, относящихся ко всему пакету.
+        """
+        distribution = {"sender": 1, "recipients": ["1234567890"], "amount": "1"}
+        for body in (
+            "[]",
+            batch_body([]),
+            batch_body([distribution], atomic="yes"),
+            batch_body([distribution] * 11),
+            batch_body([{**distribution, "recipients": ["1234567890"] * 101}]),
+        ):
+            with self.subTest(body=body[:40]):
+                with self.assertRaises(ValueError):
+                    self.parse(body)
+
+
+class SettleBatchTest(TestCase):
+    """
+    Тестирование проверки и выполнения пакета распределений.
+    """
+
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", inn=f"{i:012d}", balance=1000
+            )
+            for i in range(1, 5)
+        ]
+
+    def items(self, distributions, atomic=True):
+        items, atomic = parse_batch_request(
+            batch_body(distributions, atomic=atomic), 100, 1000
+        )
+        validate_batch(items)
+        settle_batch(items, atomic)
+        return items
+
+    def distribution(self, sender, recipients, amount):
+        return {
+            "sender": self.users[sender].pk,
+            "recipients": [self.users[i].inn for i in recipients],
+            "amount": amount,
+        }
+
+    def balances(self):
+        return list(CustomUser.objects.order_by("pk").values_list("balance", flat=True))
+
+    def test_settle_batch(self):
+        """
+        Тестирование выполнения распределений по порядку: зачисление из
+        предыдущего распределения можно потратить в следующем.
+        """
+        items = self.items(
+            [
+                self.distribution(0, [1, 2], "10.00"),
+                self.distribution(1, [0, 3], "15.00"),
+                self.distribution(0, [3], "0.01"),
+            ]
+        )
+
+        self.assertEqual([item.status for item in items], ["ok"] * 3)
+        self.assertEqual(self.balances(), [749, 0, 1500, 1751])
+        self.assertEqual([item.sender_balance for item in items], [0, 0, 749])
+        self.assertEqual(Transfer.objects.count(), 3)
+        self.assertEqual(
+            list(
+                LedgerEntry.objects.filter(account=self.users[0])
+                .order_by("pk")
+                .values_list("amount", "balance_after")
+            ),
+            [(1000, 1000), (-1000, 0), (750, 750), (-1, 749)],
+        )
+        transfers = LedgerEntry.objects.filter(transfer__isnull=False)
+        self.assertEqual(transfers.aggregate(Sum("amount"))["amount__sum"], 0)
+
+    def test_stats(self):
+        """
+        Тестирование того, что статистика пакета совпадает с пересчитанной
+        по журналу.
+        """
+        self.items(
+            [
+                self.distribution(0, [1, 2], "1.00"),
+                self.distribution(0, [1], "2.00"),
+                self.distribution(3, [1, 2, 0], "3.00"),
+            ]
+        )
+        stats = list(AccountStats.objects.order_by("pk").values())
+        fields = ("date", "total_transfers", "total_credits", "total_volume")
+        days = list(daily_totals().values(*fields))
+
+        rebuild_stats()
+
+        self.assertEqual(list(AccountStats.objects.order_by("pk").values()), stats)
+        self.assertEqual(list(daily_totals().values(*fields)), days)
+        self.assertEqual(days[0]["total_transfers"], 3)
+        self.assertEqual(days[0]["total_credits"], 6)
+
+    def test_atomic(self):
+        """
+        Тестирование того, что в режиме atomic пакет с ошибкой не
+        выполняется целиком.
+        """
+        items = self.items(
+            [
+                self.distribution(0, [1], "1.00"),
+                self.distribution(2, [3], "100.00"),
+            ]
+        )
+
+        self.assertEqual([item.status for item in items], ["skipped", "error"])
+        self.assertEqual(items[1].errors, ["У отправителя недостаточно средств."])
+        self.assertEqual(self.balances(), [1000] * 4)
+        self.assertFalse(Transfer.objects.exists())
+
+    def test_partial(self):
+        """
+        Тестирование того, что без atomic выполняются все корректные
+        распределения.
+        """
+        items = self.items(
+            [
+                self.distribution(0, [1], "1.00"),
+                self.distribution(2, [3], "100.00"),
+                self.distribution(2, [2], "1.00"),
+                {"sender": self.users[3].pk, "recipients": ["999999999999"]},
+                self.distribution(3, [0], "2.00"),
+            ],
+            atomic=False,
+        )
+
+        self.assertEqual(
+            [item.status for item in items], ["ok", "error", "error", "error", "ok"]
+        )
+        self.assertEqual(items[2].errors, ["Нельзя отправить деньги самому себе"])
+        self.assertEqual(items[3].errors, [AMOUNT_ERROR])
+        self.assertEqual(self.balances(), [1100, 1100, 1000, 800])
+        self.assertEqual(Transfer.objects.count(), 2)
+
+    def test_unknown_sender(self):
+        items = self.items([{**self.distribution(0, [1], "1.00"), "sender": 0}])
+
+        self.assertEqual(items[0].errors, ["Отправителя с таким id нет в системе"])
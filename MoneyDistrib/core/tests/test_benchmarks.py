@@ -0,0 +1,165 @@
+import asyncio
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TransactionTestCase
+
+from ..benchmarks import (
+    SEED_BALANCE,
+    TransferBenchmark,
+    http_load,
+    http_request,
+    percentile,
+    seed_users,
+)
+from ..models import CustomUser
+
+
+class PercentileTest(SimpleTestCase):
+    """
+    Тестирование расчета перцентилей методом ближайшего ранга.
+    """
+
+    def test_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+
+
+class HttpLoadTest(SimpleTestCase):
+    """
+    Тестирование нагрузки HTTP-сервера одновременными соединениями.
+    """
+
+    def test_http_request(self):
+        address, request = http_request(
+            "POST", "http://127.0.0.1:8000/api/transfers/?x=1", {"amount": "1.00"}
+        )
+        self.assertEqual(address, ("127.0.0.1", 8000))
+        head, body = request.split(b"\r\n\r\n")
+        self.assertTrue(head.startswith(b"POST /api/transfers/?x=1 HTTP/1.1\r\n"))
+        self.assertIn(b"Connection: close", head)
+        self.assertIn(f"Content-Length: {len(body)}".encode(), head)
+        self.assertEqual(body, b'{"amount": "1.00"}')
+
+    def test_http_load(self):
+        """
+        Тестирование числа одновременных соединений, учета ошибок и числа
+        запросов к базе из заголовка Server-Timing.
+        """
+        active, peak = 0, 0
+
+        async def handle(reader, writer):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            request = await reader.readuntil(b"\r\n\r\n")
+            await asyncio.sleep(0.01)
+            status = b"500 Internal Server Error" if b"/fail" in request else b"200 OK"
+            writer.write(
+                b"HTTP/1.1 " + status + b"\r\n"
+                b'Server-Timing: db;dur=1.0;desc="3 queries"\r\n\r\n'
+            )
+            await writer.drain()
+            writer.close()
+            active -= 1
+
+        async def load():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+
+                def requests(number):
+                    path = "/fail" if number % 5 == 0 else "/ok"
+                    return http_request("GET", f"http://127.0.0.1:{port}{path}")
+
+                return await http_load("test", requests, 4, 20)
+
+        result = asyncio.run(load())
+
+        self.assertEqual(peak, 4)
+        self.assertEqual(result["operations"], 16)
+        self.assertEqual(result["errors"], 4)
+        self.assertEqual(result["statuses"], {"200": 16, "500": 4})
+        self.assertEqual(result["queries_per_op"], 3)
+        self.assertEqual(result["concurrency"], 4)
+
+    def test_command_validates_arguments(self):
+        """
+        Тестирование проверки аргументов команды benchmark_http.
+        """
+        for options in (
+            {"concurrency": "1,a"},
+            {"scenario": "search,upload"},
+            {"target": ["127.0.0.1:8000"]},
+        ):
+            with self.subTest(options=options):
+                with self.assertRaises(CommandError):
+                    call_command("benchmark_http", **options)
+
+
+class TransferBenchmarkTest(TransactionTestCase):
+    """
+    Тестирование сценариев замера производительности переводов.
+    """
+
+    def test_run(self):
+        """
+        Тестирование выполнения всех сценариев на небольшом числе
+        пользователей.
+        """
+        users = seed_users(30)
+        self.assertEqual(len(users), 30)
+
+        results = TransferBenchmark(users).run(
+            [1, 5], repeat=2, threads=2, concurrent_recipients=3
+        )
+
+        self.assertEqual(
+            [result["name"] for result in results],
+            [
+                "index_get",
+                "index_post[1]",
+                "distribute[1]",
+                "index_post[5]",
+                "distribute[5]",
+                "concurrent[2x3]",
+            ],
+        )
+        for result in results[:-1]:
+            self.assertEqual(result["operations"], 2)
+        self.assertEqual(results[-1]["operations"], 4)
+        for result in results:
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["queries_per_op"], 0)
+        # Последовательные сценарии переводят от первого пользователя,
+        # параллельный - от первых двух.
+        sent = CustomUser.objects.filter(stats__sent_count__gt=0).order_by("pk")
+        self.assertEqual(list(sent.values_list("stats__sent_count", flat=True)), [10, 2])
+
+    def test_hot_sender(self):
+        """
+        Тестирование замера переводов с одного счета с сегментами баланса:
+        после замера сегменты отправителя объединяются.
+        """
+        users = seed_users(10)
+
+        result = TransferBenchmark(users).hot_sender(1, 3, repeat=2, shards=2)
+
+        self.assertEqual(result["name"], "hot_sender[1x3,shards=2]")
+        self.assertEqual(result["operations"], 2)
+        self.assertEqual(result["shards"], 2)
+        sender = CustomUser.objects.get(pk=users[0].pk)
+        self.assertEqual(sender.balance_shards, 0)
+        self.assertEqual(sender.balance, SEED_BALANCE - 6)
+
+    def test_command_validates_arguments(self):
+        """
+        Тестирование проверки аргументов команды benchmark_transfers.
+        """
+        with self.assertRaises(CommandError):
+            call_command("benchmark_transfers", users=10, recipients="100")
+        with self.assertRaises(CommandError):
+            call_command("benchmark_transfers", recipients="1,a")
+        with self.assertRaises(CommandError):
+            call_command("benchmark_transfers", shards="a")
@@ -0,0 +1,198 @@
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..caching import (
+    GENERATION_KEY,
+    USERS_CACHE,
+    account_key,
+    invalidate_accounts,
+    users_page,
+)
+from ..models import CustomUser
+from ..pagination import keyset_paginate
+from ..services import distribute_money
+
+
+@override_settings(USERS_PAGE_SIZE=2)
+class UsersPageCacheTest(TestCase):
+    """
+    Тестирование кэша страниц списка пользователей в файлах, общих для
+    нескольких процессов сервера, и его сброса после переводов.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.TemporaryDirectory()
+        cls.cache_settings = override_settings(
+            CACHES={
+                "default": {
+                    "BACKEND": "django.core.cache.backends.locmem.LocMemCache"
+                },
+                USERS_CACHE: {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": cls.cache_dir.name,
+                },
+            }
+        )
+        cls.cache_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.cache_settings.disable()
+        cls.cache_dir.cleanup()
+
+    def setUp(self):
+        caches[USERS_CACHE].clear()
+        self.url = reverse("core:index")
+        # Страницы по 2 пользователя в порядке имени: (user1, user2), (user3, user4).
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", inn=f"{i:012d}", balance=10000
+            )
+            for i in range(1, 5)
+        ]
+        caches[USERS_CACHE].clear()
+
+    def page(self, cursor=None):
+        response = self.client.get(self.url, {"after": cursor} if cursor else {})
+        page = response.context["users"]
+        return page, {row["username"]: row["balance"] for row in page}
+
+    def test_cached_page(self):
+        """
+        Тестирование того, что повторное отображение страницы не обращается
+        к базе.
+        """
+        first, _ = self.page()
+        with self.assertNumQueries(0):
+            second, balances = self.page()
+        self.assertEqual(balances, {"user1": 10000, "user2": 10000})
+        self.assertEqual(second.next_cursor, first.next_cursor)
+
+    def test_transfer_invalidates_touched_pages(self):
+        """
+        Тестирование того, что перевод сбрасывает только страницы с
+        затронутыми счетами.
+        """
+        first, _ = self.page()
+        self.page(first.next_cursor)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            distribute_money(self.users[0], [self.users[1]], 500)
+
+        with self.assertNumQueries(0):
+            _, balances = self.page(first.next_cursor)
+        self.assertEqual(balances, {"user3": 10000, "user4": 10000})
+        with self.assertNumQueries(1):
+            _, balances = self.page()
+        self.assertEqual(balances, {"user1": 9500, "user2": 10500})
+
+    def test_no_invalidation_before_commit(self):
+        """
+        Тестирование того, что кэш сбрасывается только после фиксации
+        перевода.
+        """
+        self.page()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            distribute_money(self.users[0], [self.users[1]], 500)
+            with self.assertNumQueries(0):
+                self.page()
+
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        _, balances = self.page()
+        self.assertEqual(balances["user1"], 9500)
+
+    def test_invalidation_during_read(self):
+        """
+        Тестирование того, что страница, во время чтения которой был
+        зафиксирован перевод, не сохраняется в кэш.
+        """
+
+        def paginate_during_transfer(*args):
+            page = keyset_paginate(*args)
+            invalidate_accounts([self.users[3].pk])
+            return page
+
+        with mock.patch("core.caching.keyset_paginate", paginate_during_transfer):
+            users_page(None, 2)
+
+        with self.assertNumQueries(1):
+            users_page(None, 2)
+
+    def test_new_and_renamed_users(self):
+        """
+        Тестирование сброса всего кэша при изменении состава страниц.
+        """
+        self.page()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.create_user(username="user0", inn="000000000099")
+        _, balances = self.page()
+        self.assertEqual(list(balances), ["user0", "user1"])
+
+        self.users[0].username = "user9"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].save()
+        _, balances = self.page()
+        self.assertEqual(list(balances), ["user0", "user2"])
+
+    def test_large_transfer_invalidates_table(self):
+        """
+        Тестирование сброса всего кэша переводом на много счетов.
+        """
+        first, _ = self.page()
+        self.page(first.next_cursor)
+
+        with mock.patch("core.caching.MAX_INVALIDATED_ACCOUNTS", 1):
+            with self.captureOnCommitCallbacks(execute=True):
+                distribute_money(self.users[2], [self.users[3]], 500)
+
+        with self.assertNumQueries(1):
+            _, balances = self.page()
+        self.assertEqual(balances, {"user1": 10000, "user2": 10000})
+
+    def test_evicted_version(self):
+        """
+        Тестирование того, что страница не считается актуальной, если метка
+        версии счета вытеснена из кэша.
+        """
+        self.page()
+        caches[USERS_CACHE].delete(account_key(self.users[0].pk))
+
+        with self.assertNumQueries(1):
+            self.page()
+
+
+@override_settings(USERS_PAGE_SIZE=2)
+class ProcessLocalUsersPageTest(TestCase):
+    """
+    Тестирование списка пользователей с кэшем в памяти процесса: страницы
+    не кэшируются, потому что их сброс не дошел бы до других процессов.
+    """
+
+    def setUp(self):
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", inn=f"{i:012d}", balance=10000
+            )
+            for i in range(1, 3)
+        ]
+
+    def test_page_is_not_cached(self):
+        users_page(None, 2)
+        # Перевод без сброса кэша - как в другом процессе сервера.
+        with mock.patch("core.services.invalidate_accounts_on_commit"):
+            distribute_money(self.users[0], [self.users[1]], 500)
+
+        with self.assertNumQueries(1):
+            page = users_page(None, 2)
+        self.assertEqual([row["balance"] for row in page], [9500, 10500])
+        self.assertFalse(caches[USERS_CACHE].get(GENERATION_KEY))
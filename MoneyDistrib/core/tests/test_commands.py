@@ -0,0 +1,99 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..models import CustomUser, LedgerEntry
+from ..services import OPENING_REASON, adjust_balances, distribute_money
+
+
+class VerifyLedgerCommandTest(TestCase):
+    """
+    Тестирование команды verify_ledger.
+    """
+
+    def setUp(self):
+        self.user1 = CustomUser.objects.create_user(
+            username="user1", password="password", inn="123456789012", balance=10000
+        )
+        self.user2 = CustomUser.objects.create_user(
+            username="user2", password="password", inn="223456789012", balance=0
+        )
+        self.user3 = CustomUser.objects.create_user(
+            username="user3", password="password", inn="223456123412", balance=0
+        )
+        distribute_money(self.user1, [self.user2, self.user3], 6000)
+        distribute_money(self.user2, [self.user1], 1000)
+        adjust_balances([self.user1.pk, self.user3.pk], 250, "Бонус")
+
+    def test_ledger_matches_balances(self):
+        """
+        Тестирование успешной сверки журнала с балансами.
+        """
+        out = StringIO()
+        call_command("verify_ledger", chunk_size=1, stdout=out)
+        self.assertIn("3 счетов", out.getvalue())
+
+    def test_balance_mismatch(self):
+        """
+        Тестирование обнаружения расхождения баланса счета с журналом.
+        """
+        CustomUser.objects.filter(pk=self.user3.pk).update(balance=100)
+
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("verify_ledger", stdout=StringIO(), stderr=err)
+        self.assertIn(f"Счет {self.user3.pk}: баланс 1.00 ", err.getvalue())
+
+    def test_broken_chain(self):
+        """
+        Тестирование обнаружения разрыва цепочки балансов в журнале.
+        """
+        entry = LedgerEntry.objects.filter(
+            account=self.user1, transfer__isnull=False
+        ).latest("id")
+        LedgerEntry.objects.filter(pk=entry.pk).update(amount=500)
+
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("verify_ledger", stdout=StringIO(), stderr=err)
+        self.assertIn("разрыв цепочки", err.getvalue())
+        self.assertIn(f"Перевод {entry.transfer_id}", err.getvalue())
+
+    def test_missing_opening(self):
+        """
+        Тестирование обнаружения цепочки балансов, которая начинается не с
+        нуля: начальный баланс счета не записан в журнал.
+        """
+        LedgerEntry.objects.filter(
+            account=self.user1, adjustment__reason=OPENING_REASON
+        ).delete()
+
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("verify_ledger", stdout=StringIO(), stderr=err)
+        self.assertIn(
+            f"Счет {self.user1.pk}: разрыв цепочки балансов 0.00 + -60.00 != 40.00",
+            err.getvalue(),
+        )
+
+    def test_account_without_entries(self):
+        """
+        Тестирование обнаружения баланса, измененного в обход журнала у
+        счета без проводок.
+        """
+        user = CustomUser.objects.create_user(
+            username="user4", password="password", inn="323456123412"
+        )
+        out = StringIO()
+        call_command("verify_ledger", stdout=out)
+        self.assertIn("сходится", out.getvalue())
+
+        CustomUser.objects.filter(pk=user.pk).update(balance=500)
+
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("verify_ledger", stdout=StringIO(), stderr=err)
+        self.assertIn(
+            f"Счет {user.pk}: баланс 5.00 без проводок в журнале", err.getvalue()
+        )
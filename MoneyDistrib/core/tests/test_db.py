@@ -0,0 +1,35 @@
+import os
+import tempfile
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+
+
+@skipUnless(connection.vendor == "sqlite", "Проверяется настройка SQLite")
+class SqliteConfigurationTest(SimpleTestCase):
+    """
+    Тестирование настройки подключений к SQLite.
+    """
+
+    def test_wal_journal_mode(self):
+        """
+        Тестирование включения журнала WAL и ожидания блокировки при
+        подключении к файлу базы.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper(
+                {
+                    **connection.settings_dict,
+                    "NAME": os.path.join(directory, "db.sqlite3"),
+                }
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone()[0], "wal")
+                    cursor.execute("PRAGMA busy_timeout")
+                    self.assertGreater(cursor.fetchone()[0], 0)
+            finally:
+                wrapper.close()
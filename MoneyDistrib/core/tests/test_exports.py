@@ -0,0 +1,263 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..exports import (
+    balance_chunks,
+    parse_balance_filters,
+    parse_statement_period,
+    statement_chunks,
+)
+from ..models import CustomUser, LedgerEntry
+from ..pagination import keyset_chunks
+from ..services import distribute_money
+from ..shards import reshard_account
+
+
+class ExportTest(TestCase):
+    """
+    Тестирование выгрузки балансов и выписок по счетам.
+    """
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username="admin", password="password", inn="000000000001"
+        )
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", inn=f"77{i:010d}", balance=i * 1000
+            )
+            for i in range(1, 6)
+        ]
+        self.client.force_login(self.admin)
+
+    def balances(self, **filters):
+        return [
+            (row["username"], row["balance"])
+            for chunk in balance_chunks(2, **parse_balance_filters(**filters))
+            for row in chunk
+        ]
+
+    def test_keyset_chunks(self):
+        """
+        Тестирование чтения пачками: каждая пачка - один запрос, строки не
+        теряются и не повторяются.
+        """
+        rows = CustomUser.objects.values("id", "username")
+
+        with self.assertNumQueries(2):
+            chunks = list(keyset_chunks(rows, 4))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [4, 2])
+        self.assertEqual(
+            [row["id"] for chunk in chunks for row in chunk],
+            list(CustomUser.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+    def test_balance_filters(self):
+        self.assertEqual(
+            self.balances(min_balance="20", max_balance="40.00"),
+            [("user2", "20.00"), ("user3", "30.00"), ("user4", "40.00")],
+        )
+        self.assertEqual(
+            self.balances(inn_prefix="7700000000", max_balance="10"),
+            [("user1", "10.00")],
+        )
+        self.assertEqual(len(self.balances()), 6)
+
+    def test_sharded_account_balance(self):
+        """
+        Тестирование того, что баланс счета с сегментами выгружается вместе
+        с сегментами и фильтруется по полному балансу.
+        """
+        reshard_account(self.users[0].pk, 4)
+
+        self.assertEqual(self.balances(min_balance="10"), self.balances()[1:])
+        self.assertEqual(
+            self.balances(max_balance="10"), [("admin", "0.00"), ("user1", "10.00")]
+        )
+
+    def test_invalid_filters(self):
+        for filters in (
+            {"min_balance": "-1"},
+            {"max_balance": "abc"},
+            {"inn_prefix": "77a"},
+            {"inn_prefix": "7" * 13},
+        ):
+            with self.subTest(filters=filters):
+                with self.assertRaises(ValueError):
+                    parse_balance_filters(**filters)
+        with self.assertRaises(ValueError):
+            parse_statement_period(since="2024-13-01")
+
+    def test_statement_period(self):
+        distribute_money(self.users[4], self.users[:2], 1000)
+        distribute_money(self.users[4], [self.users[0]], 500)
+        today = timezone.localdate()
+        LedgerEntry.objects.filter(amount=-500).update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+
+        def amounts(**period):
+            return [
+                (row["amount"], row["balance_after"])
+                for chunk in statement_chunks(
+                    self.users[4].pk, 1, **parse_statement_period(**period)
+                )
+                for row in chunk
+            ]
+
+        self.assertEqual(
+            amounts(), [("-5.00", "35.00"), ("50.00", "50.00"), ("-10.00", "40.00")]
+        )
+        self.assertEqual(
+            amounts(since=today.isoformat()), [("50.00", "50.00"), ("-10.00", "40.00")]
+        )
+        self.assertEqual(
+            amounts(until=(today - timedelta(days=1)).isoformat()),
+            [("-5.00", "35.00")],
+        )
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_export_balances_csv(self):
+        response = self.client.get(
+            reverse("core:export_balances"), {"min_balance": "30", "inn_prefix": "77"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="balances.csv"', response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,inn,username,balance")
+        self.assertEqual(
+            lines[1:],
+            [
+                f"{user.pk},{user.inn},{user.username},{i}0.00"
+                for i, user in enumerate(self.users[2:], 3)
+            ],
+        )
+
+    def test_export_statement_jsonl(self):
+        distribution = distribute_money(self.users[0], [self.users[1]], 400)
+
+        response = self.client.get(
+            reverse("core:export_statement", args=[self.users[1].pk]),
+            {"format": "jsonl"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(
+            (rows[0]["amount"], rows[0]["balance_after"]), ("20.00", "20.00")
+        )
+        self.assertEqual(rows[1]["transfer"], distribution.transfer.pk)
+        self.assertEqual(
+            (rows[1]["amount"], rows[1]["balance_after"]), ("4.00", "24.00")
+        )
+
+    def test_export_under_asgi(self):
+        """
+        Тестирование выгрузки под ASGI: строки отдаются асинхронным
+        итератором.
+        """
+
+        async def fetch():
+            response = await self.async_client.get(
+                reverse("core:export_balances"), {"inn_prefix": "770000000005"}
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_async)
+            return b"".join([part async for part in response.streaming_content])
+
+        self.async_client.force_login(self.admin)
+
+        content = async_to_sync(fetch)()
+
+        self.assertEqual(
+            content.decode().splitlines()[1:],
+            [f"{self.users[4].pk},770000000005,user5,50.00"],
+        )
+
+    def test_export_errors(self):
+        for url, params in (
+            (reverse("core:export_balances"), {"format": "xml"}),
+            (reverse("core:export_balances"), {"min_balance": "x"}),
+            (reverse("core:export_statement", args=[self.users[0].pk]), {"since": "x"}),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("errors", response.json())
+
+        response = self.client.get(reverse("core:export_statement", args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_staff_required(self):
+        self.client.force_login(self.users[0])
+
+        response = self.client.get(reverse("core:export_balances"))
+
+        self.assertEqual(response.status_code, 302)
+
+
+class ExportCommandsTest(TestCase):
+    """
+    Тестирование команд export_balances и export_statement.
+    """
+
+    def setUp(self):
+        self.sender = CustomUser.objects.create_user(
+            username="sender", inn="123456789012", balance=1000
+        )
+        self.acceptor = CustomUser.objects.create_user(
+            username="acceptor", inn="223456789012"
+        )
+        distribute_money(self.sender, [self.acceptor], 250)
+
+    def test_export_balances(self):
+        out = StringIO()
+
+        call_command("export_balances", min_balance="5", chunk_size=1, stdout=out)
+
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            ["id,inn,username,balance", f"{self.sender.pk},123456789012,sender,7.50"],
+        )
+
+    def test_export_statement_to_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "statement.jsonl")
+
+            call_command(
+                "export_statement", "223456789012", format="jsonl", output=path
+            )
+
+            with open(path, encoding="utf-8") as file:
+                rows = [json.loads(line) for line in file]
+        self.assertEqual([row["balance_after"] for row in rows], ["2.50"])
+
+    def test_errors(self):
+        for args, options in (
+            (("export_statement", "999999999999"), {}),
+            (("export_statement", "123456789012"), {"until": "01.01.2024"}),
+            (("export_balances",), {"inn_prefix": "abc"}),
+        ):
+            with self.subTest(args=args, options=options):
+                with self.assertRaises(CommandError):
+                    call_command(*args, stdout=StringIO(), **options)
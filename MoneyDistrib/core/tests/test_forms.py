@@ -11,7 +11,7 @@ class MoneyTransferFormTest(TestCase):
 
     def setUp(self):
         self.user1 = CustomUser.objects.create_user(
-            username="user1", password="password", inn="123456789012", balance=100
+            username="user1", password="password", inn="123456789012", balance=10000
         )
         self.user2 = CustomUser.objects.create_user(
             username="user2", password="password", inn="223456789012", balance=0
@@ -31,7 +31,7 @@ class MoneyTransferFormTest(TestCase):
             {
                 "data": {
                     "sender": self.user1.id,
-                    "amount": self.user1.balance,
+                    "amount": 100,
                     "inn_list": f"{self.user2.inn} {self.user3.inn} {self.user4.inn}",
                 },
                 "expected_result": True,
@@ -39,7 +39,7 @@ class MoneyTransferFormTest(TestCase):
             {
                 "data": {
                     "sender": self.user1.id,
-                    "amount": self.user1.balance,
+                    "amount": 100,
                     "inn_list": f"{self.user2.inn}",
                 },
                 "expected_result": True,
@@ -55,7 +55,7 @@ class MoneyTransferFormTest(TestCase):
             {
                 "data": {
                     "sender": self.user1.id,
-                    "amount": self.user1.balance * 2,
+                    "amount": 200,
                     "inn_list": f"{self.user2.inn} {self.user3.inn}",
                 },
                 "expected_result": False,
@@ -63,7 +63,7 @@ class MoneyTransferFormTest(TestCase):
             {
                 "data": {
                     "sender": self.user1.id,
-                    "amount": self.user1.balance,
+                    "amount": 100,
                     "inn_list": f"{self.user1.inn} {self.user3.inn}",
                 },
                 "expected_result": False,
@@ -79,7 +79,7 @@ class MoneyTransferFormTest(TestCase):
             {
                 "data": {
                     "sender": self.user1.id,
-                    "amount": self.user1.balance,
+                    "amount": 100,
                     "inn_list": f"111111111111 {self.user3.inn}",
                 },
                 "expected_result": False,
@@ -87,7 +87,7 @@ class MoneyTransferFormTest(TestCase):
             {
                 "data": {
                     "sender": self.user1.id,
-                    "amount": self.user1.balance,
+                    "amount": 100,
                     "inn_list": f"111111111111 111111111112",
                 },
                 "expected_result": False,
@@ -95,7 +95,7 @@ class MoneyTransferFormTest(TestCase):
             {
                 "data": {
                     "sender": self.user1.id,
-                    "amount": self.user1.balance,
+                    "amount": 100,
                     "inn_list": f"",
                 },
                 "expected_result": False,
@@ -114,7 +114,7 @@ class MoneyTransferFormTest(TestCase):
         form = MoneyTransferForm(
             data={
                 "sender": self.user1.id,
-                "amount": self.user1.balance,
+                "amount": 100,
                 "inn_list": f"{self.user2.inn} {self.user3.inn} {self.user4.inn}",
             }
         )
@@ -145,7 +145,7 @@ class MoneyTransferFormTest(TestCase):
         form = MoneyTransferForm(
             data={
                 "sender": self.user1.id,
-                "amount": self.user1.balance * 2,
+                "amount": 200,
                 "inn_list": f"{self.user2.inn} {self.user3.inn}",
             }
         )
@@ -155,9 +155,30 @@ class MoneyTransferFormTest(TestCase):
         form = MoneyTransferForm(
             data={
                 "sender": self.user1.id,
-                "amount": self.user1.balance,
+                "amount": 100,
                 "inn_list": f"111111111111 {self.user3.inn}",
             }
         )
         self.assertFalse(form.is_valid())
         self.assertIn("Список ИНН содержит ошибки", form.errors["__all__"])
+
+    def test_render_without_queries(self):
+        """
+        Тестирование того, что отрисовка формы не загружает пользователей.
+        """
+        form = MoneyTransferForm()
+        with self.assertNumQueries(0):
+            html = form.as_table()
+        self.assertNotIn(self.user2.username, html)
+
+    def test_sender_resolved_by_pk(self):
+        """
+        Тестирование того, что отправитель загружается одним запросом по pk
+        и отображается в форме после валидации.
+        """
+        form = MoneyTransferForm(data={"sender": self.user1.id})
+        with self.assertNumQueries(1):
+            self.assertEqual(form.fields["sender"].clean(self.user1.id), self.user1)
+
+        form.is_valid()
+        self.assertIn(str(self.user1), form.as_table())
@@ -0,0 +1,154 @@
+import json
+from datetime import timedelta
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import CustomUser, IdempotencyKey, Transfer
+
+
+class IdempotencyTest(TestCase):
+    """
+    Тестирование ключей идемпотентности переводов.
+    """
+
+    def setUp(self):
+        self.user1 = CustomUser.objects.create_user(
+            username="user1", password="password", inn="123456789012", balance=10000
+        )
+        self.user2 = CustomUser.objects.create_user(
+            username="user2", password="password", inn="223456789012", balance=0
+        )
+
+    def post_api(self, key, amount="60"):
+        return self.client.post(
+            reverse("core:api_transfers"),
+            json.dumps(
+                {
+                    "sender": self.user1.id,
+                    "recipients": [self.user2.inn],
+                    "amount": amount,
+                }
+            ),
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_api_repeat_returns_original_result(self):
+        """
+        Тестирование того, что повтор запроса API с тем же ключом возвращает
+        исходный ответ без повторного перевода.
+        """
+        first = self.post_api("key-1")
+
+        with self.assertNumQueries(1):
+            second = self.post_api("key-1")
+
+        self.assertEqual(first.status_code, HTTPStatus.CREATED)
+        self.assertEqual(second.status_code, HTTPStatus.CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.balance, 4000)
+
+        third = self.post_api("key-2")
+        self.assertEqual(third.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_api_key_reused_with_other_data(self):
+        """
+        Тестирование того, что ключ, использованный для одного перевода, не
+        возвращает его ответ на запрос с другими данными.
+        """
+        first = self.post_api("key-1")
+        same = self.post_api("key-1", amount="60.00")
+        other = self.post_api("key-1", amount="10")
+
+        self.assertEqual(same.json(), first.json())
+        self.assertEqual(other.status_code, HTTPStatus.UNPROCESSABLE_ENTITY)
+        self.assertEqual(
+            other.json()["errors"]["__all__"][0]["message"],
+            "Ключ идемпотентности уже использован для другого запроса",
+        )
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    def test_api_retry_after_conflict(self):
+        """
+        Тестирование того, что ключ перевода API, не выполненного из-за
+        нехватки средств (409), не сохраняется: повтор выполняет перевод.
+        """
+        error = ValidationError("У отправителя недостаточно средств.")
+        with mock.patch("core.views.distribute_money", side_effect=error):
+            first = self.post_api("key-1")
+
+        self.assertEqual(first.status_code, HTTPStatus.CONFLICT)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        second = self.post_api("key-1")
+
+        self.assertEqual(second.status_code, HTTPStatus.CREATED)
+        self.assertNotIn("Idempotent-Replayed", second.headers)
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    def test_form_repeat_is_not_executed(self):
+        """
+        Тестирование того, что повторная отправка формы с тем же ключом не
+        выполняет перевод повторно.
+        """
+        data = {
+            "sender": self.user1.id,
+            "amount": 60,
+            "inn_list": self.user2.inn,
+            "idempotency_key": "form-key",
+        }
+
+        first = self.client.post(reverse("core:index"), data)
+        second = self.client.post(reverse("core:index"), data)
+
+        self.assertEqual(first.status_code, HTTPStatus.FOUND)
+        self.assertEqual(second.status_code, HTTPStatus.FOUND)
+        self.assertEqual(second["Location"], first["Location"])
+        self.assertEqual(Transfer.objects.count(), 1)
+
+        third = self.client.post(reverse("core:index"), {**data, "amount": 10})
+
+        self.assertEqual(third.status_code, HTTPStatus.FOUND)
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.balance, 4000)
+
+    def test_failed_request_is_not_stored(self):
+        """
+        Тестирование того, что неудачный перевод из формы не сохраняет ключ.
+        """
+        data = {
+            "sender": self.user1.id,
+            "amount": 200,
+            "inn_list": self.user2.inn,
+            "idempotency_key": "form-key",
+        }
+
+        self.client.post(reverse("core:index"), data)
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge_command(self):
+        """
+        Тестирование удаления устаревших ключей.
+        """
+        IdempotencyKey.objects.create(key="fresh", status_code=201)
+        IdempotencyKey.objects.create(
+            key="old", status_code=201, created_at=timezone.now() - timedelta(days=2)
+        )
+
+        call_command("purge_idempotency_keys", ttl=24 * 60 * 60, stdout=StringIO())
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list("key", flat=True)), ["fresh"]
+        )
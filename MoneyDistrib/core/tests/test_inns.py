@@ -0,0 +1,232 @@
+import tempfile
+from io import StringIO
+
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..caching import USERS_CACHE
+from ..inns import (
+    INN_GENERATION_KEY,
+    account_ids_by_inn,
+    inn_cache,
+    invalidate_inns,
+    parse_inn_list,
+    resolve_inns,
+)
+from ..models import CustomUser
+
+
+class ResolveInnsTest(TestCase):
+    """
+    Тестирование разбора и загрузки получателей по списку ИНН.
+    """
+
+    def setUp(self):
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f"user{i}", inn=f"{i:012d}") for i in range(1, 21)
+        )
+
+    def test_parse_inn_list(self):
+        """
+        Тестирование разбора строки с разными разделителями.
+        """
+        self.assertEqual(
+            parse_inn_list(" 1111111111,2222222222 ,\n3333333333  "),
+            ["1111111111", "2222222222", "3333333333"],
+        )
+
+    def test_resolve_inns(self):
+        """
+        Тестирование загрузки пользователей в порядке следования ИНН.
+        """
+        inns = [f"{i:012d}" for i in (5, 1, 3)]
+
+        users = resolve_inns(inns)
+
+        self.assertIsInstance(users, list)
+        self.assertEqual([user.inn for user in users], inns)
+
+    def test_resolve_inns_in_chunks(self):
+        """
+        Тестирование загрузки пользователей пачками запросов inn__in.
+        """
+        inns = [f"{i:012d}" for i in range(1, 21)]
+
+        with self.assertNumQueries(3):
+            users = resolve_inns(inns, chunk_size=8)
+
+        self.assertEqual(len(users), 20)
+
+    def test_all_errors_reported(self):
+        """
+        Тестирование того, что все ошибки в списке ИНН возвращаются сразу.
+        """
+        inns = ["abc", f"{1:012d}", f"{1:012d}", "999999999999", "123"]
+
+        with self.assertRaises(ValidationError) as context:
+            resolve_inns(inns)
+
+        self.assertEqual(
+            context.exception.messages,
+            [
+                "Некорректный ИНН: abc",
+                "Некорректный ИНН: 123",
+                f"В списке ИНН встречаются дубликаты: {1:012d}",
+                "Пользователь с ИНН 999999999999 не найден",
+            ],
+        )
+
+
+class InnCacheTest(TransactionTestCase):
+    """
+    Тестирование кэша соответствий ИНН и счетов и его сброса после
+    изменения пользователей. Кэш используется только вне транзакций,
+    поэтому тест не оборачивается в транзакцию, и только с общим для
+    процессов кэшем, поэтому кэш users хранится в файлах.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.TemporaryDirectory()
+        cls.cache_settings = override_settings(
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                USERS_CACHE: {
+                    "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                    "LOCATION": cls.cache_dir.name,
+                },
+            }
+        )
+        cls.cache_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.cache_settings.disable()
+        cls.cache_dir.cleanup()
+
+    def setUp(self):
+        invalidate_inns()
+        self.users = [
+            CustomUser.objects.create_user(username=f"user{i}", inn=f"{i:012d}")
+            for i in range(1, 6)
+        ]
+        self.inns = [user.inn for user in self.users]
+
+    def tearDown(self):
+        invalidate_inns()
+
+    def test_cached_resolution(self):
+        """
+        Тестирование того, что повторный список получателей не обращается
+        к базе.
+        """
+        with self.assertNumQueries(1):
+            resolve_inns(self.inns[:3])
+
+        with self.assertNumQueries(0):
+            users = resolve_inns(self.inns[:3])
+        with self.assertNumQueries(1):
+            resolve_inns(self.inns)
+
+        self.assertEqual([user.pk for user in users], [u.pk for u in self.users[:3]])
+        self.assertEqual([user.inn for user in users], self.inns[:3])
+
+    def test_missing_inn_not_cached(self):
+        with self.assertRaises(ValidationError):
+            resolve_inns(["999999999999"])
+
+        user = CustomUser.objects.create_user(username="new", inn="999999999999")
+
+        self.assertEqual(resolve_inns(["999999999999"]), [user])
+
+    def test_invalidate_on_inn_change(self):
+        account_ids_by_inn(self.inns)
+
+        self.users[0].inn = "999999999999"
+        self.users[0].save()
+
+        self.assertEqual(
+            account_ids_by_inn([self.inns[0], "999999999999"]),
+            {"999999999999": self.users[0].pk},
+        )
+
+    def test_invalidate_on_delete(self):
+        account_ids_by_inn(self.inns)
+
+        self.users[0].delete()
+
+        self.assertNotIn(self.inns[0], account_ids_by_inn(self.inns))
+
+    def test_balance_change_keeps_cache(self):
+        account_ids_by_inn(self.inns)
+
+        CustomUser.objects.filter(pk=self.users[0].pk).update(balance=100)
+        self.users[1].balance = 100
+        self.users[1].save(update_fields=["balance"])
+
+        with self.assertNumQueries(0):
+            account_ids_by_inn(self.inns)
+
+    def test_shared_cache(self):
+        """
+        Тестирование общего кэша: другой процесс находит счета без запросов
+        к базе и сбрасывает кэш процесса после смены метки поколения.
+        """
+        account_ids_by_inn(self.inns)
+        inn_cache.entries.clear()
+
+        with self.assertNumQueries(0):
+            account_ids = account_ids_by_inn(self.inns)
+        self.assertEqual(len(account_ids), 5)
+
+        caches[USERS_CACHE].set(INN_GENERATION_KEY, "other", timeout=None)
+
+        with self.assertNumQueries(1):
+            account_ids_by_inn(self.inns)
+
+    @override_settings(INN_CACHE_SIZE=2)
+    def test_lru_eviction(self):
+        account_ids_by_inn(self.inns[:3])
+        account_ids_by_inn(self.inns[1:2])
+
+        self.assertEqual(list(inn_cache.entries), [self.inns[2], self.inns[1]])
+
+    def test_process_local_cache(self):
+        """
+        Тестирование того, что без общего для процессов кэша ИНН всегда
+        ищутся в базе: изменение ИНН в другом процессе не сбросило бы кэш
+        этого процесса.
+        """
+        for alias in ("", "default"):
+            with self.subTest(alias=alias), override_settings(INN_CACHE_ALIAS=alias):
+                account_ids_by_inn(self.inns[:1])
+                # Изменение в другом процессе: сигналы здесь не отправляются.
+                CustomUser.objects.filter(pk=self.users[0].pk).update(
+                    inn="999999999999"
+                )
+                CustomUser.objects.filter(pk=self.users[1].pk).update(inn=self.inns[0])
+
+                with self.assertNumQueries(1):
+                    account_ids = account_ids_by_inn(self.inns[:1])
+
+                self.assertEqual(account_ids, {self.inns[0]: self.users[1].pk})
+                CustomUser.objects.filter(pk=self.users[1].pk).update(inn=self.inns[1])
+                CustomUser.objects.filter(pk=self.users[0].pk).update(inn=self.inns[0])
+
+    def test_warm_requires_shared_cache(self):
+        with override_settings(INN_CACHE_ALIAS="default"):
+            with self.assertRaises(CommandError):
+                call_command("warm_inn_cache", stdout=StringIO())
+
+    def test_warm_inn_cache(self):
+        out = StringIO()
+
+        call_command("warm_inn_cache", chunk_size=2, stdout=out)
+
+        self.assertIn("В кэш ИНН загружено: 5", out.getvalue())
+        with self.assertNumQueries(0):
+            account_ids_by_inn(self.inns)
@@ -0,0 +1,162 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..jobs import claim_job, run_job, submit_distribution
+from ..models import CustomUser, DistributionJob, Transfer
+
+
+class DistributionJobTest(TestCase):
+    """
+    Тестирование фонового выполнения распределений.
+    """
+
+    def setUp(self):
+        self.sender = CustomUser.objects.create_user(
+            username="sender", password="password", inn="100000000000", balance=10000
+        )
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f"user{i}", inn=f"{i:012d}") for i in range(1, 6)
+        )
+        self.acceptors = list(CustomUser.objects.exclude(pk=self.sender.pk))
+
+    def assert_balances(self, sender_balance, acceptor_balance):
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, sender_balance)
+        for acceptor in self.acceptors:
+            acceptor.refresh_from_db()
+            self.assertEqual(acceptor.balance, acceptor_balance)
+
+    def test_run_job_in_batches(self):
+        """
+        Тестирование выполнения задания пачками с отслеживанием прогресса.
+        """
+        job = submit_distribution(self.sender, self.acceptors, 5000)
+        self.assertEqual((job.status, job.processed, job.total), ("pending", 0, 5))
+
+        job = claim_job()
+        self.assertEqual(job.status, DistributionJob.Status.RUNNING)
+        self.assertIsNone(claim_job())
+
+        run_job(job, batch_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("done", 5))
+        self.assertEqual(Transfer.objects.count(), 3)
+        self.assert_balances(5000, 1000)
+
+    def test_retry_resumes_from_progress(self):
+        """
+        Тестирование того, что повторный запуск задания не переводит уже
+        обработанные пачки еще раз.
+        """
+        job = submit_distribution(self.sender, self.acceptors, 5000)
+        claim_job()
+        run_job(job, batch_size=5)
+
+        stale = DistributionJob.objects.get(pk=job.pk)
+        stale.processed = 0
+        run_job(stale, batch_size=5)
+        DistributionJob.objects.filter(pk=job.pk).update(
+            status=DistributionJob.Status.RUNNING,
+            updated_at=timezone.now() - timedelta(hours=1),
+        )
+        run_job(claim_job(timedelta(minutes=5)), batch_size=5)
+
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.assert_balances(5000, 1000)
+
+    def test_insufficient_funds(self):
+        """
+        Тестирование перевода задания в статус ошибки при недостатке средств.
+        """
+        job = submit_distribution(self.sender, self.acceptors, 5000)
+        CustomUser.objects.filter(pk=self.sender.pk).update(balance=3000)
+
+        run_job(claim_job(), batch_size=2)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("failed", 2))
+        self.assertEqual(job.error, "У отправителя недостаточно средств.")
+
+    def test_worker_command(self):
+        """
+        Тестирование выполнения очереди командой run_distribution_worker.
+        """
+        submit_distribution(self.sender, self.acceptors, 5000)
+        submit_distribution(self.sender, self.acceptors[:1], 1000)
+
+        call_command("run_distribution_worker", once=True, stdout=StringIO())
+
+        self.assertFalse(
+            DistributionJob.objects.exclude(status=DistributionJob.Status.DONE).exists()
+        )
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, 4000)
+
+    def test_deleted_recipient(self):
+        """
+        Тестирование задания, получатель которого удален после постановки
+        в очередь: задание завершается ошибкой, а обработчик продолжает
+        работу со следующими заданиями.
+        """
+        job = submit_distribution(self.sender, self.acceptors, 5000)
+        submit_distribution(self.sender, self.acceptors[:1], 1000)
+        deleted = self.acceptors.pop()
+        deleted_pk = deleted.pk
+        deleted.delete()
+
+        call_command("run_distribution_worker", once=True, stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), ("failed", 0))
+        self.assertEqual(job.error, f"Счета не найдены: {deleted_pk}")
+        self.assertEqual(
+            DistributionJob.objects.exclude(pk=job.pk).get().status, "done"
+        )
+        self.assertFalse(Transfer.objects.filter(amount=5000).exists())
+
+    def test_worker_survives_unexpected_error(self):
+        submit_distribution(self.sender, self.acceptors, 5000)
+        submit_distribution(self.sender, self.acceptors[:1], 1000)
+
+        with mock.patch("core.jobs.settle", side_effect=[RuntimeError("boom"), None]):
+            with self.assertLogs("core.management.commands.run_distribution_worker"):
+                call_command("run_distribution_worker", once=True, stdout=StringIO())
+
+        self.assertEqual(
+            list(DistributionJob.objects.order_by("pk").values_list("status", "error")),
+            [("failed", "Непредвиденная ошибка: RuntimeError('boom')"), ("done", "")],
+        )
+
+    def test_resume_after_funding(self):
+        """
+        Тестирование возобновления задания, остановленного недостатком
+        средств: после пополнения счета переводятся только оставшиеся
+        пачки, и каждый получатель получает деньги один раз.
+        """
+        job = submit_distribution(self.sender, self.acceptors, 5000)
+        CustomUser.objects.filter(pk=self.sender.pk).update(balance=3000)
+        run_job(claim_job(), batch_size=2)
+        CustomUser.objects.filter(pk=self.sender.pk).update(balance=3000)
+        url = reverse("core:api_job_resume", args=[job.pk])
+
+        response = self.client.post(url)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["status"], "pending")
+        call_command("run_distribution_worker", once=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.error), ("done", 5, ""))
+        self.assert_balances(0, 1000)
+        self.assertEqual(self.client.post(url).status_code, 409)
+
+    def test_resume_unknown_job(self):
+        response = self.client.post(reverse("core:api_job_resume", args=[0]))
+
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,134 @@
+from http import HTTPStatus
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from ..caching import USERS_CACHE
+from ..metrics import Registry, RequestTimings, collect_timings, timed
+from ..models import CustomUser
+
+
+def server_timing(response):
+    """
+    Возвращает словарь этап -> длительность из заголовка Server-Timing.
+    """
+    phases = {}
+    for entry in response["Server-Timing"].split(", "):
+        name, duration = entry.split(";")[:2]
+        phases[name] = float(duration.split("=")[1])
+    return phases
+
+
+class RequestTimingsTest(SimpleTestCase):
+    """
+    Тестирование замеров этапов и формата метрик.
+    """
+
+    def test_timed(self):
+        """
+        Тестирование того, что timed() записывает этапы только внутри
+        collect_timings().
+        """
+        with timed("settle"):
+            pass
+
+        with collect_timings() as timings:
+            with timed("settle"):
+                pass
+            with timed("settle"):
+                pass
+        self.assertEqual(list(timings.phases), ["settle"])
+
+    def test_expose(self):
+        """
+        Тестирование текстового формата Prometheus.
+        """
+        registry = Registry()
+        timings = RequestTimings()
+        timings.queries = 3
+        timings.add("render", 0.02)
+        registry.record("core:index", "GET", 200, timings, 0.03)
+        registry.record("core:index", "GET", 200, timings, 20)
+
+        lines = registry.expose().splitlines()
+
+        self.assertIn(
+            'moneydistrib_requests_total{view="core:index",method="GET",status="200"} 2',
+            lines,
+        )
+        self.assertIn(
+            'moneydistrib_request_duration_seconds_bucket{view="core:index",le="0.05"} 1',
+            lines,
+        )
+        self.assertIn(
+            'moneydistrib_request_duration_seconds_bucket{view="core:index",le="+Inf"} 2',
+            lines,
+        )
+        self.assertIn(
+            'moneydistrib_request_phase_seconds_count{view="core:index",phase="render"} 2',
+            lines,
+        )
+        self.assertIn(
+            'moneydistrib_request_queries_bucket{view="core:index",le="5"} 2', lines
+        )
+
+
+class RequestMetricsMiddlewareTest(TestCase):
+    """
+    Тестирование заголовка Server-Timing и страницы метрик.
+    """
+
+    def setUp(self):
+        caches[USERS_CACHE].clear()
+        self.sender = CustomUser.objects.create_user(
+            username="sender", inn="123456789012", balance=10000
+        )
+        self.recipient = CustomUser.objects.create_user(
+            username="recipient", inn="223456789012"
+        )
+        self.url = reverse("core:index")
+
+    def test_server_timing(self):
+        """
+        Тестирование этапов в заголовке Server-Timing.
+        """
+        phases = server_timing(self.client.get(self.url))
+        self.assertEqual(list(phases), ["db", "validation", "render", "total"])
+
+        response = self.client.post(
+            self.url,
+            {"sender": self.sender.pk, "inn_list": "223456789012", "amount": "10"},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        phases = server_timing(response)
+        self.assertEqual(
+            list(phases), ["db", "inn_lookup", "validation", "settle", "total"]
+        )
+        self.assertLessEqual(phases["settle"], phases["total"])
+        self.assertIn("queries", response["Server-Timing"])
+
+    def test_metrics(self):
+        """
+        Тестирование страницы метрик Prometheus.
+        """
+        self.client.get(self.url)
+        self.client.get("/missing/")
+
+        response = self.client.get(reverse("core:metrics"))
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        content = response.content.decode()
+        self.assertIn('view="core:index",method="GET",status="200"', content)
+        self.assertIn('view="unmatched",method="GET",status="404"', content)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        """
+        Тестирование доступа к метрикам по токену.
+        """
+        url = reverse("core:metrics")
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, HTTPStatus.OK)
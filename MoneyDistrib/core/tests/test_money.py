@@ -0,0 +1,43 @@
+import random
+from decimal import Decimal
+
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from ..money import Money, from_cents, to_cents
+
+
+class MoneyTest(SimpleTestCase):
+    """
+    Тестирование денежного типа Money и перевода сумм в копейки.
+    """
+
+    def test_cents_conversion(self):
+        """
+        Тестирование перевода сумм в копейки и обратно.
+        """
+        rng = random.Random(20231018)
+        for _ in range(500):
+            cents = rng.randint(0, 10**12)
+            self.assertEqual(to_cents(from_cents(cents)), cents)
+        self.assertEqual(to_cents(Decimal("33.33")), 3333)
+        self.assertEqual(from_cents(3334), Decimal("33.34"))
+
+    def test_money(self):
+        """
+        Тестирование отображения и арифметики Money.
+        """
+        self.assertEqual(str(Money(3334)), "33.34")
+        self.assertEqual(str(Money(5)), "0.05")
+        self.assertEqual(str(Money(-105)), "-1.05")
+        self.assertEqual(Money.from_decimal(Decimal("12.5")), Money(1250))
+        self.assertEqual(Money(1250).amount, Decimal("12.50"))
+        self.assertEqual(Money(100) + Money(1) - Money(50), Money(51))
+        self.assertLess(Money(1), Money(2))
+
+    def test_money_filter(self):
+        """
+        Тестирование шаблонного фильтра money.
+        """
+        template = Template("{% load money %}{{ value|money }}")
+        self.assertEqual(template.render(Context({"value": 123456})), "1234.56")
@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from ..models import CustomUser
+from ..pagination import decode_cursor, encode_cursor, keyset_paginate
+
+
+class KeysetPaginateTest(TestCase):
+    """
+    Тестирование постраничной навигации по ключу (username, id).
+    """
+
+    def setUp(self):
+        for i in range(7):
+            CustomUser.objects.create_user(
+                username=f"user{i}", password="password", inn=f"{i + 1:012d}"
+            )
+        self.queryset = CustomUser.objects.values("id", "username")
+
+    def test_pages(self):
+        """
+        Тестирование обхода всех страниц по курсорам.
+        """
+        usernames = []
+        cursor = None
+        pages = 0
+        while True:
+            page = keyset_paginate(self.queryset, cursor, 3)
+            usernames.extend(row["username"] for row in page)
+            pages += 1
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(usernames, [f"user{i}" for i in range(7)])
+
+    def test_constant_query(self):
+        """
+        Тестирование того, что страница загружается одним запросом.
+        """
+        cursor = encode_cursor("user4", CustomUser.objects.get(username="user4").id)
+        with self.assertNumQueries(1):
+            page = keyset_paginate(self.queryset, cursor, 3)
+        self.assertEqual([row["username"] for row in page], ["user5", "user6"])
+        self.assertFalse(page.has_next)
+
+    def test_invalid_cursor(self):
+        """
+        Тестирование того, что поврежденный курсор открывает первую страницу.
+        """
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+        page = keyset_paginate(self.queryset, "not-a-cursor", 3)
+        self.assertEqual(page.rows[0]["username"], "user0")
@@ -0,0 +1,229 @@
+import json
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..caching import USERS_CACHE
+from ..forms import MoneyTransferForm
+from ..models import CustomUser
+from ..services import distribute_money
+from .utils import QueryBudgetMixin
+
+RECIPIENT_COUNTS = (1, 10, 1000)
+
+BATCH_SIZES = (1, 10, 100)
+
+# Число получателей в каждом распределении пакета.
+BATCH_RECIPIENTS = 10
+
+# Наибольшее число запросов в каждом сценарии для каждой базы: число
+# получателей (для пакета - распределений) -> бюджет. Бюджеты заданы явно,
+# а не выводятся из размеров пачек реализации, поэтому лишний запрос, в том
+# числе на каждую пачку, не проходит тест. SQLite ограничивает число
+# параметров запроса и делит bulk_create на пачки, поэтому на 1000
+# получателей запросов больше, чем на PostgreSQL.
+QUERY_BUDGETS = {
+    "sqlite": {
+        "validation": {1: 2, 10: 2, 1000: 3},
+        "settle": {1: 12, 10: 12, 1000: 27},
+        "settle_shares": {1: 12, 10: 12, 1000: 29},
+        "index_post": {1: 20, 10: 20, 1000: 36},
+        "index_post_errors": {1: 3, 10: 3, 1000: 4},
+        "api": {1: 14, 10: 14, 1000: 30},
+        "batch": {1: 16, 10: 16, 100: 33},
+    },
+    "postgresql": {
+        "validation": {1: 2, 10: 2, 1000: 3},
+        "settle": {1: 12, 10: 12, 1000: 15},
+        "settle_shares": {1: 12, 10: 12, 1000: 17},
+        "index_post": {1: 20, 10: 20, 1000: 24},
+        "index_post_errors": {1: 3, 10: 3, 1000: 4},
+        "api": {1: 14, 10: 14, 1000: 18},
+        "batch": {1: 16, 10: 16, 100: 21},
+    },
+}
+
+# Во сколько раз число запросов на наибольшем размере может превышать
+# число запросов на 10 получателях (распределениях).
+MAX_QUERY_GROWTH = 3
+
+# Запрос страницы списка пользователей на главной странице.
+USERS_PAGE_QUERIES = 1
+
+
+class TransferQueryBudgetTest(QueryBudgetMixin, TestCase):
+    """
+    Тестирование верхних границ числа запросов к базе на пути перевода:
+    проверки формы, перевода и отрисовки главной страницы для 1, 10 и 1000
+    получателей (см. QUERY_BUDGETS). Кроме того, число запросов на 1000
+    получателей не должно превышать число запросов на 10 больше чем в
+    MAX_QUERY_GROWTH раз, поэтому запрос на каждого получателя (N+1) не
+    проходит тест и с завышенным бюджетом.
+    """
+
+    amount = 1_000_000
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = CustomUser.objects.create_user(
+            username="sender", inn="100000000000", balance=10**12
+        )
+        cls.recipients = CustomUser.objects.bulk_create(
+            CustomUser(username=f"user{i:04d}", inn=f"{200000000000 + i}")
+            for i in range(max(RECIPIENT_COUNTS))
+        )
+
+    def setUp(self):
+        caches[USERS_CACHE].clear()
+        self.query_counts = {}
+
+    @contextmanager
+    def assertQueryBudget(self, scenario, count, label):
+        """
+        Проверяет, что блок выполняет не больше запросов, чем бюджет
+        сценария scenario для размера count на текущей базе, и запоминает
+        их число для assertQueryGrowth.
+        """
+        budget = QUERY_BUDGETS[connection.vendor][scenario][count]
+        with self.assertMaxQueries(budget, label) as captured:
+            yield captured
+        self.query_counts.setdefault(scenario, {})[count] = len(captured)
+
+    def assertQueryGrowth(self, scenario):
+        """
+        Проверяет, что число запросов сценария scenario на наибольшем размере
+        не больше чем в MAX_QUERY_GROWTH раз превышает число запросов на 10.
+        """
+        counts = self.query_counts[scenario]
+        self.assertLessEqual(
+            counts[max(counts)],
+            MAX_QUERY_GROWTH * counts[10],
+            f"{scenario}: число запросов по размерам {counts}",
+        )
+
+    def form_data(self, count, **extra):
+        return {
+            "sender": self.sender.pk,
+            "inn_list": " ".join(user.inn for user in self.recipients[:count]),
+            "amount": "10000.00",
+            **extra,
+        }
+
+    def test_form_validation(self):
+        """
+        Тестирование запросов проверки MoneyTransferForm.
+        """
+        for count in RECIPIENT_COUNTS:
+            with self.subTest(count=count):
+                form = MoneyTransferForm(self.form_data(count))
+                with self.assertQueryBudget("validation", count, "Проверка"):
+                    self.assertTrue(form.is_valid())
+        self.assertQueryGrowth("validation")
+
+    def test_distribute_money(self):
+        """
+        Тестирование запросов перевода поровну и пропорционально долям,
+        когда суммы получателей различны.
+        """
+        for count in RECIPIENT_COUNTS:
+            recipients = self.recipients[:count]
+            shares = list(range(1, count + 1))
+            for scenario, kwargs in (
+                ("settle", {}),
+                ("settle_shares", {"shares": shares}),
+            ):
+                with self.subTest(count=count, shares=bool(kwargs)):
+                    with self.assertQueryBudget(scenario, count, "Перевод"):
+                        distribute_money(self.sender, recipients, self.amount, **kwargs)
+        self.assertQueryGrowth("settle")
+        self.assertQueryGrowth("settle_shares")
+
+    def test_index_post(self):
+        """
+        Тестирование запросов перевода через форму главной страницы.
+        """
+        url = reverse("core:index")
+        for count in RECIPIENT_COUNTS:
+            with self.subTest(count=count):
+                data = self.form_data(count, idempotency_key=uuid.uuid4().hex)
+                with self.assertQueryBudget("index_post", count, "Перевод через форму"):
+                    response = self.client.post(url, data)
+                self.assertEqual(response.status_code, 302)
+        self.assertQueryGrowth("index_post")
+
+    def test_index_post_errors(self):
+        """
+        Тестирование запросов повторной отрисовки формы с ошибками.
+        """
+        url = reverse("core:index")
+        for count in RECIPIENT_COUNTS:
+            with self.subTest(count=count):
+                data = self.form_data(count, amount="100000000000")
+                with self.assertQueryBudget(
+                    "index_post_errors", count, "Форма с ошибками"
+                ):
+                    response = self.client.post(url, data)
+                self.assertContains(response, "недостаточно средств")
+        self.assertQueryGrowth("index_post_errors")
+
+    @override_settings(USERS_PAGE_SIZE=1000)
+    def test_index_render(self):
+        """
+        Тестирование того, что отрисовка главной страницы выполняет один
+        запрос независимо от размера страницы пользователей.
+        """
+        with self.assertMaxQueries(USERS_PAGE_QUERIES, "Главная страница"):
+            response = self.client.get(reverse("core:index"))
+        self.assertEqual(len(response.context["users"]), 1000)
+
+    def test_api_transfers(self):
+        """
+        Тестирование запросов перевода через JSON API.
+        """
+        url = reverse("core:api_transfers")
+        for count in RECIPIENT_COUNTS:
+            with self.subTest(count=count):
+                payload = {
+                    "sender": self.sender.pk,
+                    "recipients": [user.inn for user in self.recipients[:count]],
+                    "amount": "10000.00",
+                }
+                with self.assertQueryBudget("api", count, "Перевод через API"):
+                    response = self.client.post(
+                        url, json.dumps(payload), content_type="application/json"
+                    )
+                self.assertEqual(response.status_code, 201)
+        self.assertQueryGrowth("api")
+
+    def test_api_transfer_batch(self):
+        """
+        Тестирование того, что пакет распределений проверяется и выполняется
+        почти постоянным числом запросов независимо от числа распределений.
+        """
+        url = reverse("core:api_transfer_batch")
+        for count in BATCH_SIZES:
+            with self.subTest(count=count):
+                groups = [
+                    self.recipients[i : i + BATCH_RECIPIENTS]
+                    for i in range(0, count * BATCH_RECIPIENTS, BATCH_RECIPIENTS)
+                ]
+                payload = {
+                    "distributions": [
+                        {
+                            "sender": self.sender.pk,
+                            "recipients": [user.inn for user in group],
+                            "amount": "100.00",
+                        }
+                        for group in groups
+                    ]
+                }
+                with self.assertQueryBudget("batch", count, "Пакет распределений"):
+                    response = self.client.post(
+                        url, json.dumps(payload), content_type="application/json"
+                    )
+                self.assertEqual(response.status_code, 201)
+        self.assertQueryGrowth("batch")
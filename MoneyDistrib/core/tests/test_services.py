@@ -0,0 +1,267 @@
+import random
+import threading
+
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+
+from ..models import BalanceAdjustment, CustomUser, LedgerEntry, Transfer
+from ..services import OPENING_REASON, adjust_balances, distribute_money
+from ..stats import get_balance_summary
+
+
+class DistributeMoneyTest(TestCase):
+    """
+    Тестирование сервиса distribute_money.
+    """
+
+    def setUp(self):
+        self.sender = CustomUser.objects.create_user(
+            username="sender", password="password", inn="123456789012", balance=10000
+        )
+
+    def create_acceptors(self, count):
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f"acceptor{i}", inn=f"{i:012d}") for i in range(count)
+        )
+        return list(CustomUser.objects.exclude(pk=self.sender.pk))
+
+    def test_distribute_money(self):
+        """
+        Тестирование распределения суммы между получателями.
+        """
+        acceptors = self.create_acceptors(3)
+
+        distribution = distribute_money(self.sender, acceptors, 10000)
+
+        expected = [3334, 3333, 3333]
+        self.assertEqual(distribution.sender_balance, 0)
+        self.assertEqual(distribution.credits, list(zip(acceptors, expected)))
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, 0)
+        for acceptor, amount in zip(acceptors, expected):
+            acceptor.refresh_from_db()
+            self.assertEqual(acceptor.balance, amount)
+
+    def test_distribute_money_by_shares(self):
+        """
+        Тестирование распределения суммы пропорционально долям.
+        """
+        acceptors = self.create_acceptors(3)
+
+        distribution = distribute_money(
+            self.sender, acceptors, 1000, shares=[1, 1, 1]
+        )
+        self.assertEqual(
+            [amount for _, amount in distribution.credits],
+            [334, 333, 333],
+        )
+
+        distribution = distribute_money(
+            self.sender, acceptors, 1000, shares=[5, 3, 0]
+        )
+        self.assertEqual(
+            [amount for _, amount in distribution.credits],
+            [625, 375, 0],
+        )
+
+    def test_shares_count_mismatch(self):
+        """
+        Тестирование того, что число долей должно совпадать с числом
+        получателей.
+        """
+        acceptors = self.create_acceptors(3)
+
+        for shares in ([1, 1], [1, 1, 1, 1]):
+            with self.subTest(shares=shares):
+                with self.assertRaisesMessage(ValueError, "Число долей"):
+                    distribute_money(self.sender, acceptors, 1000, shares=shares)
+
+        self.assertFalse(Transfer.objects.exists())
+
+    def test_ledger_entries(self):
+        """
+        Тестирование записи перевода и проводок с балансами после проводки.
+        """
+        acceptors = self.create_acceptors(2)
+        acceptors[0].balance = 1000
+        acceptors[0].save()
+
+        distribute_money(self.sender, acceptors, 5000)
+
+        transfer = Transfer.objects.get()
+        self.assertEqual(transfer.sender, self.sender)
+        self.assertEqual(transfer.amount, 5000)
+        self.assertEqual(
+            set(transfer.entries.values_list("account_id", "amount", "balance_after")),
+            {
+                (self.sender.pk, -5000, 5000),
+                (acceptors[0].pk, 2500, 3500),
+                (acceptors[1].pk, 2500, 2500),
+            },
+        )
+        self.assertEqual(
+            LedgerEntry.objects.balance_at(self.sender, transfer.created_at),
+            5000,
+        )
+
+    def test_insufficient_funds(self):
+        """
+        Тестирование отказа в переводе при недостатке средств.
+        """
+        acceptors = self.create_acceptors(2)
+
+        with self.assertRaises(ValidationError):
+            distribute_money(self.sender, acceptors, 20000)
+
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, 10000)
+        for acceptor in acceptors:
+            acceptor.refresh_from_db()
+            self.assertEqual(acceptor.balance, 0)
+        self.assertFalse(Transfer.objects.exists())
+        self.assertFalse(
+            LedgerEntry.objects.exclude(adjustment__reason=OPENING_REASON).exists()
+        )
+
+    def test_constant_number_of_queries(self):
+        """
+        Тестирование того, что число запросов не зависит от числа получателей.
+        """
+        for count in (1, 10, 100):
+            with self.subTest(count=count):
+                LedgerEntry.objects.all().delete()
+                Transfer.objects.all().delete()
+                CustomUser.objects.exclude(pk=self.sender.pk).delete()
+                acceptors = self.create_acceptors(count)
+                with self.assertNumQueries(12):
+                    distribute_money(self.sender, acceptors, count)
+
+
+class AdjustBalancesTest(TestCase):
+    """
+    Тестирование корректировки балансов администратором.
+    """
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username="admin", password="password", inn="000000000001"
+        )
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", inn=f"{i + 1:012d}", balance=i * 1000
+            )
+            for i in range(1, 4)
+        ]
+        self.ids = [user.pk for user in self.users]
+
+    def balances(self):
+        return list(
+            CustomUser.objects.filter(pk__in=self.ids)
+            .order_by("pk")
+            .values_list("balance", flat=True)
+        )
+
+    def test_credit(self):
+        """
+        Тестирование зачисления суммы на выбранные счета с записью в журнал.
+        """
+        adjustment = adjust_balances(self.ids, 500, "Бонус", author=self.admin)
+
+        self.assertEqual(self.balances(), [1500, 2500, 3500])
+        self.assertEqual((adjustment.amount, adjustment.accounts), (500, 3))
+        self.assertEqual(adjustment.author, self.admin)
+        self.assertEqual(
+            list(
+                adjustment.entries.order_by("account_id").values_list(
+                    "account_id", "amount", "balance_after"
+                )
+            ),
+            [(pk, 500, balance) for pk, balance in zip(self.ids, self.balances())],
+        )
+        self.assertEqual(get_balance_summary().total_balance, 7500)
+
+    def test_debit(self):
+        """
+        Тестирование списания и отказа при нехватке средств на любом счете.
+        """
+        adjust_balances(self.ids, -1000, "Списание")
+        self.assertEqual(self.balances(), [0, 1000, 2000])
+
+        with self.assertRaises(ValidationError):
+            adjust_balances(self.ids, -1000, "Списание")
+        self.assertEqual(self.balances(), [0, 1000, 2000])
+        self.assertEqual(
+            BalanceAdjustment.objects.exclude(reason=OPENING_REASON).count(), 1
+        )
+
+    def test_constant_number_of_queries(self):
+        """
+        Тестирование того, что число запросов не зависит от числа счетов.
+        """
+        with self.assertNumQueries(7):
+            adjust_balances(self.ids[:1], 100, "Бонус")
+        with self.assertNumQueries(7):
+            adjust_balances(self.ids, 100, "Бонус")
+
+
+class ConcurrentDistributeMoneyTest(TransactionTestCase):
+    """
+    Нагрузочное тестирование параллельных переводов из нескольких потоков.
+    """
+
+    threads = 8
+    transfers_per_thread = 25
+
+    def setUp(self):
+        self.accounts = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", password="password", inn=f"{i:012d}", balance=5000
+            )
+            for i in range(1, 7)
+        ]
+
+    def run_transfers(self, seed, errors):
+        rng = random.Random(seed)
+        try:
+            for _ in range(self.transfers_per_thread):
+                sender, *acceptors = rng.sample(self.accounts, rng.randint(2, 4))
+                amount = rng.randint(1, 3000)
+                while True:
+                    try:
+                        distribute_money(sender, acceptors, amount)
+                    except ValidationError:
+                        pass
+                    except OperationalError:
+                        # SQLite отклоняет конкурирующую запись, а не ждет ее.
+                        continue
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_money_is_conserved(self):
+        """
+        Тестирование того, что параллельные переводы не создают и не теряют
+        деньги и не уводят балансы в минус.
+        """
+        initial_total = CustomUser.objects.aggregate(total=Sum("balance"))["total"]
+        errors = []
+        workers = [
+            threading.Thread(target=self.run_transfers, args=(seed, errors))
+            for seed in range(self.threads)
+        ]
+
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            CustomUser.objects.aggregate(total=Sum("balance"))["total"],
+            initial_total,
+        )
+        self.assertFalse(CustomUser.objects.filter(balance__lt=0).exists())
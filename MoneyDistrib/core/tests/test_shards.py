@@ -0,0 +1,393 @@
+import threading
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+
+from ..batches import parse_batch_request, settle_batch, validate_batch
+from ..caching import users_page
+from ..models import (
+    AccountStats,
+    BalanceAdjustment,
+    BalanceShard,
+    CustomUser,
+    DailyStats,
+    LedgerEntry,
+)
+from ..services import (
+    OPENING_REASON,
+    adjust_balances,
+    distribute_money,
+    lock_accounts,
+)
+from ..shards import (
+    SHARD_MOVE_REASON,
+    rebalance_accounts,
+    reshard_account,
+    sharded_accounts,
+)
+from ..stats import daily_totals, get_balance_summary, rebuild_stats
+
+
+def total_money():
+    users = CustomUser.objects.aggregate(total=Sum("balance"))["total"]
+    shards = BalanceShard.objects.aggregate(total=Sum("balance"))["total"]
+    return users + (shards or 0)
+
+
+class ShardedAccountTest(TestCase):
+    """
+    Тестирование переводов со счетами, баланс которых разделен на сегменты.
+    """
+
+    def setUp(self):
+        self.treasury = CustomUser.objects.create_user(
+            username="treasury", inn="100000000000", balance=10000
+        )
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", inn=f"{i:012d}", balance=1000
+            )
+            for i in range(1, 4)
+        ]
+        reshard_account(self.treasury.pk, 4)
+        self.treasury.refresh_from_db()
+
+    def shard_balances(self, account):
+        return list(
+            BalanceShard.objects.filter(account=account)
+            .order_by("index")
+            .values_list("balance", flat=True)
+        )
+
+    def verify_ledger(self):
+        out = StringIO()
+        call_command("verify_ledger", stdout=out)
+        self.assertIn("сходится", out.getvalue())
+
+    def test_reshard_account(self):
+        """
+        Тестирование деления баланса между сегментами с записью в журнал.
+        """
+        self.assertEqual(self.treasury.balance_shards, 4)
+        self.assertEqual(self.treasury.balance, 0)
+        self.assertEqual(self.shard_balances(self.treasury), [2500] * 4)
+        self.assertEqual(self.treasury.total_balance, 10000)
+
+        adjustment = BalanceAdjustment.objects.exclude(reason=OPENING_REASON).get()
+        self.assertEqual(adjustment.reason, SHARD_MOVE_REASON)
+        self.assertEqual(adjustment.amount, 0)
+        entries = LedgerEntry.objects.filter(adjustment=adjustment)
+        self.assertEqual(entries.aggregate(total=Sum("amount"))["total"], 0)
+        self.assertEqual(get_balance_summary().total_balance, 13000)
+        self.verify_ledger()
+
+    def test_transfer_from_sharded_account(self):
+        """
+        Тестирование списания с одного сегмента: строка счета не меняется,
+        а статистика накапливается в сегменте до перераспределения.
+        """
+        distribution = distribute_money(self.treasury, self.users[:2], 1000)
+
+        self.assertEqual(distribution.sender_balance, 9000)
+        self.assertEqual(
+            sorted(self.shard_balances(self.treasury)), [1500] + [2500] * 3
+        )
+        entry = LedgerEntry.objects.get(
+            account=self.treasury, transfer=distribution.transfer
+        )
+        self.assertEqual((entry.amount, entry.balance_after), (-1000, 1500))
+        self.assertIsNotNone(entry.shard)
+        self.assertFalse(AccountStats.objects.filter(pk=self.treasury.pk).exists())
+        self.assertFalse(DailyStats.objects.exists())
+        self.verify_ledger()
+
+        rebalance_accounts()
+
+        self.assertEqual(self.shard_balances(self.treasury), [2250] * 4)
+        stats = AccountStats.objects.get(pk=self.treasury.pk)
+        self.assertEqual((stats.sent_count, stats.sent_volume), (1, 1000))
+        self.assertEqual(daily_totals().get().total_credits, 2)
+        self.verify_ledger()
+
+    def test_transfer_to_sharded_account(self):
+        distribute_money(self.users[0], [self.treasury, self.users[1]], 500)
+
+        self.assertEqual(CustomUser.objects.get(pk=self.treasury.pk).balance, 0)
+        self.assertEqual(
+            sorted(self.shard_balances(self.treasury)), [2500] * 3 + [2750]
+        )
+        self.assertEqual(self.treasury.total_balance, 10250)
+        self.verify_ledger()
+
+    def test_gather_shards(self):
+        """
+        Тестирование списания суммы, которой нет ни на одном сегменте:
+        средства счета собираются в одном сегменте.
+        """
+        distribute_money(self.treasury, [self.users[0]], 9000)
+
+        self.assertEqual(sorted(self.shard_balances(self.treasury)), [0, 0, 0, 1000])
+        self.assertEqual(self.treasury.total_balance, 1000)
+        self.verify_ledger()
+
+        with self.assertRaisesMessage(ValidationError, "недостаточно средств"):
+            distribute_money(self.treasury, [self.users[0]], 1001)
+
+    def test_stats_match_rebuild(self):
+        """
+        Тестирование того, что статистика после перераспределения совпадает
+        с пересчитанной по журналу.
+        """
+        distribute_money(self.treasury, self.users, 300)
+        distribute_money(self.users[0], [self.treasury], 200)
+        distribute_money(self.users[1], [self.users[2]], 100)
+        rebalance_accounts()
+        stats = list(AccountStats.objects.order_by("pk").values())
+        fields = ("date", "total_transfers", "total_credits", "total_volume")
+        days = list(daily_totals().values(*fields))
+
+        rebuild_stats()
+
+        self.assertEqual(list(AccountStats.objects.order_by("pk").values()), stats)
+        self.assertEqual(list(daily_totals().values(*fields)), days)
+        self.assertEqual(days[0]["total_transfers"], 3)
+
+    def test_batch_and_adjustment(self):
+        """
+        Тестирование пакета распределений и корректировки баланса счета с
+        сегментами: средства собираются в строке счета.
+        """
+        items, atomic = parse_batch_request(
+            '{"distributions": [{"sender": %d, "recipients": ["%s"], "amount": "60"}]}'
+            % (self.treasury.pk, self.users[0].inn),
+            10,
+            10,
+        )
+        validate_batch(items)
+        settle_batch(items, atomic)
+        adjust_balances([self.treasury.pk], -3000, "Списание")
+
+        self.assertEqual(items[0].status, "ok")
+        self.treasury.refresh_from_db()
+        self.assertEqual(self.treasury.balance, 1000)
+        self.assertEqual(self.shard_balances(self.treasury), [0] * 4)
+        self.verify_ledger()
+
+        rebalance_accounts()
+
+        self.assertEqual(self.shard_balances(self.treasury), [250] * 4)
+        self.assertEqual(total_money(), 13000 - 3000)
+
+    def test_disable_sharding(self):
+        distribute_money(self.treasury, [self.users[0]], 1000)
+
+        reshard_account(self.treasury.pk, 0)
+
+        self.treasury.refresh_from_db()
+        self.assertEqual(
+            (self.treasury.balance, self.treasury.balance_shards), (9000, 0)
+        )
+        self.assertFalse(BalanceShard.objects.exists())
+        self.assertEqual(AccountStats.objects.get(pk=self.treasury.pk).sent_count, 1)
+        self.verify_ledger()
+
+    def unshard_after_read(self):
+        """
+        Подменяет чтение счетов с сегментами в settle так, чтобы сразу после
+        него сегменты счета treasury удалялись, как при параллельном
+        shard_account --shards 0.
+        """
+
+        def read_and_unshard(account_ids):
+            sharded = sharded_accounts(account_ids)
+            reshard_account(self.treasury.pk, 0)
+            return sharded
+
+        return mock.patch("core.services.sharded_accounts", read_and_unshard)
+
+    def test_shards_removed_during_transfer(self):
+        """
+        Тестирование перевода со счетом, сегменты которого удалены после
+        чтения числа сегментов: счет проводится по строке.
+        """
+        with self.unshard_after_read():
+            distribution = distribute_money(self.treasury, [self.users[0]], 1000)
+        with self.unshard_after_read():
+            distribute_money(self.users[1], [self.treasury, self.users[2]], 500)
+
+        self.assertEqual(distribution.sender_balance, 9000)
+        self.treasury.refresh_from_db()
+        self.assertEqual(
+            (self.treasury.balance, self.treasury.balance_shards), (9250, 0)
+        )
+        self.assertFalse(BalanceShard.objects.exists())
+        entries = LedgerEntry.objects.filter(
+            account=self.treasury, transfer__isnull=False
+        )
+        self.assertEqual(
+            sorted(entries.values_list("shard", "amount", "balance_after")),
+            [(None, -1000, 9000), (None, 250, 9250)],
+        )
+        stats = AccountStats.objects.get(pk=self.treasury.pk)
+        self.assertEqual((stats.sent_count, stats.received_count), (1, 1))
+        self.assertEqual(daily_totals().get().total_transfers, 2)
+        self.verify_ledger()
+
+        reshard_account(self.treasury.pk, 2)
+        with self.unshard_after_read():
+            with self.assertRaisesMessage(ValidationError, "недостаточно средств"):
+                distribute_money(self.treasury, [self.users[0]], 9251)
+
+    def unshard_after_lock(self):
+        """
+        Подменяет блокировку строк счетов в settle и adjust_balances так,
+        чтобы сразу после нее сегменты счета treasury удалялись - до чтения
+        счетов с сегментами.
+        """
+
+        def lock_and_unshard(account_ids):
+            balances = lock_accounts(account_ids)
+            reshard_account(self.treasury.pk, 0)
+            return balances
+
+        return mock.patch("core.services.lock_accounts", lock_and_unshard)
+
+    def test_shards_removed_before_read(self):
+        """
+        Тестирование перевода и корректировки со счетом, сегменты которого
+        удалены между блокировкой строк и чтением числа сегментов: счет
+        блокируется по строке и проводится без сегментов.
+        """
+        with self.unshard_after_lock():
+            distribution = distribute_money(self.treasury, [self.users[0]], 1000)
+        reshard_account(self.treasury.pk, 4)
+        with self.unshard_after_lock():
+            distribute_money(self.users[1], [self.treasury], 500)
+        reshard_account(self.treasury.pk, 4)
+        with self.unshard_after_lock():
+            adjust_balances([self.treasury.pk], -100, "Списание")
+
+        self.assertEqual(distribution.sender_balance, 9000)
+        self.treasury.refresh_from_db()
+        self.assertEqual(
+            (self.treasury.balance, self.treasury.balance_shards), (9400, 0)
+        )
+        self.assertEqual(
+            sorted(
+                LedgerEntry.objects.filter(
+                    account=self.treasury, transfer__isnull=False
+                ).values_list("shard", "amount")
+            ),
+            [(None, -1000), (None, 500)],
+        )
+        self.verify_ledger()
+
+    def test_users_page(self):
+        balances = {row["username"]: row["balance"] for row in users_page(None, 10)}
+
+        self.assertEqual(balances["treasury"], 10000)
+
+
+class ShardCommandsTest(TestCase):
+    """
+    Тестирование команд shard_account и run_shard_rebalancer.
+    """
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username="user", inn="123456789012", balance=1001
+        )
+
+    def test_shard_account(self):
+        call_command("shard_account", "123456789012", shards=2, stdout=StringIO())
+        BalanceShard.objects.filter(index=0).update(balance=1)
+        BalanceShard.objects.filter(index=1).update(balance=1000)
+        out = StringIO()
+
+        call_command("run_shard_rebalancer", once=True, stdout=out)
+
+        self.assertIn("Перераспределено счетов: 1", out.getvalue())
+        self.assertEqual(
+            list(
+                BalanceShard.objects.order_by("index").values_list("balance", flat=True)
+            ),
+            [501, 500],
+        )
+
+    def test_errors(self):
+        for args, options in (
+            (("000000000000",), {"shards": 2}),
+            (("123456789012",), {"shards": 1000}),
+        ):
+            with self.subTest(args=args, options=options):
+                with self.assertRaises(CommandError):
+                    call_command("shard_account", *args, **options)
+
+
+@skipUnless(
+    connection.vendor == "postgresql",
+    "SQLite блокирует таблицу целиком, а не строки сегментов",
+)
+class ConcurrentShardedTransferTest(TransactionTestCase):
+    """
+    Нагрузочное тестирование параллельных переводов со счета с сегментами.
+    """
+
+    threads = 8
+    transfers_per_thread = 20
+
+    def setUp(self):
+        self.treasury = CustomUser.objects.create_user(
+            username="treasury", inn="100000000000", balance=100000
+        )
+        self.users = [
+            CustomUser.objects.create_user(username=f"user{i}", inn=f"{i:012d}")
+            for i in range(1, 5)
+        ]
+        reshard_account(self.treasury.pk, 4)
+
+    def run_transfers(self, errors):
+        try:
+            for _ in range(self.transfers_per_thread):
+                while True:
+                    try:
+                        distribute_money(self.treasury, self.users, 400)
+                    except OperationalError:
+                        # Сервер отменяет одну из транзакций при взаимной
+                        # блокировке, такой перевод повторяется.
+                        continue
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_money_is_conserved(self):
+        """
+        Тестирование того, что параллельные списания с сегментов не создают
+        и не теряют деньги.
+        """
+        errors = []
+        workers = [
+            threading.Thread(target=self.run_transfers, args=(errors,))
+            for _ in range(self.threads)
+        ]
+
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(total_money(), 100000)
+        self.assertEqual(
+            CustomUser.objects.get(pk=self.treasury.pk).total_balance,
+            100000 - 400 * self.threads * self.transfers_per_thread,
+        )
+        self.assertFalse(BalanceShard.objects.filter(balance__lt=0).exists())
+        call_command("verify_ledger", stdout=StringIO())
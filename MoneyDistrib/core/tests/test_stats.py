@@ -0,0 +1,172 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import AccountStats, CustomUser, DailyStats
+from ..services import distribute_money, settle
+from ..stats import daily_totals, get_balance_summary
+
+
+class StatsTest(TestCase):
+    """
+    Тестирование сводной статистики переводов и сводки по балансам.
+    """
+
+    def setUp(self):
+        self.user1 = CustomUser.objects.create_user(
+            username="user1", password="password", inn="123456789012", balance=10000
+        )
+        self.user2 = CustomUser.objects.create_user(
+            username="user2", password="password", inn="223456789012", balance=0
+        )
+        self.user3 = CustomUser.objects.create_user(
+            username="user3", password="password", inn="223456123412", balance=0
+        )
+
+    def stats_values(self):
+        return {
+            stats.account_id: (
+                stats.sent_count,
+                stats.sent_volume,
+                stats.received_count,
+                stats.received_volume,
+            )
+            for stats in AccountStats.objects.all()
+        }
+
+    def daily_values(self):
+        return list(
+            daily_totals().values_list(
+                "date", "total_transfers", "total_credits", "total_volume"
+            )
+        )
+
+    def test_transfers_update_stats(self):
+        """
+        Тестирование обновления статистики счетов и дня при переводах.
+        """
+        distribute_money(self.user1, [self.user2, self.user3], 6001)
+        distribute_money(self.user2, [self.user1], 1000)
+
+        self.assertEqual(
+            self.stats_values(),
+            {
+                self.user1.pk: (1, 6001, 1, 1000),
+                self.user2.pk: (1, 1000, 1, 3001),
+                self.user3.pk: (0, 0, 1, 3000),
+            },
+        )
+        self.assertEqual(self.daily_values(), [(timezone.localdate(), 2, 3, 7001)])
+
+    def test_many_amounts(self):
+        """
+        Тестирование статистики получателей при множестве различных сумм.
+        """
+        acceptors = [
+            CustomUser.objects.create_user(username=f"acceptor{i}", inn=f"{i:012d}")
+            for i in range(1, 7)
+        ]
+        settle(self.user1, [(acceptor.pk, i) for i, acceptor in enumerate(acceptors)])
+        settle(self.user1, [(acceptors[0].pk, 100)])
+
+        stats = self.stats_values()
+        self.assertEqual(stats[self.user1.pk], (2, 115, 0, 0))
+        self.assertEqual(stats[acceptors[0].pk], (0, 0, 2, 100))
+        for i, acceptor in enumerate(acceptors[1:], start=1):
+            self.assertEqual(stats[acceptor.pk], (0, 0, 1, i))
+
+    def test_daily_buckets(self):
+        """
+        Тестирование деления статистики дня между корзинами: каждый перевод
+        обновляет свою корзину, а итоги дня складываются по всем корзинам.
+        """
+        with mock.patch("core.stats.random.randrange", side_effect=[3, 5, 3]):
+            distribute_money(self.user1, [self.user2, self.user3], 6001)
+            distribute_money(self.user2, [self.user1], 1000)
+            distribute_money(self.user1, [self.user3], 1)
+
+        buckets = dict(DailyStats.objects.values_list("bucket", "transfer_count"))
+        self.assertEqual(buckets, {0: 0, 3: 2, 5: 1})
+        self.assertEqual(self.daily_values(), [(timezone.localdate(), 3, 4, 7002)])
+
+    def test_rebuild_stats(self):
+        """
+        Тестирование пересчета статистики командой rebuild_stats.
+        """
+        distribute_money(self.user1, [self.user2, self.user3], 6001)
+        distribute_money(self.user2, [self.user1], 1000)
+        expected_stats = self.stats_values()
+        expected_daily = self.daily_values()
+
+        AccountStats.objects.all().delete()
+        DailyStats.objects.all().delete()
+        CustomUser.objects.filter(pk=self.user3.pk).update(balance=0)
+        out = StringIO()
+        call_command("rebuild_stats", stdout=out)
+
+        self.assertIn("счетов 3, дней 1", out.getvalue())
+        self.assertEqual(self.stats_values(), expected_stats)
+        self.assertEqual(self.daily_values(), expected_daily)
+        self.assertEqual(get_balance_summary().total_balance, 7000)
+
+    def test_balance_summary(self):
+        """
+        Тестирование сводки по балансам при создании, изменении и удалении
+        пользователей.
+        """
+        summary = get_balance_summary()
+        self.assertEqual((summary.accounts, summary.total_balance), (3, 10000))
+
+        distribute_money(self.user1, [self.user2], 5000)
+        self.user3.balance = 250
+        self.user3.save()
+        self.user3.first_name = "Иван"
+        self.user3.save(update_fields=["first_name"])
+        summary = get_balance_summary()
+        self.assertEqual((summary.accounts, summary.total_balance), (3, 10250))
+
+        self.user3.delete()
+        summary = get_balance_summary()
+        self.assertEqual((summary.accounts, summary.total_balance), (2, 10000))
+
+
+class StatsAdminTest(TestCase):
+    """
+    Тестирование колонок статистики и панели статистики в админке.
+    """
+
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(
+            username="admin", password="password", inn="000000000001"
+        )
+        self.sender = CustomUser.objects.create_user(
+            username="sender", password="password", inn="123456789012", balance=10000
+        )
+        self.acceptor = CustomUser.objects.create_user(
+            username="acceptor", password="password", inn="223456789012"
+        )
+        distribute_money(self.sender, [self.acceptor], 4000)
+        self.client.force_login(self.admin)
+
+    def test_user_changelist(self):
+        """
+        Тестирование колонок отправленных и полученных сумм в списке
+        пользователей.
+        """
+        response = self.client.get(reverse("admin:core_customuser_changelist"))
+        self.assertContains(response, "40.00")
+
+    def test_dashboard(self):
+        """
+        Тестирование панели статистики.
+        """
+        response = self.client.get(reverse("admin:core_dailystats_changelist"))
+        self.assertContains(response, "Крупнейшие отправители")
+        self.assertContains(response, "100.00")
+        self.assertEqual(
+            response.context["top_senders"][0][:3], ("sender", "123456789012", 1)
+        )
@@ -0,0 +1,219 @@
+import csv
+import io
+from http import HTTPStatus
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from openpyxl import Workbook
+
+from ..models import CustomUser, IdempotencyKey, Transfer
+from ..uploads import STATUS_ERROR, STATUS_OK, STATUS_SKIPPED, process_upload
+
+
+def make_csv(lines, name="payout.csv"):
+    return SimpleUploadedFile(name, "\n".join(lines).encode(), "text/csv")
+
+
+def make_xlsx(rows, name="payout.xlsx"):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    content = io.BytesIO()
+    workbook.save(content)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+class ProcessUploadTest(TestCase):
+    """
+    Тестирование обработки файла распределения с индивидуальными суммами.
+    """
+
+    def setUp(self):
+        self.sender = CustomUser.objects.create_user(
+            username="sender", password="password", inn="100000000000", balance=100000
+        )
+        CustomUser.objects.bulk_create(
+            CustomUser(username=f"user{i}", inn=f"{i:012d}") for i in range(1, 11)
+        )
+
+    def test_upload_with_individual_amounts(self):
+        """
+        Тестирование перевода индивидуальных сумм по строкам файла.
+        """
+        lines = ["inn;amount"] + [f"{i:012d};{i},50" for i in range(1, 11)]
+
+        rows = process_upload(self.sender, make_csv(lines))
+
+        self.assertEqual({row.status for row in rows}, {STATUS_OK})
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, 94000)
+        for i in range(1, 11):
+            self.assertEqual(
+                CustomUser.objects.get(inn=f"{i:012d}").balance,
+                i * 100 + 50,
+            )
+        self.assertEqual(Transfer.objects.get().amount, 6000)
+        self.assertEqual(Transfer.objects.get().entries.count(), 11)
+
+    def test_xlsx_upload(self):
+        """
+        Тестирование XLSX-файла с ИНН и суммами в числовых ячейках.
+        """
+        first = CustomUser.objects.create_user(username="first", inn="7700000001")
+        second = CustomUser.objects.create_user(username="second", inn="7700000002")
+
+        rows = process_upload(
+            self.sender,
+            make_xlsx(
+                [
+                    ("ИНН", "Сумма"),
+                    (7700000001, 10.5),
+                    (7700000002.0, 3),
+                    (f"{1:012d}", "0,25"),
+                ]
+            ),
+        )
+
+        self.assertEqual([row.status for row in rows], [STATUS_OK] * 3)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.balance, second.balance), (1050, 300))
+        self.assertEqual(CustomUser.objects.get(inn=f"{1:012d}").balance, 25)
+
+    def test_errors_reject_whole_file(self):
+        """
+        Тестирование того, что ошибка в любой строке отменяет весь перевод.
+        """
+        lines = [
+            f"{1:012d},10",
+            "123,10",
+            f"{2:012d},abc",
+            f"{1:012d},5",
+            "999999999999,1",
+            "100000000000,1",
+            f"{3:012d},1",
+        ]
+
+        rows = process_upload(self.sender, make_csv(lines))
+
+        self.assertEqual(
+            [(row.number, row.status) for row in rows],
+            [
+                (1, STATUS_SKIPPED),
+                (2, STATUS_ERROR),
+                (3, STATUS_ERROR),
+                (4, STATUS_ERROR),
+                (5, STATUS_ERROR),
+                (6, STATUS_ERROR),
+                (7, STATUS_SKIPPED),
+            ],
+        )
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, 100000)
+        self.assertFalse(Transfer.objects.exists())
+
+    def test_insufficient_funds(self):
+        """
+        Тестирование отказа при недостатке средств у отправителя.
+        """
+        rows = process_upload(self.sender, make_csv([f"{1:012d},1000.01"]))
+
+        self.assertEqual(rows[0].status, STATUS_ERROR)
+        self.assertEqual(rows[0].message, "У отправителя недостаточно средств.")
+
+
+class UploadDistributionViewTest(TestCase):
+    """
+    Тестирование представления загрузки файла распределения.
+    """
+
+    def setUp(self):
+        self.url = reverse("core:upload_distribution")
+        self.sender = CustomUser.objects.create_user(
+            username="sender", password="password", inn="100000000000", balance=10000
+        )
+        self.acceptor = CustomUser.objects.create_user(
+            username="acceptor", password="password", inn="200000000000"
+        )
+
+    def test_report(self):
+        """
+        Тестирование выдачи построчного отчета в CSV.
+        """
+        response = self.client.post(
+            self.url,
+            {
+                "upload-sender": self.sender.id,
+                "upload-file": make_csv(["200000000000,25"]),
+            },
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn("attachment", response["Content-Disposition"])
+        report = list(csv.reader(response.content.decode().splitlines()))
+        self.assertEqual(
+            report,
+            [
+                ["row", "inn", "amount", "status", "message"],
+                ["1", "200000000000", "25.00", "ok", ""],
+            ],
+        )
+
+    def post_upload(self, lines, key="upload-key"):
+        return self.client.post(
+            self.url,
+            {
+                "upload-sender": self.sender.id,
+                "upload-file": make_csv(lines),
+                "upload-idempotency_key": key,
+            },
+        )
+
+    def test_repeat_is_not_executed(self):
+        """
+        Тестирование того, что повторная загрузка с тем же ключом возвращает
+        сохраненный отчет без повторного перевода, а другой файл с этим
+        ключом отклоняется.
+        """
+        first = self.post_upload(["200000000000,25"])
+        second = self.post_upload(["200000000000,25"])
+        other = self.post_upload(["200000000000,30"])
+
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(second["Content-Disposition"], first["Content-Disposition"])
+        self.assertRedirects(other, reverse("core:index"))
+        self.assertEqual(Transfer.objects.count(), 1)
+        self.acceptor.refresh_from_db()
+        self.assertEqual(self.acceptor.balance, 2500)
+
+    def test_failed_upload_is_not_stored(self):
+        """
+        Тестирование того, что ключ невыполненной загрузки не сохраняется:
+        после пополнения счета тот же файл с тем же ключом переводится.
+        """
+        response = self.post_upload(["200000000000,250"])
+
+        self.assertIn(b"error", response.content)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        CustomUser.objects.filter(pk=self.sender.pk).update(balance=100000)
+
+        response = self.post_upload(["200000000000,250"])
+
+        self.assertNotIn("Idempotent-Replayed", response.headers)
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    def test_invalid_form(self):
+        """
+        Тестирование перенаправления при ошибках в форме загрузки.
+        """
+        response = self.client.post(
+            self.url,
+            {
+                "upload-sender": self.sender.id,
+                "upload-file": make_csv(["200000000000,25"], name="payout.txt"),
+            },
+        )
+
+        self.assertRedirects(response, reverse("core:index"))
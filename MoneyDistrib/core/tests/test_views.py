@@ -1,11 +1,16 @@
-from decimal import Decimal
+import json
 from http import HTTPStatus
 
+from asgiref.sync import iscoroutinefunction
+
+from django.core.cache import caches
 from django.db import transaction
-from django.test import Client, TestCase, TransactionTestCase
+from django.test import Client, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 
-from ..models import CustomUser
+from .. import views
+from ..caching import USERS_CACHE
+from ..models import CustomUser, IdempotencyKey, Transfer
 
 
 class IndexViewTest(TestCase):
@@ -15,10 +20,11 @@ class IndexViewTest(TestCase):
 
     def setUp(self):
         self.client = Client()
+        caches[USERS_CACHE].clear()
         self.index_url = reverse("core:index")
 
         self.user1 = CustomUser.objects.create_user(
-            username="user1", password="password", inn="123456789012", balance=100
+            username="user1", password="password", inn="123456789012", balance=10000
         )
         self.user2 = CustomUser.objects.create_user(
             username="user2", password="password", inn="223456789012", balance=0
@@ -38,6 +44,23 @@ class IndexViewTest(TestCase):
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(response, "index.html")
 
+    @override_settings(USERS_PAGE_SIZE=3)
+    def test_users_pagination(self):
+        """
+        Тестирование постраничного вывода пользователей на главной странице.
+        """
+        response = self.client.get(self.index_url)
+        page = response.context["users"]
+        self.assertEqual(
+            [row["username"] for row in page], ["user1", "user2", "user3"]
+        )
+        self.assertTrue(page.has_next)
+
+        response = self.client.get(self.index_url, {"after": page.next_cursor})
+        page = response.context["users"]
+        self.assertEqual([row["username"] for row in page], ["user4"])
+        self.assertFalse(page.has_next)
+
     def test_post_request_success(self):
         """
         Тестирование успешного POST-запроса к IndexView.
@@ -50,13 +73,28 @@ class IndexViewTest(TestCase):
         response = self.client.post(self.index_url, data)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
 
+    def test_post_request_background(self):
+        """
+        Тестирование постановки перевода из формы в очередь.
+        """
+        data = {
+            "sender": self.user1.id,
+            "amount": 100,
+            "inn_list": f"{self.user2.inn}",
+            "background": "on",
+        }
+        response = self.client.post(self.index_url, data, follow=True)
+        self.assertContains(response, "Распределение поставлено в очередь")
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.balance, 10000)
+
     def test_post_request_fail(self):
         """
         Тестирование POST-запроса с ошибкой к IndexView.
         """
         data = {
             "sender": self.user1.id,
-            "amount": self.user1.balance * 2,
+            "amount": 200,
             "inn_list": f"{self.user2.inn}",
         }
         response = self.client.post(self.index_url, data)
@@ -74,10 +112,10 @@ class IndexViewTest(TestCase):
         }
 
         expected_balances = {
-            self.user1: Decimal("0.01"),
-            self.user2: Decimal("33.33"),
-            self.user3: Decimal("33.33"),
-            self.user4: Decimal("33.33"),
+            self.user1: 0,
+            self.user2: 3334,
+            self.user3: 3333,
+            self.user4: 3333,
         }
 
         self.client.post(self.index_url, data)
@@ -104,9 +142,9 @@ class IndexViewTest(TestCase):
         }
 
         expected_balances = {
-            self.user1: Decimal("16.67"),
-            self.user2: Decimal("0.01"),
-            self.user3: Decimal("49.99"),
+            self.user1: 1667,
+            self.user2: 1,
+            self.user3: 4999,
         }
 
         self.client.post(self.index_url, data_first_transfer)
@@ -148,7 +186,7 @@ class MoneyTransferRollbackTest(TransactionTestCase):
         self.index_url = reverse("core:index")
 
         self.user1 = CustomUser.objects.create_user(
-            username="user1", password="password", inn="123456789012", balance=100
+            username="user1", password="password", inn="123456789012", balance=10000
         )
         self.user2 = CustomUser.objects.create_user(
             username="user2", password="password", inn="223456789012", balance=0
@@ -192,3 +230,395 @@ class MoneyTransferRollbackTest(TransactionTestCase):
         self.assertEqual(self.user1.balance, initial_state["user1_balance"])
         self.assertEqual(self.user2.balance, initial_state["user2_balance"])
         self.assertEqual(self.user3.balance, initial_state["user3_balance"])
+
+
+class ApiTransfersViewTest(TestCase):
+    """
+    Тестирование JSON API переводов.
+    """
+
+    def setUp(self):
+        self.url = reverse("core:api_transfers")
+
+        self.user1 = CustomUser.objects.create_user(
+            username="user1", password="password", inn="123456789012", balance=10000
+        )
+        self.user2 = CustomUser.objects.create_user(
+            username="user2", password="password", inn="223456789012", balance=0
+        )
+        self.user3 = CustomUser.objects.create_user(
+            username="user3", password="password", inn="223456123412", balance=0
+        )
+
+    def post_json(self, payload):
+        return self.client.post(
+            self.url, json.dumps(payload), content_type="application/json"
+        )
+
+    def test_transfer_success(self):
+        """
+        Тестирование успешного перевода через API.
+        """
+        response = self.post_json(
+            {
+                "sender": self.user1.id,
+                "recipients": [self.user2.inn, self.user3.inn],
+                "amount": "50.00",
+            }
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        data = response.json()
+        self.assertEqual(data["sender"], {"id": self.user1.id, "balance": "50.00"})
+        self.assertEqual(
+            data["transfers"],
+            [
+                {"inn": self.user2.inn, "amount": "25.00"},
+                {"inn": self.user3.inn, "amount": "25.00"},
+            ],
+        )
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.balance, 2500)
+
+    def test_background_transfer(self):
+        """
+        Тестирование постановки перевода в очередь и опроса статуса задания.
+        """
+        response = self.post_json(
+            {
+                "sender": self.user1.id,
+                "recipients": [self.user2.inn, self.user3.inn],
+                "amount": "50.00",
+                "background": True,
+            }
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.ACCEPTED)
+        data = response.json()
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.balance, 10000)
+
+        response = self.client.get(data["status_url"])
+        self.assertEqual(
+            response.json(),
+            {
+                "id": data["job"],
+                "status": "pending",
+                "processed": 0,
+                "total": 2,
+                "error": "",
+            },
+        )
+
+        response = self.client.get(reverse("core:api_job", args=[data["job"] + 1]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_validation_errors(self):
+        """
+        Тестирование ошибок валидации в ответе API.
+        """
+        response = self.post_json(
+            {"sender": self.user1.id, "recipients": ["111"], "amount": "50.00"}
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            response.json()["errors"]["inn_list"][0]["message"],
+            "Некорректный ИНН: 111",
+        )
+
+    def test_invalid_json(self):
+        """
+        Тестирование ответа на некорректное тело запроса.
+        """
+        response = self.client.post(
+            self.url, "not json", content_type="application/json"
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+        response = self.post_json(
+            {"sender": self.user1.id, "recipients": "223456789012", "amount": "1"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_get_not_allowed(self):
+        """
+        Тестирование запрета GET-запросов к API.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+
+
+class ApiTransferBatchViewTest(TestCase):
+    """
+    Тестирование JSON API пакета распределений.
+    """
+
+    def setUp(self):
+        self.url = reverse("core:api_transfer_batch")
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f"user{i}", inn=f"{i:012d}", balance=10000
+            )
+            for i in range(1, 4)
+        ]
+
+    def post_batch(self, distributions, headers=None, **extra):
+        return self.client.post(
+            self.url,
+            json.dumps({"distributions": distributions, **extra}),
+            content_type="application/json",
+            headers=headers,
+        )
+
+    def distribution(self, sender, recipients, amount):
+        return {
+            "sender": self.users[sender].pk,
+            "recipients": [self.users[i].inn for i in recipients],
+            "amount": amount,
+        }
+
+    def test_batch(self):
+        """
+        Тестирование выполнения пакета и повторного запроса с тем же ключом.
+        """
+        distributions = [
+            self.distribution(0, [1, 2], "50.00"),
+            self.distribution(1, [2], "10.00"),
+        ]
+        response = self.post_batch(
+            distributions, headers={"Idempotency-Key": "batch-1"}
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        data = response.json()
+        self.assertEqual(data["settled"], 2)
+        self.assertEqual(
+            data["results"][1],
+            {
+                "index": 1,
+                "status": "ok",
+                "transfer": data["results"][1]["transfer"],
+                "amount": "10.00",
+                "sender": {"id": self.users[1].pk, "balance": "115.00"},
+            },
+        )
+
+        replay = self.post_batch(distributions, headers={"Idempotency-Key": "batch-1"})
+        self.assertEqual(replay.json(), data)
+        self.assertEqual(
+            list(CustomUser.objects.order_by("pk").values_list("balance", flat=True)),
+            [5000, 11500, 13500],
+        )
+
+    def test_atomic_batch_errors(self):
+        """
+        Тестирование того, что пакет с ошибками в данных не выполняется и
+        ключ идемпотентности не сохраняется.
+        """
+        distributions = [
+            self.distribution(0, [1], "1.00"),
+            {**self.distribution(1, [2], "1.00"), "recipients": ["999999999999"]},
+        ]
+        response = self.post_batch(
+            distributions, headers={"Idempotency-Key": "batch-2"}
+        )
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["skipped", "error"])
+        self.assertEqual(
+            results[1]["errors"], ["Пользователи с ИНН не найдены: 999999999999"]
+        )
+
+        distributions[1] = self.distribution(1, [2], "1.00")
+        response = self.post_batch(
+            distributions, headers={"Idempotency-Key": "batch-2"}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+
+    def test_partial_batch(self):
+        """
+        Тестирование частичного выполнения пакета и пакета, в котором не
+        хватило средств ни на одно распределение.
+        """
+        response = self.post_batch(
+            [
+                self.distribution(0, [1], "1.00"),
+                self.distribution(2, [1], "1000.00"),
+            ],
+            atomic=False,
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()["settled"], 1)
+
+        response = self.post_batch([self.distribution(2, [1], "1000.00")], atomic=False)
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertEqual(
+            response.json()["results"][0]["errors"],
+            ["У отправителя недостаточно средств."],
+        )
+
+    def test_retry_after_funding(self):
+        """
+        Тестирование того, что ключ пакета, не выполненного из-за нехватки
+        средств, не сохраняется: повтор после пополнения счета выполняется.
+        """
+        distributions = [self.distribution(2, [1], "1000.00")]
+        headers = {"Idempotency-Key": "batch-3"}
+
+        response = self.post_batch(distributions, headers=headers)
+
+        self.assertEqual(response.status_code, HTTPStatus.CONFLICT)
+        self.assertFalse(IdempotencyKey.objects.filter(key="batch-3").exists())
+        CustomUser.objects.filter(pk=self.users[2].pk).update(balance=100000)
+
+        response = self.post_batch(distributions, headers=headers)
+
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertNotIn("Idempotent-Replayed", response.headers)
+        self.assertEqual(response.json()["settled"], 1)
+
+    def test_key_reused_with_other_batch(self):
+        """
+        Тестирование того, что ключ выполненного пакета отклоняет другой
+        пакет со статусом 422.
+        """
+        headers = {"Idempotency-Key": "batch-4"}
+        self.post_batch([self.distribution(0, [1], "1.00")], headers=headers)
+
+        response = self.post_batch([self.distribution(0, [1], "2.00")], headers=headers)
+
+        self.assertEqual(response.status_code, HTTPStatus.UNPROCESSABLE_ENTITY)
+        self.assertEqual(Transfer.objects.count(), 1)
+
+    @override_settings(TRANSFER_BATCH_MAX_ITEMS=1)
+    def test_invalid_request(self):
+        """
+        Тестирование ошибок, относящихся ко всему пакету.
+        """
+        response = self.post_batch([self.distribution(0, [1], "1.00")] * 2)
+
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            response.json()["errors"]["__all__"][0]["message"],
+            "В пакете не может быть больше 1 распределений",
+        )
+        self.assertEqual(
+            self.client.get(self.url).status_code, HTTPStatus.METHOD_NOT_ALLOWED
+        )
+
+
+class UserSearchViewTest(TestCase):
+    """
+    Тестирование поиска отправителя по префиксу имени или ИНН.
+    """
+
+    def setUp(self):
+        self.url = reverse("core:user_search")
+
+        self.user1 = CustomUser.objects.create_user(
+            username="alice", password="password", inn="123456789012"
+        )
+        self.user2 = CustomUser.objects.create_user(
+            username="alex", password="password", inn="223456789012"
+        )
+        self.user3 = CustomUser.objects.create_user(
+            username="bob", password="password", inn="123000000000"
+        )
+
+    def search(self, query):
+        response = self.client.get(self.url, {"q": query})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [user["username"] for user in response.json()["results"]]
+
+    def test_search_by_username_prefix(self):
+        """
+        Тестирование поиска по префиксу имени пользователя.
+        """
+        self.assertEqual(self.search("al"), ["alex", "alice"])
+        self.assertEqual(self.search("ali"), ["alice"])
+        self.assertEqual(self.search(""), [])
+
+    def test_search_by_inn_prefix(self):
+        """
+        Тестирование поиска по префиксу ИНН.
+        """
+        self.assertEqual(self.search("123"), ["alice", "bob"])
+        self.assertEqual(self.search("2234"), ["alex"])
+
+    @override_settings(USER_SEARCH_LIMIT=1)
+    def test_search_limit(self):
+        """
+        Тестирование ограничения числа результатов поиска.
+        """
+        self.assertEqual(self.search("al"), ["alex"])
+
+
+class AsyncViewsTest(TestCase):
+    """
+    Тестирование асинхронных представлений API через асинхронный клиент,
+    как при обслуживании через ASGI.
+    """
+
+    def setUp(self):
+        self.user1 = CustomUser.objects.create_user(
+            username="user1", password="password", inn="123456789012", balance=10000
+        )
+        self.user2 = CustomUser.objects.create_user(
+            username="user2", password="password", inn="223456789012", balance=0
+        )
+
+    def test_views_are_async(self):
+        """
+        Тестирование того, что представления API не выполняются в потоке.
+        """
+        for view in (views.api_transfers, views.api_job, views.user_search):
+            self.assertTrue(iscoroutinefunction(view), view.__name__)
+
+    async def test_api_transfer(self):
+        """
+        Тестирование перевода, повтора по ключу идемпотентности и замеров
+        запросов к базе в асинхронном представлении.
+        """
+        url = reverse("core:api_transfers")
+        payload = json.dumps(
+            {"sender": self.user1.id, "recipients": [self.user2.inn], "amount": "60"}
+        )
+
+        response = await self.async_client.post(
+            url,
+            payload,
+            content_type="application/json",
+            headers={"Idempotency-Key": "key"},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()["sender"]["balance"], "40.00")
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+        replay = await self.async_client.post(
+            url,
+            payload,
+            content_type="application/json",
+            headers={"Idempotency-Key": "key"},
+        )
+        self.assertEqual(replay.json(), response.json())
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+
+    async def test_user_search_and_job(self):
+        """
+        Тестирование поиска пользователей и статуса задания.
+        """
+        response = await self.async_client.get(
+            reverse("core:user_search"), {"q": "user"}
+        )
+        self.assertEqual(
+            [user["username"] for user in response.json()["results"]],
+            ["user1", "user2"],
+        )
+
+        response = await self.async_client.get(reverse("core:api_job", args=[1]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
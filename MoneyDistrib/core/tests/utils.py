@@ -0,0 +1,47 @@
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Сколько запросов с одинаковым шаблоном показывать в сообщении о
+# превышении бюджета.
+REPEATED_QUERIES_SHOWN = 5
+
+
+def query_pattern(sql):
+    """
+    Заменяет в SQL числа и строки на ?, а списки параметров на ..., чтобы
+    запросы, отличающиеся только параметрами, имели одинаковый шаблон.
+    """
+    sql = re.sub(r"'[^']*'|\b\d+\b", "?", sql)
+    sql = re.sub(r"\((?:\?|NULL)(?:, (?:\?|NULL))*\)", "(...)", sql)
+    return re.sub(r"\(\.\.\.\)(?:, \(\.\.\.\))+", "(...), ...", sql)
+
+
+class QueryBudgetMixin:
+    """
+    Класс QueryBudgetMixin представляет собой примесь к TestCase с проверкой
+    верхней границы числа запросов к базе. В отличие от assertNumQueries,
+    при превышении бюджета показывает повторяющиеся шаблоны запросов, по
+    которым проще найти N+1.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, budget, label=""):
+        with CaptureQueriesContext(connection) as captured:
+            yield captured
+
+        if len(captured) <= budget:
+            return
+        patterns = Counter(query_pattern(query["sql"]) for query in captured)
+        repeated = "\n".join(
+            f"{count} x {pattern}"
+            for pattern, count in patterns.most_common(REPEATED_QUERIES_SHOWN)
+            if count > 1
+        )
+        self.fail(
+            f"{label}: {len(captured)} запросов к базе при бюджете {budget}\n"
+            f"{repeated}"
+        )
@@ -0,0 +1,191 @@
+import csv
+import io
+from itertools import chain
+
+from django.core.exceptions import ValidationError
+
+from .inns import account_ids_by_inn, is_valid_inn
+from .money import MAX_AMOUNT, Money
+from .services import settle
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+STATUS_SKIPPED = "skipped"
+
+REPORT_HEADER = ("row", "inn", "amount", "status", "message")
+
+
+class UploadRow:
+    """
+    Класс UploadRow представляет собой строку файла распределения и
+    результат ее обработки.
+    """
+
+    __slots__ = ("number", "inn", "amount", "account_id", "status", "message")
+
+    def __init__(self, number, inn, amount):
+        self.number = number
+        self.inn = inn
+        self.amount = amount
+        self.account_id = None
+        self.status = STATUS_OK
+        self.message = ""
+
+    def fail(self, message):
+        self.status = STATUS_ERROR
+        self.message = message
+
+    def as_report_row(self):
+        amount = Money(self.amount) if isinstance(self.amount, int) else self.amount
+        return (self.number, self.inn, amount, self.status, self.message)
+
+
+def iter_csv_rows(file):
+    """
+    Построчно читает CSV-файл с колонками ИНН и сумма. Разделитель (запятая
+    или точка с запятой) определяется по первой строке.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    first_line = text.readline()
+    delimiter = ";" if ";" in first_line else ","
+    yield from csv.reader(chain([first_line], text), delimiter=delimiter)
+
+
+def xlsx_cell_text(value):
+    """
+    Возвращает текст ячейки XLSX. Число, сохраненное с дробной частью, но
+    целое (например, ИНН 7700000001.0), выводится без нее.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def iter_xlsx_rows(file):
+    """
+    Построчно читает первый лист XLSX-файла в режиме read_only (пакет
+    openpyxl, см. requirements.txt). Числовые ячейки ИНН и суммы
+    переводятся в текст (см. xlsx_cell_text).
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValidationError(f"Для загрузки XLSX-файлов установите пакет openpyxl")
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for values in workbook.worksheets[0].iter_rows(values_only=True):
+            yield [xlsx_cell_text(value) for value in values]
+    finally:
+        workbook.close()
+
+
+def iter_upload_rows(uploaded_file):
+    """
+    Возвращает итератор по строкам загруженного файла распределения
+    в зависимости от его расширения.
+    """
+    if uploaded_file.name.lower().endswith(".xlsx"):
+        return iter_xlsx_rows(uploaded_file.file)
+    return iter_csv_rows(uploaded_file.file)
+
+
+def parse_amount(value, allow_zero=False):
+    """
+    Разбирает сумму строки файла в рублях (разделитель копеек - точка или
+    запятая) в целое число копеек без промежуточного Decimal. Возвращает
+    None для некорректной, неположительной (нулевая сумма допускается при
+    allow_zero) или превышающей MAX_AMOUNT суммы.
+    """
+    rubles, _, kopecks = value.strip().replace(",", ".").partition(".")
+    if not rubles.isdecimal() or len(kopecks) > 2:
+        return None
+    if kopecks and not kopecks.isdecimal():
+        return None
+    amount = int(rubles) * 100 + (int(kopecks.ljust(2, "0")) if kopecks else 0)
+    if amount > MAX_AMOUNT:
+        return None
+    return amount if amount > 0 or allow_zero else None
+
+
+def read_upload_rows(records):
+    """
+    Проверяет строки файла по одной: формат ИНН, сумму и повторы ИНН.
+    Первая строка пропускается, если она похожа на заголовок. Возвращает
+    список UploadRow всех строк: перевод выполняется, только если корректны
+    все строки, поэтому они хранятся в памяти до его окончания.
+    """
+    rows = []
+    seen = set()
+    for number, record in enumerate(records, start=1):
+        if not any(cell.strip() for cell in record):
+            continue
+        inn = record[0].strip() if record else ""
+        value = record[1] if len(record) > 1 else ""
+        if number == 1 and not inn.isdigit():
+            continue
+
+        amount = parse_amount(value)
+        row = UploadRow(number, inn, amount if amount is not None else value.strip())
+        if not is_valid_inn(inn):
+            row.fail(f"Некорректный ИНН: {inn}")
+        elif amount is None:
+            row.fail(f"Некорректная сумма: {value.strip()}")
+        elif inn in seen:
+            row.fail(f"ИНН {inn} уже встречался в файле")
+        seen.add(inn)
+        rows.append(row)
+    return rows
+
+
+def resolve_upload_rows(rows, sender):
+    """
+    Находит счета получателей через кэш ИНН (см. account_ids_by_inn) и
+    отмечает строки с ненайденными ИНН и переводом самому себе.
+    """
+    valid = [row for row in rows if row.status == STATUS_OK]
+    account_ids = account_ids_by_inn([row.inn for row in valid])
+
+    for row in valid:
+        row.account_id = account_ids.get(row.inn)
+        if row.account_id is None:
+            row.fail(f"Пользователь с ИНН {row.inn} не найден")
+        elif row.account_id == sender.pk:
+            row.fail(f"Нельзя отправить деньги самому себе")
+
+
+def process_upload(sender, uploaded_file):
+    """
+    Обрабатывает файл распределения с индивидуальными суммами.
+
+    Файл разбирается построчно, а проверенные строки хранятся в памяти (см.
+    read_upload_rows), получатели загружаются пачками, и, если ошибок нет,
+    все зачисления выполняются одним переводом в одной транзакции. При любой ошибке деньги не переводятся, а корректные
+    строки помечаются как пропущенные. Возвращает список UploadRow для
+    отчета.
+    """
+    try:
+        rows = read_upload_rows(iter_upload_rows(uploaded_file))
+    except (UnicodeDecodeError, csv.Error):
+        raise ValidationError(f"Не удалось прочитать файл")
+    if not rows:
+        raise ValidationError(f"Файл не содержит строк для перевода")
+
+    resolve_upload_rows(rows, sender)
+
+    failed = [row for row in rows if row.status == STATUS_ERROR]
+    if not failed:
+        try:
+            settle(sender, [(row.account_id, row.amount) for row in rows])
+        except ValidationError as e:
+            for row in rows:
+                row.fail(" ".join(e.messages))
+        return rows
+
+    for row in rows:
+        if row.status == STATUS_OK:
+            row.status = STATUS_SKIPPED
+            row.message = "Перевод не выполнен из-за ошибок в других строках"
+    return rows
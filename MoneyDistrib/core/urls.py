@@ -4,4 +4,19 @@ from . import views
 
 app_name = "core"
 
-urlpatterns = [path("", views.index, name="index")]
+urlpatterns = [
+    path("", views.index, name="index"),
+    path("upload/", views.upload_distribution, name="upload_distribution"),
+    path("api/transfers/", views.api_transfers, name="api_transfers"),
+    path("api/transfers/batch/", views.api_transfer_batch, name="api_transfer_batch"),
+    path("api/jobs/<int:pk>/", views.api_job, name="api_job"),
+    path("api/jobs/<int:pk>/resume/", views.api_job_resume, name="api_job_resume"),
+    path("api/users/search/", views.user_search, name="user_search"),
+    path("export/balances/", views.export_balances, name="export_balances"),
+    path(
+        "export/statements/<int:pk>/",
+        views.export_statement,
+        name="export_statement",
+    ),
+    path("metrics/", views.metrics, name="metrics"),
+]
@@ -0,0 +1,124 @@
+from collections import defaultdict
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.models import F, Q
+from django.http import HttpResponseNotAllowed
+
+# Наибольшее число параметров в одном запросе вида pk__in/inn__in. Держит
+# запросы ниже лимитов SQLite (999 в старых сборках) и PostgreSQL.
+QUERY_CHUNK_SIZE = 900
+
+# Наибольшее число различных сумм, при котором строки пополняются
+# отдельным UPDATE на каждую сумму, а не пачками UPDATE ... FROM (VALUES ...).
+CREDIT_AMOUNT_GROUPS = 4
+
+# Число строк в одном UPDATE ... FROM (VALUES ...): на каждую строку
+# приходится два параметра запроса.
+CREDIT_VALUES_CHUNK_SIZE = 450
+
+
+def chunks(items, size=QUERY_CHUNK_SIZE):
+    """
+    Разбивает последовательность items на части не длиннее size.
+    """
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+def add_amounts(model, field, amounts, count_field=None):
+    """
+    Прибавляет к полю field строк модели model суммы amounts - список пар
+    (pk, сумма). Если задано поле count_field, оно увеличивается на единицу
+    у каждой из этих строк.
+
+    Если различных сумм немного, каждая сумма прибавляется одним
+    UPDATE ... SET field = field + сумма на всю группу строк. Иначе суммы
+    передаются пачками по CREDIT_VALUES_CHUNK_SIZE строк в
+    UPDATE ... FROM (VALUES ...), который поддерживают PostgreSQL и
+    SQLite 3.33+.
+    """
+    by_amount = defaultdict(list)
+    for pk, amount in amounts:
+        by_amount[amount].append(pk)
+
+    if len(by_amount) <= CREDIT_AMOUNT_GROUPS:
+        counter = {count_field: F(count_field) + 1} if count_field else {}
+        for amount, pks in by_amount.items():
+            for chunk in chunks(pks):
+                model.objects.filter(pk__in=chunk).update(
+                    **{field: F(field) + amount}, **counter
+                )
+        return
+
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    pk = quote_name(model._meta.pk.column)
+    column = quote_name(model._meta.get_field(field).column)
+    assignments = f"{column} = {table}.{column} + v.column2"
+    if count_field:
+        counter = quote_name(model._meta.get_field(count_field).column)
+        assignments += f", {counter} = {table}.{counter} + 1"
+    with connection.cursor() as cursor:
+        for chunk in chunks(amounts, CREDIT_VALUES_CHUNK_SIZE):
+            values = ", ".join(["(%s, %s)"] * len(chunk))
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} "
+                f"FROM (VALUES {values}) AS v WHERE {table}.{pk} = v.column1",
+                [param for amount in chunk for param in amount],
+            )
+
+
+def prefix_filter(field, prefix):
+    """
+    Возвращает условие поиска строк, у которых поле field начинается с
+    prefix. Префикс ищется диапазоном [prefix, prefix + U+10FFFF), поэтому
+    запрос использует обычный индекс по полю, в отличие от LIKE/istartswith.
+    Сравнение чувствительно к регистру.
+    """
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": prefix + "\U0010ffff"})
+
+
+class Echo:
+    """
+    Псевдофайл для csv.writer, возвращающий записанную строку. Позволяет
+    отдавать CSV построчно через StreamingHttpResponse.
+    """
+
+    def write(self, value):
+        return value
+
+
+def async_require_http_methods(request_method_list):
+    """
+    Декоратор require_http_methods для асинхронных представлений. Декораторы
+    Django 4.2 оборачивают представление синхронной функцией, и под ASGI
+    такое представление выполнялось бы в потоке.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            if request.method not in request_method_list:
+                return HttpResponseNotAllowed(request_method_list)
+            return await view(request, *args, **kwargs)
+
+        return inner
+
+    return decorator
+
+
+async def iterate_in_thread(iterator):
+    """
+    Выдает элементы синхронного итератора iterator асинхронно, получая
+    каждый элемент в потоке синхронного кода (sync_to_async). Под ASGI
+    StreamingHttpResponse с синхронным итератором сначала читает его целиком
+    в память, а с асинхронным - отдает по мере получения.
+    """
+    get_next = sync_to_async(next)
+    while True:
+        item = await get_next(iterator, StopIteration)
+        if item is StopIteration:
+            return
+        yield item
@@ -1,25 +1,57 @@
-from decimal import ROUND_DOWN, Decimal
+import csv
+import hashlib
+import io
+import json
+from http import HTTPStatus
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.core.exceptions import ValidationError
-from django.db import transaction
-from django.shortcuts import redirect, render
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.views.decorators.http import require_GET, require_POST
 
-from .forms import MoneyTransferForm
-from .models import CustomUser
+from .batches import parse_batch_request, settle_batch, skip_pending, validate_batch
+from .caching import users_page
+from .exports import (
+    BALANCE_COLUMNS,
+    EXPORT_FORMATS,
+    STATEMENT_COLUMNS,
+    balance_chunks,
+    parse_balance_filters,
+    parse_export_format,
+    parse_statement_period,
+    render_chunks,
+    statement_chunks,
+)
+from .forms import DistributionUploadForm, MoneyTransferForm
+from .idempotency import (
+    IdempotencyKeyReused,
+    areplay_response,
+    idempotent_response,
+    replay_response,
+    request_fingerprint,
+)
+from .inns import parse_inn_list
+from .jobs import resume_job, submit_distribution
+from .metrics import registry, timed
+from .models import CustomUser, DistributionJob, IdempotencyKey
+from .money import Money
+from .services import distribute_money
+from .uploads import (
+    REPORT_HEADER,
+    STATUS_ERROR,
+    STATUS_OK,
+    parse_amount,
+    process_upload,
+)
+from .utils import async_require_http_methods, iterate_in_thread, prefix_filter
 
-
-def transfer_money(sender, acceptor, amount):
-    """
-    Переводит деньги от отправителя к получателю.
-    """
-    if sender.balance < amount:
-        raise ValidationError(f"У отправителя недостаточно средств.")
-
-    sender.balance -= amount
-    acceptor.balance += amount
-    sender.save()
-    acceptor.save()
+UPLOAD_FORM_PREFIX = "upload"
 
 
 def index(request):
@@ -28,25 +60,48 @@ def index(request):
     отправки денег, а также список пользователей. В случае успешной отправки
     денег перенаправляет на ту же страницу с сообщением об успешной операции.
     В случае возникновения ошибок, отображает сообщения об ошибках.
+    Список пользователей выводится постранично по курсору из параметра after
+    и берется из кэша, пока переводы не изменят балансы на странице.
+    Повторная отправка формы с тем же ключом идемпотентности не выполняет
+    перевод повторно, а отправка другого перевода с уже использованным
+    ключом отклоняется.
     """
     form = MoneyTransferForm(request.POST or None)
-    users = CustomUser.objects.exclude(inn="")
 
-    if form.is_valid():
+    if request.method == "POST":
+        fingerprint = transfer_fingerprint(request.POST)
+        try:
+            replay = replay_response(request.POST.get("idempotency_key"), fingerprint)
+        except IdempotencyKeyReused as e:
+            messages.error(request, str(e))
+            return redirect("core:index")
+        if replay is not None:
+            return replay
+
+    with timed("validation"):
+        valid = form.is_valid()
+
+    if valid:
         sender = form.cleaned_data["sender"]
-        amount = Decimal(form.cleaned_data["amount"])
+        amount = form.cleaned_data["amount"]
         acceptors = form.cleaned_data["inn_list"]
 
-        transfer_amount = (amount / len(acceptors)).quantize(
-            Decimal("0.01"), rounding=ROUND_DOWN
-        )
+        def execute():
+            if form.cleaned_data["background"]:
+                job = submit_distribution(sender, acceptors, amount)
+                messages.success(
+                    request, f"Распределение поставлено в очередь: задание #{job.pk}"
+                )
+            else:
+                distribute_money(sender, acceptors, amount)
+            return redirect("core:index")
 
         try:
-            with transaction.atomic():
-                if sender.balance < amount:
-                    raise ValidationError(f"У отправителя недостаточно средств.")
-                for acceptor in acceptors:
-                    transfer_money(sender, acceptor, transfer_amount)
+            return idempotent_response(
+                form.cleaned_data["idempotency_key"], execute, fingerprint
+            )
+        except IdempotencyKeyReused as e:
+            messages.error(request, str(e))
             return redirect("core:index")
         except ValidationError as e:
             messages.error(request, str(e))
@@ -56,8 +111,504 @@ def index(request):
                 "Произошла непредвиденная ошибка. Пожалуйста, попробуйте еще раз.",
             )
 
+    users = users_page(request.GET.get("after"), settings.USERS_PAGE_SIZE)
     context = {
         "form": form,
+        "upload_form": DistributionUploadForm(prefix=UPLOAD_FORM_PREFIX),
         "users": users,
     }
-    return render(request, "index.html", context)
+    with timed("render"):
+        return render(request, "index.html", context)
+
+
+class UploadNotSettled(Exception):
+    """
+    Перевод по файлу распределения не выполнен; rows - строки для отчета.
+    """
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+
+
+@require_POST
+def upload_distribution(request):
+    """
+    Обработчик загрузки файла распределения с индивидуальными суммами.
+    Возвращает построчный отчет об обработке в виде CSV-файла. При ошибках
+    в форме перенаправляет на главную страницу с сообщениями об ошибках.
+
+    Повторная отправка формы с тем же ключом идемпотентности не выполняет
+    перевод повторно, а возвращает сохраненный отчет. Ключ сохраняется,
+    только если перевод выполнен, поэтому файл с ошибками можно исправить
+    и отправить снова.
+    """
+    form = DistributionUploadForm(
+        request.POST, request.FILES, prefix=UPLOAD_FORM_PREFIX
+    )
+    if not form.is_valid():
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+        return redirect("core:index")
+
+    sender = form.cleaned_data["sender"]
+    uploaded_file = form.cleaned_data["file"]
+
+    def execute():
+        rows = process_upload(sender, uploaded_file)
+        if any(row.status != STATUS_OK for row in rows):
+            # Исключение откатывает резервирование ключа идемпотентности.
+            raise UploadNotSettled(rows)
+        return upload_report(rows)
+
+    try:
+        return idempotent_response(
+            form.cleaned_data["idempotency_key"],
+            execute,
+            upload_fingerprint(sender, uploaded_file),
+        )
+    except UploadNotSettled as e:
+        return upload_report(e.rows)
+    except IdempotencyKeyReused as e:
+        messages.error(request, str(e))
+        return redirect("core:index")
+    except ValidationError as e:
+        for error in e.messages:
+            messages.error(request, error)
+        return redirect("core:index")
+
+
+def upload_fingerprint(sender, uploaded_file):
+    """
+    Возвращает отпечаток загрузки для проверки ключа идемпотентности:
+    отправитель и SHA-256 содержимого файла.
+    """
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return request_fingerprint({"sender": sender.pk, "file": digest.hexdigest()})
+
+
+def upload_report(rows):
+    """
+    Возвращает CSV-отчет по строкам файла распределения rows. Отчет
+    собирается целиком, чтобы его можно было сохранить с ключом
+    идемпотентности: строки файла к этому моменту уже в памяти.
+    """
+    content = io.StringIO()
+    writer = csv.writer(content)
+    writer.writerow(REPORT_HEADER)
+    writer.writerows(row.as_report_row() for row in rows)
+    response = HttpResponse(content.getvalue(), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="distribution-report.csv"'
+    return response
+
+
+def parse_transfer_request(body):
+    """
+    Преобразует JSON-тело запроса API в данные для MoneyTransferForm.
+    Получатели передаются списком ИНН в поле recipients, флаг background
+    ставит распределение в очередь фонового обработчика.
+    """
+    payload = json.loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError("Ожидается JSON-объект")
+
+    recipients = payload.get("recipients", [])
+    if not isinstance(recipients, list):
+        raise ValueError("Поле recipients должно быть списком ИНН")
+
+    return {
+        "sender": payload.get("sender"),
+        "inn_list": " ".join(map(str, recipients)),
+        "amount": payload.get("amount"),
+        "background": payload.get("background", False),
+    }
+
+
+def transfer_fingerprint(data):
+    """
+    Возвращает отпечаток данных перевода data (поля MoneyTransferForm) для
+    проверки ключа идемпотентности. Список ИНН и сумма нормализуются, поэтому
+    разделители ИНН и запись суммы (60 или 60.00) отпечаток не меняют.
+    """
+    amount = str(data.get("amount") or "")
+    background = MoneyTransferForm.base_fields["background"]
+    return request_fingerprint(
+        {
+            "sender": str(data.get("sender") or ""),
+            "recipients": parse_inn_list(str(data.get("inn_list") or "")),
+            "amount": parse_amount(amount) or amount,
+            "background": background.to_python(data.get("background")),
+        }
+    )
+
+
+def api_error_response(errors, status):
+    """
+    Возвращает ответ API с общими для запроса ошибками в формате
+    Form.errors.get_json_data().
+    """
+    return JsonResponse(
+        {
+            "errors": {
+                "__all__": [{"message": error, "code": "invalid"} for error in errors]
+            }
+        },
+        status=status,
+    )
+
+
+@async_require_http_methods(["POST"])
+async def api_transfers(request):
+    """
+    JSON API для распределения средств. Принимает объект с полями sender
+    (id отправителя), recipients (список ИНН) и amount, проверяет их теми же
+    правилами, что и MoneyTransferForm, и возвращает суммы по получателям и
+    баланс отправителя после перевода. С флагом background распределение
+    ставится в очередь, а в ответе возвращается адрес для опроса статуса
+    задания. Шаблоны и список пользователей не используются.
+
+    Запрос с заголовком Idempotency-Key выполняется не более одного раза:
+    повтор с тем же ключом получает сохраненный ответ, а запрос с тем же
+    ключом и другими данными - ошибку 422. Запрос с ошибками в данных или
+    без средств на перевод (409) не выполняется, и его ключ не сохраняется.
+
+    Представление асинхронное: под ASGI ожидание базы не занимает поток.
+    Сохраненный ответ читается асинхронным ORM, а проверка формы (формы
+    Django синхронны) и транзакция перевода выполняются через
+    sync_to_async.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if key and len(key) > IdempotencyKey._meta.get_field("key").max_length:
+        return api_error_response(
+            ["Слишком длинный Idempotency-Key"], HTTPStatus.BAD_REQUEST
+        )
+
+    try:
+        data = parse_transfer_request(request.body)
+    except ValueError as e:
+        return api_error_response([str(e)], HTTPStatus.BAD_REQUEST)
+
+    fingerprint = transfer_fingerprint(data)
+    try:
+        replay = await areplay_response(key, fingerprint)
+    except IdempotencyKeyReused as e:
+        return api_error_response([str(e)], HTTPStatus.UNPROCESSABLE_ENTITY)
+    if replay is not None:
+        return replay
+
+    form = MoneyTransferForm(data)
+    with timed("validation"):
+        valid = await sync_to_async(form.is_valid)()
+    if not valid:
+        return JsonResponse(
+            {"errors": form.errors.get_json_data()}, status=HTTPStatus.BAD_REQUEST
+        )
+
+    try:
+        return await sync_to_async(idempotent_response)(
+            key, lambda: execute_api_transfer(form.cleaned_data), fingerprint
+        )
+    except IdempotencyKeyReused as e:
+        return api_error_response([str(e)], HTTPStatus.UNPROCESSABLE_ENTITY)
+    except ValidationError as e:
+        # Исключение откатывает резервирование ключа идемпотентности, поэтому
+        # перевод можно повторить с тем же ключом после пополнения счета.
+        return api_error_response(e.messages, HTTPStatus.CONFLICT)
+
+
+# Декоратор csrf_exempt в Django 4.2 делает представление синхронным.
+api_transfers.csrf_exempt = True
+
+
+def execute_api_transfer(cleaned_data):
+    """
+    Выполняет проверенный перевод API или ставит его в очередь. Ошибки
+    перевода (нехватка средств, удаленные счета) выбрасываются как
+    ValidationError.
+    """
+    if cleaned_data["background"]:
+        job = submit_distribution(
+            cleaned_data["sender"], cleaned_data["inn_list"], cleaned_data["amount"]
+        )
+        return JsonResponse(
+            {
+                "job": job.pk,
+                "status": job.status,
+                "status_url": reverse("core:api_job", args=[job.pk]),
+            },
+            status=HTTPStatus.ACCEPTED,
+        )
+
+    distribution = distribute_money(
+        cleaned_data["sender"], cleaned_data["inn_list"], cleaned_data["amount"]
+    )
+    return JsonResponse(
+        {
+            "transfer": distribution.transfer.pk,
+            "sender": {
+                "id": distribution.transfer.sender_id,
+                "balance": str(Money(distribution.sender_balance)),
+            },
+            "amount": str(Money(distribution.transfer.amount)),
+            "transfers": [
+                {"inn": acceptor.inn, "amount": str(Money(amount))}
+                for acceptor, amount in distribution.credits
+            ],
+        },
+        status=HTTPStatus.CREATED,
+    )
+
+
+class BatchNotSettled(Exception):
+    """
+    Ни одно распределение пакета не выполнено.
+    """
+
+
+@async_require_http_methods(["POST"])
+async def api_transfer_batch(request):
+    """
+    JSON API для пакета независимых распределений. Принимает объект с полем
+    distributions - списком объектов sender, recipients и amount, как в
+    api_transfers, - и флагом atomic. Все распределения проверяются общими
+    запросами и выполняются в одной транзакции (см. settle_batch): при
+    atomic (по умолчанию) - все или ни одного, иначе выполняются все
+    корректные распределения. В ответе возвращается результат каждого
+    распределения в порядке запроса.
+
+    Пакет, в котором ничего не выполнено, возвращается со статусом 400 (есть
+    ошибки в данных) или 409 (не хватило средств), и его ключ
+    идемпотентности не сохраняется. Выполненный пакет возвращается со
+    статусом 201, а выполненный частично - 200. Повтор ключа с другим
+    пакетом отклоняется со статусом 422.
+    """
+    key = request.headers.get("Idempotency-Key")
+    if key and len(key) > IdempotencyKey._meta.get_field("key").max_length:
+        return api_error_response(
+            ["Слишком длинный Idempotency-Key"], HTTPStatus.BAD_REQUEST
+        )
+
+    try:
+        items, atomic = parse_batch_request(
+            request.body,
+            settings.TRANSFER_BATCH_MAX_ITEMS,
+            settings.TRANSFER_BATCH_MAX_CREDITS,
+        )
+    except ValueError as e:
+        return api_error_response([str(e)], HTTPStatus.BAD_REQUEST)
+
+    fingerprint = request_fingerprint(
+        [atomic, [(item.sender_id, item.inns, item.amount) for item in items]]
+    )
+    try:
+        replay = await areplay_response(key, fingerprint)
+    except IdempotencyKeyReused as e:
+        return api_error_response([str(e)], HTTPStatus.UNPROCESSABLE_ENTITY)
+    if replay is not None:
+        return replay
+
+    with timed("validation"):
+        await sync_to_async(validate_batch)(items)
+    if not any(item.status == STATUS_OK for item in items) or (
+        atomic and any(item.status == STATUS_ERROR for item in items)
+    ):
+        skip_pending(items)
+        return batch_response(items, atomic, HTTPStatus.BAD_REQUEST)
+
+    def execute():
+        settle_batch(items, atomic)
+        settled = sum(item.status == STATUS_OK for item in items)
+        if not settled:
+            # Исключение откатывает резервирование ключа идемпотентности.
+            raise BatchNotSettled()
+        if settled < len(items):
+            return batch_response(items, atomic, HTTPStatus.OK)
+        return batch_response(items, atomic, HTTPStatus.CREATED)
+
+    try:
+        return await sync_to_async(idempotent_response)(key, execute, fingerprint)
+    except IdempotencyKeyReused as e:
+        return api_error_response([str(e)], HTTPStatus.UNPROCESSABLE_ENTITY)
+    except BatchNotSettled:
+        return batch_response(items, atomic, HTTPStatus.CONFLICT)
+
+
+api_transfer_batch.csrf_exempt = True
+
+
+def batch_response(items, atomic, status):
+    """
+    Возвращает ответ пакетного API с результатами распределений items.
+    """
+    results = []
+    for item in items:
+        result = {"index": item.index, "status": item.status}
+        if item.transfer is not None:
+            result["transfer"] = item.transfer.pk
+            result["amount"] = str(Money(item.amount))
+            result["sender"] = {
+                "id": item.sender_id,
+                "balance": str(Money(item.sender_balance)),
+            }
+        if item.errors:
+            result["errors"] = item.errors
+        results.append(result)
+    return JsonResponse(
+        {
+            "atomic": atomic,
+            "settled": sum(item.status == STATUS_OK for item in items),
+            "results": results,
+        },
+        status=status,
+    )
+
+
+@async_require_http_methods(["GET"])
+async def api_job(request, pk):
+    """
+    Возвращает статус и прогресс фонового задания распределения.
+    """
+    job = await (
+        DistributionJob.objects.filter(pk=pk)
+        .values("id", "status", "processed", "total", "error")
+        .afirst()
+    )
+    if job is None:
+        raise Http404("Задание не найдено")
+    return JsonResponse(job)
+
+
+@async_require_http_methods(["POST"])
+async def api_job_resume(request, pk):
+    """
+    Возобновляет фоновое задание распределения, завершившееся ошибкой
+    (например, после пополнения счета отправителя): задание продолжается с
+    первого получателя, которому перевод еще не выполнен. Возвращает статус
+    задания, а для задания в другом статусе - ошибку 409.
+    """
+    resumed = await sync_to_async(resume_job)(pk)
+    job = await (
+        DistributionJob.objects.filter(pk=pk)
+        .values("id", "status", "processed", "total", "error")
+        .afirst()
+    )
+    if job is None:
+        raise Http404("Задание не найдено")
+    if not resumed:
+        return api_error_response(
+            ["Возобновить можно только задание, завершившееся ошибкой"],
+            HTTPStatus.CONFLICT,
+        )
+    return JsonResponse(job, status=HTTPStatus.ACCEPTED)
+
+
+api_job_resume.csrf_exempt = True
+
+
+@async_require_http_methods(["GET"])
+async def user_search(request):
+    """
+    Поиск пользователей по префиксу имени или ИНН для выбора отправителя.
+    Возвращает не более USER_SEARCH_LIMIT совпадений. Префикс ищется
+    диапазоном [q, q + U+10FFFF) по уникальным индексам username и inn.
+    """
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JsonResponse({"results": []})
+
+    users = (
+        CustomUser.objects.exclude(inn="")
+        .filter(prefix_filter("username", query) | prefix_filter("inn", query))
+        .order_by("username")
+        .values("id", "username", "inn")[: settings.USER_SEARCH_LIMIT]
+    )
+    return JsonResponse({"results": [user async for user in users]})
+
+
+@staff_member_required
+@require_GET
+def export_balances(request):
+    """
+    Выгружает балансы пользователей в формате CSV или JSON Lines (параметр
+    format) с фильтрами по балансу в рублях (min_balance, max_balance) и
+    префиксу ИНН (inn_prefix). Строки читаются из базы пачками по
+    EXPORT_CHUNK_SIZE и отдаются по мере чтения (см. balance_chunks),
+    поэтому память не зависит от числа счетов. Доступно сотрудникам.
+    """
+    try:
+        export_format = parse_export_format(request.GET.get("format"))
+        filters = parse_balance_filters(
+            request.GET.get("min_balance"),
+            request.GET.get("max_balance"),
+            request.GET.get("inn_prefix"),
+        )
+    except ValueError as e:
+        return api_error_response([str(e)], HTTPStatus.BAD_REQUEST)
+
+    chunks = balance_chunks(settings.EXPORT_CHUNK_SIZE, **filters)
+    return export_response(
+        request,
+        render_chunks(chunks, BALANCE_COLUMNS, export_format),
+        export_format,
+        "balances",
+    )
+
+
+@staff_member_required
+@require_GET
+def export_statement(request, pk):
+    """
+    Выгружает выписку по счету pk - проводки с балансом после каждой - в
+    формате CSV или JSON Lines (параметр format) за период с since по until
+    (даты ГГГГ-ММ-ДД, включительно). Доступно сотрудникам.
+    """
+    account = get_object_or_404(CustomUser.objects.only("pk"), pk=pk)
+    try:
+        export_format = parse_export_format(request.GET.get("format"))
+        period = parse_statement_period(
+            request.GET.get("since"), request.GET.get("until")
+        )
+    except ValueError as e:
+        return api_error_response([str(e)], HTTPStatus.BAD_REQUEST)
+
+    chunks = statement_chunks(account.pk, settings.EXPORT_CHUNK_SIZE, **period)
+    return export_response(
+        request,
+        render_chunks(chunks, STATEMENT_COLUMNS, export_format),
+        export_format,
+        f"statement-{account.pk}",
+    )
+
+
+def export_response(request, content, export_format, name):
+    """
+    Возвращает потоковый ответ с выгрузкой content - итератором строк. Под
+    ASGI итератор оборачивается в асинхронный (см. iterate_in_thread), иначе
+    StreamingHttpResponse прочитал бы его в память целиком.
+    """
+    if isinstance(request, ASGIRequest):
+        content = iterate_in_thread(content)
+    response = StreamingHttpResponse(
+        content, content_type=EXPORT_FORMATS[export_format]
+    )
+    response["Content-Disposition"] = f'attachment; filename="{name}.{export_format}"'
+    return response
+
+
+@require_GET
+def metrics(request):
+    """
+    Возвращает метрики запросов процесса в текстовом формате Prometheus.
+    Если задана настройка METRICS_TOKEN, требует заголовок
+    Authorization: Bearer <METRICS_TOKEN>.
+    """
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=HTTPStatus.UNAUTHORIZED)
+    return HttpResponse(
+        registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
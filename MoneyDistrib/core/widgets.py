@@ -0,0 +1,27 @@
+from django import forms
+from django.urls import reverse_lazy
+
+
+class SenderLookupWidget(forms.Widget):
+    """
+    Класс SenderLookupWidget представляет собой виджет выбора пользователя
+    поиском по префиксу имени или ИНН. В форму отправляется только id
+    выбранного пользователя, а варианты подгружаются с lookup_url, поэтому
+    отрисовка виджета не обращается к базе данных.
+    """
+
+    template_name = "core/widgets/sender_lookup.html"
+    lookup_url = reverse_lazy("core:user_search")
+
+    class Media:
+        js = ("core/sender_lookup.js",)
+
+    def __init__(self, attrs=None):
+        super().__init__(attrs)
+        self.selected_label = ""
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["lookup_url"] = self.lookup_url
+        context["widget"]["selected_label"] = self.selected_label
+        return context